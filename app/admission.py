@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from fastapi import Depends, HTTPException
+
+from . import auth, metrics, models
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do Controle de Admissão ---
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory")  # "memory" (por processo) ou "sqlite" (compartilhado na máquina)
+ADMISSION_SQLITE_PATH = os.getenv("ADMISSION_SQLITE_PATH", "admission.db")
+UPLOAD_RATE_PER_MINUTE = float(os.getenv("UPLOAD_RATE_PER_MINUTE", "30"))  # Contratos por minuto por usuário (0 = sem limite)
+UPLOAD_BURST = int(os.getenv("UPLOAD_BURST", "10"))  # Contratos que um usuário pode enviar de uma vez
+# Os arquivos dos lotes têm um saldo próprio, do tamanho do maior lote aceito (BATCH_MAX_FILES, em batch.py)
+BATCH_RATE_PER_MINUTE = float(os.getenv("BATCH_RATE_PER_MINUTE", "60"))  # Arquivos de lote por minuto por usuário (0 = sem limite)
+BATCH_BURST = int(os.getenv("BATCH_BURST", os.getenv("BATCH_MAX_FILES", "500")))  # Arquivos de lote de uma vez
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "1000"))  # Jobs aguardando na fila (0 = sem limite)
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "900"))  # Espera estimada máxima na fila (0 = sem limite)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # Chamadas à IA ao mesmo tempo (0 = sem limite)
+LLM_SLOT_TIMEOUT = float(os.getenv("LLM_SLOT_TIMEOUT", "300"))  # Espera máxima por uma vaga na IA (segundos)
+LLM_SLOT_LEASE_SECONDS = float(os.getenv("LLM_SLOT_LEASE_SECONDS", "900"))  # No backend sqlite, vagas de processos que morreram expiram
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "4"))  # Tentativas por chamada em erros temporários (cota, 5xx, timeout)
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+
+# Erros da IA que valem uma nova tentativa: cota (429), indisponibilidade e timeouts
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSIENT_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+                   "TimeoutError", "Timeout", "ReadTimeout", "ConnectTimeout", "ConnectError", "ConnectionError"}
+TRANSIENT_MARKERS = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "429")
+
+JOB_DURATION_SAMPLES = 50  # Últimos jobs usados para estimar a espera na fila
+
+
+class LLMBusy(TimeoutError):
+    """Nenhuma vaga na IA dentro do tempo de espera (LLM_SLOT_TIMEOUT)."""
+
+
+class MemoryBackend:
+    """
+    Estado do controle de admissão no próprio processo (vale para cada worker do gunicorn separadamente).
+    """
+
+    blocking = False  # Operações só em memória: podem rodar direto no event loop
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+        self._buckets: dict[str, tuple[float, float]] = {}  # chave -> (tokens, instante da última recarga)
+        self._in_flight = 0
+
+    def take(self, key: str, rate: float, burst: int, cost: int = 1) -> float:
+        """Token bucket: consome `cost` tokens e retorna 0, ou retorna quantos segundos faltam para haver tokens."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / rate
+
+    def acquire_slot(self, limit: int, timeout: float) -> str | None:
+        deadline = time.monotonic() + timeout
+        with self._slot_released:
+            while self._in_flight >= limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._slot_released.wait(remaining)
+            self._in_flight += 1
+        return "local"
+
+    def release_slot(self, slot: str) -> None:
+        with self._slot_released:
+            self._in_flight -= 1
+            self._slot_released.notify()
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+
+class SQLiteBackend:
+    """
+    Estado compartilhado num arquivo SQLite por todos os processos da máquina (workers do gunicorn,
+    workers em processos e "python -m app.worker"). Cada operação é uma transação curta com BEGIN IMMEDIATE.
+    """
+
+    blocking = True  # Espera pelo lock do arquivo: nos endpoints assíncronos roda numa thread
+
+    def __init__(self, path: str = ADMISSION_SQLITE_PATH, lease: float = LLM_SLOT_LEASE_SECONDS):
+        self.path = path
+        self.lease = lease
+        self._local = threading.local()  # Uma conexão por thread (o sqlite3 não compartilha conexões entre threads)
+        db = self._connection()
+        db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS llm_slots (holder TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():  # Não reaproveita a conexão herdada num fork (preload do gunicorn)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)  # Transações controladas abaixo
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")  # Trava a escrita já na leitura: dois processos não leem o mesmo saldo
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def take(self, key: str, rate: float, burst: int, cost: int = 1) -> float:
+        now = time.time()  # Relógio de parede: compartilhado entre processos
+        with self._transaction() as db:
+            row = db.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (float(burst), now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if wait == 0.0:
+                tokens -= cost
+            db.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now))
+        return wait
+
+    def acquire_slot(self, limit: int, timeout: float) -> str | None:
+        holder = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        delay = 0.02
+        while True:
+            with self._transaction() as db:
+                db.execute("DELETE FROM llm_slots WHERE expires_at < ?", (time.time(),))
+                if db.execute("SELECT COUNT(*) FROM llm_slots").fetchone()[0] < limit:
+                    db.execute("INSERT INTO llm_slots (holder, expires_at) VALUES (?, ?)", (holder, time.time() + self.lease))
+                    return holder
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)  # Outro processo liberou? Confere de novo, cada vez com menos frequência
+
+    def release_slot(self, slot: str) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM llm_slots WHERE holder = ?", (slot,))
+
+    def in_flight(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM llm_slots WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+
+
+def create_backend(name: str = ADMISSION_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Backend de admissão não suportado: {name}")
+
+
+def is_transient(error: BaseException) -> bool:
+    """Erros de cota, indisponibilidade ou timeout da IA (vale tentar de novo); os demais falham direto."""
+    if isinstance(error, LLMBusy):
+        return False  # Já esperou LLM_SLOT_TIMEOUT por uma vaga
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in TRANSIENT_STATUS:
+        return True
+    if any(cls.__name__ in TRANSIENT_NAMES for cls in type(error).__mro__):
+        return True
+    message = str(error)
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+def backoff_delay(attempt: int, base: float = LLM_RETRY_BASE_SECONDS, cap: float = LLM_RETRY_MAX_SECONDS) -> float:
+    """Backoff exponencial com jitter completo: espalha as novas tentativas de vários workers no tempo."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+@contextmanager
+def _measure_call():
+    """Duração e resultado de uma chamada à IA, já com a vaga ocupada."""
+    if not metrics.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "error"
+    metrics.LLM_CALLS_IN_FLIGHT.inc()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        metrics.LLM_CALLS_IN_FLIGHT.dec()
+        metrics.LLM_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - start)
+
+
+class AdmissionController:
+    """
+    Controle de admissão na frente da IA: limite de envios por usuário (token bucket), fila de jobs limitada
+    com rejeição pela espera estimada (429 com Retry-After), limite global de chamadas simultâneas à IA
+    e novas tentativas com backoff nos erros temporários.
+    """
+
+    def __init__(self, backend=None, rate_per_minute: float = UPLOAD_RATE_PER_MINUTE, burst: int = UPLOAD_BURST,
+                 batch_rate_per_minute: float = BATCH_RATE_PER_MINUTE, batch_burst: int = BATCH_BURST,
+                 max_queue: int = ADMISSION_MAX_QUEUE, max_wait: float = ADMISSION_MAX_WAIT_SECONDS,
+                 llm_concurrency: int = LLM_MAX_CONCURRENCY, slot_timeout: float = LLM_SLOT_TIMEOUT,
+                 retry_attempts: int = LLM_RETRY_ATTEMPTS):
+        self.backend = backend if backend is not None else create_backend()
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.batch_rate = batch_rate_per_minute / 60
+        self.batch_burst = batch_burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.llm_concurrency = llm_concurrency
+        self.slot_timeout = slot_timeout
+        self.retry_attempts = retry_attempts
+        self._lock = threading.Lock()
+        self._counters = {"rate_limited": 0, "queue_rejected": 0, "llm_busy": 0, "llm_retries": 0}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _reject(self, counter: str, detail: str, retry_after: float) -> HTTPException:
+        self._count(counter)
+        return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    # --- Envios por usuário
+    def check_rate(self, username: str) -> None:
+        """Consome um envio do usuário; sem saldo, 429 com o tempo até ele ter saldo de novo."""
+        if self.rate <= 0:
+            return
+        wait = self.backend.take(f"upload:{username}", self.rate, self.burst)
+        if wait > 0:
+            raise self._reject("rate_limited", "Limite de envios atingido, tente novamente em instantes.", wait)
+
+    def check_batch(self, username: str, files: int) -> None:
+        """
+        Consome os arquivos de um lote do saldo de lotes do usuário (separado do saldo dos envios avulsos,
+        que o pedido do lote já pagou como um envio). Um lote maior que o saldo inteiro nunca caberia: 413.
+        """
+        if self.batch_rate <= 0 or files <= 0:
+            return
+        if files > self.batch_burst:
+            self._count("rate_limited")
+            raise HTTPException(status_code=413, detail=f"Lote com {files} contratos, acima do limite de "
+                                                        f"{self.batch_burst} por vez. Divida o lote em partes menores.")
+        wait = self.backend.take(f"batch:{username}", self.batch_rate, self.batch_burst, files)
+        if wait > 0:
+            raise self._reject("rate_limited", "Limite de envios em lote atingido, tente novamente mais tarde.", wait)
+
+    async def acheck_rate(self, username: str) -> None:
+        """Versão para os endpoints assíncronos: com o backend sqlite, a transação roda numa thread."""
+        if getattr(self.backend, "blocking", False):
+            await asyncio.to_thread(self.check_rate, username)
+        else:
+            self.check_rate(username)
+
+    async def acheck_batch(self, username: str, files: int) -> None:
+        """Versão assíncrona do check_batch (mesma regra do acheck_rate para o backend sqlite)."""
+        if getattr(self.backend, "blocking", False):
+            await asyncio.to_thread(self.check_batch, username, files)
+        else:
+            self.check_batch(username, files)
+
+    # --- Fila de jobs
+    def check_queue(self, queued: int, durations: list[float], parallelism: int, incoming: int = 1) -> None:
+        """
+        Rejeita o envio quando a fila está cheia ou quando a espera estimada (jobs na frente x duração média
+        dos últimos jobs / workers) passaria do limite: melhor o cliente voltar depois do que esperar em vão.
+        """
+        average = sum(durations) / len(durations) if durations else 0.0
+        per_job = average / max(1, parallelism)  # Tempo médio para a fila andar uma posição
+        if self.max_queue and queued + incoming > self.max_queue:
+            excess = queued + incoming - self.max_queue
+            raise self._reject("queue_rejected", "Fila de análises cheia, tente novamente mais tarde.", excess * per_job)
+        estimated_wait = (queued + incoming) * per_job
+        if self.max_wait and estimated_wait > self.max_wait:
+            raise self._reject("queue_rejected", "Fila de análises muito longa, tente novamente mais tarde.",
+                               estimated_wait - self.max_wait)
+
+    # --- Chamadas à IA
+    @contextmanager
+    def llm_slot(self):
+        """Ocupa uma das LLM_MAX_CONCURRENCY vagas da IA durante a chamada (LLMBusy se não abrir a tempo)."""
+        if self.llm_concurrency <= 0:
+            yield
+            return
+        with metrics.timed(metrics.LLM_SLOT_WAIT_SECONDS):
+            slot = self.backend.acquire_slot(self.llm_concurrency, self.slot_timeout)
+        if slot is None:
+            self._count("llm_busy")
+            raise LLMBusy(f"Nenhuma vaga na IA em {self.slot_timeout:.0f}s")
+        try:
+            yield
+        finally:
+            self.backend.release_slot(slot)
+
+    @asynccontextmanager
+    async def allm_slot(self):
+        """Versão para corrotinas: a espera pela vaga roda numa thread, sem travar o event loop."""
+        if self.llm_concurrency <= 0:
+            yield
+            return
+        with metrics.timed(metrics.LLM_SLOT_WAIT_SECONDS):
+            slot = await asyncio.to_thread(self.backend.acquire_slot, self.llm_concurrency, self.slot_timeout)
+        if slot is None:
+            self._count("llm_busy")
+            raise LLMBusy(f"Nenhuma vaga na IA em {self.slot_timeout:.0f}s")
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self.backend.release_slot, slot)
+
+    def call_llm(self, call, *args, **kwargs):
+        """Executa uma chamada síncrona à IA com vaga garantida e novas tentativas nos erros temporários."""
+        for attempt in range(self.retry_attempts):
+            try:
+                with self.llm_slot(), _measure_call():
+                    return call(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.retry_attempts or not is_transient(e):
+                    raise
+                self._count("llm_retries")
+                delay = backoff_delay(attempt)
+                logger.warning("Erro temporário da IA, nova tentativa",
+                               extra={"error": e.__class__.__name__, "attempt": attempt + 1, "delay_s": round(delay, 2)})
+                time.sleep(delay)  # Fora da vaga: outra chamada pode usá-la enquanto esta espera
+
+    async def acall_llm(self, call, *args, **kwargs):
+        """Versão assíncrona do call_llm (usada nas partes do modo map-reduce)."""
+        for attempt in range(self.retry_attempts):
+            try:
+                async with self.allm_slot():
+                    with _measure_call():
+                        return await call(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.retry_attempts or not is_transient(e):
+                    raise
+                self._count("llm_retries")
+                delay = backoff_delay(attempt)
+                logger.warning("Erro temporário da IA, nova tentativa",
+                               extra={"error": e.__class__.__name__, "attempt": attempt + 1, "delay_s": round(delay, 2)})
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "backend": type(self.backend).__name__,
+            "llm_in_flight": self.backend.in_flight(),
+            "llm_concurrency": self.llm_concurrency,
+            **counters,
+        }
+
+
+def queue_parallelism() -> int:
+    """Jobs analisados ao mesmo tempo: os workers, limitados pelas vagas da IA."""
+    from . import worker  # Import tardio: o worker importa o processing, que usa este módulo
+    if LLM_MAX_CONCURRENCY > 0:
+        return min(worker.WORKER_CONCURRENCY, LLM_MAX_CONCURRENCY)
+    return worker.WORKER_CONCURRENCY
+
+
+controller = AdmissionController()
+
+
+async def upload_principal(current_user: models.User = Depends(auth.get_current_user)) -> models.User:
+    """
+    Dependência dos endpoints de envio: o usuário autenticado, já descontado do limite de envios dele
+    (antes de qualquer byte do corpo ser lido).
+    """
+    await controller.acheck_rate(current_user.username)
+    return current_user
@@ -1,14 +1,21 @@
+import asyncio
+import hashlib
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone 
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from . import database, models
+from . import crud_async, database
+from .cache import MemoryCache
 
 
 # --- Configuração de Segurança ---
@@ -16,8 +23,18 @@ SECRET_KEY = os.getenv("JWT_KEY")  # Key para proteção do sistema de criação
 ALGORITHM = "HS256"  # Algoritmo de criação dos tokens
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 
 
+# --- Configuração do Cache de Tokens ---
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))  # Tempo que um token verificado dispensa o BD (0 = desligado)
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))  # Limite por worker (cada item tem poucas centenas de bytes)
+
+# --- Configuração do Hash de Senhas ---
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Custo do bcrypt; hashes com outro custo são refeitos no login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # Processos dedicados ao bcrypt (0 = threadpool da API)
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))  # Hashes aguardando além dos que estão rodando
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))  # Segundos sugeridos no 503
+
 # Contexto para hashing de senhas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # Esquema OAuth2 que aponta para o nosso futuro endpoint de login (Serve para extrair o token do cabeçalho)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
@@ -33,6 +50,102 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifica a senha e, se o hash usar um custo diferente do atual, devolve o hash novo (senão None).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _noop() -> None:
+    pass
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    Executa o bcrypt fora do event loop, num pool de processos dedicado (escapa do GIL e não disputa
+    o threadpool com as outras rotas). A fila é limitada: quando está cheia a chamada falha na hora
+    com PasswordHasherBusy, em vez de acumular logins esperando.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.capacity = max(workers, 1) + max_queue  # Rodando + aguardando
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def start(self) -> None:
+        """Sobe os processos antes do primeiro login (o "spawn" leva um tempo)."""
+        if self.workers > 0:
+            pool = self._get_pool()
+            for _ in range(self.workers):
+                pool.submit(_noop)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(func, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "capacity": self.capacity, "rejected": self.rejected}
+
+
+password_hasher = PasswordHasher()
+
+
+def _busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Servidor ocupado processando outros logins, tente novamente em instantes.",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+    )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Versão do verify_and_update_password para os endpoints "async def" (roda no pool do bcrypt).
+    """
+    try:
+        return await password_hasher.run(verify_and_update_password, plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _busy_exception()
+
+
+async def get_password_hash_async(password: str) -> str:
+    try:
+        return await password_hasher.run(get_password_hash, password)
+    except PasswordHasherBusy:
+        raise _busy_exception()
+
+
 # Criando o token de acesso de acordo com o tempo
 def create_access_token(data: dict):
     """
@@ -45,9 +158,70 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+class TokenCache:
+    """
+    Usuários já verificados, indexados por "<username>:<hash do token>", para não consultar o BD a cada requisição.
+    Só dispensa a consulta: quem revoga os tokens é a token_version do usuário, conferida no BD a cada falta.
+    Cada worker tem o seu cache; por isso o TTL é curto: é o atraso máximo para uma troca de senha (ou remoção)
+    feita em outro worker valer aqui.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self._items = MemoryCache(max_entries=max_entries, ttl=ttl) if ttl > 0 and max_entries > 0 else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(username: str, token: str) -> str:
+        return f"{username}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+    def get(self, username: str, token: str):
+        if self._items is None:
+            return None
+        user = self._items.get(self._key(username, token))
+        with self._lock:
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return user
+
+    def set(self, username: str, token: str, user) -> None:
+        if self._items is not None:
+            self._items.set(self._key(username, token), user)
+
+    def invalidate(self, username: str) -> int:
+        """Remove todos os tokens do usuário (senha alterada ou usuário removido)."""
+        if self._items is None:
+            return 0
+        return self._items.delete_prefix(f"{username}:")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": self._items.size() if self._items is not None else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+            }
+
+
+token_cache = TokenCache()
+
+
+def invalidate_user(username: str) -> None:
+    token_cache.invalidate(username)
+
+
 # Função de defesa dos endpoints/verificação do token
 # OBS: O "Depends" é o gerenciador de dependencia
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_session)):
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(database.get_async_session)
+):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
@@ -56,14 +230,21 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])  # Verificação do Token (ler o payload dele e ver se existe o vinculo com o username)
         username: str = payload.get("sub")
+        version = payload.get("ver", 0)  # Tokens sem "ver" são de antes da token_version
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    #Verificação de usuário com o banco de dados
-    statement = select(models.User).where(models.User.username == username)
-    user = db.exec(statement).first()
-    if user is None:
+    # Token já verificado há pouco: dispensa a consulta ao banco
+    user = token_cache.get(username, token)
+    request.state.auth_cache = "miss" if user is None else "hit"  # Vai para o cabeçalho Server-Timing
+    if user is not None:
+        return user
+
+    #Verificação de usuário com o banco de dados (assíncrona, para não ocupar uma thread em cada requisição)
+    user = await crud_async.get_user_by_username(db, username=username)
+    if user is None or version != (user.token_version or 0):  # Usuário removido ou senha trocada depois do token
         raise credentials_exception
+    token_cache.set(username, token, user)
     return user
\ No newline at end of file
@@ -0,0 +1,111 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from . import blobs, crud, models, schemas, uploads, worker
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do Upload em Lote ---
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))  # Máximo de arquivos por lote (somando os de dentro dos .zip)
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "4"))  # Contratos analisados ao mesmo tempo
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+
+def _remove(upload: uploads.StoredUpload) -> None:
+    if os.path.exists(upload.path):
+        os.remove(upload.path)
+
+
+def discard_all(stored: list[uploads.StoredUpload]) -> None:
+    """Remove os arquivos de um lote recusado antes da análise."""
+    for upload in stored:
+        _remove(upload)
+
+
+def expand_archives(received: list[uploads.StoredUpload]) -> list[uploads.StoredUpload]:
+    """
+    Substitui cada .zip recebido pelos arquivos de dentro dele.
+    """
+    expanded: list[uploads.StoredUpload] = []
+    try:
+        for index, upload in enumerate(received):
+            if upload.filename.lower().endswith(".zip"):
+                remaining = BATCH_MAX_FILES - len(expanded) - (len(received) - index - 1)
+                expanded.extend(uploads.expand_zip(upload, max_files=remaining))
+            else:
+                expanded.append(upload)
+    except Exception:
+        # Um zip inválido cancela o lote inteiro: remove tudo o que já foi gravado
+        for upload in expanded + received[index + 1:]:
+            _remove(upload)
+        raise
+    return expanded
+
+
+def run_batch(db: Session, received: list[uploads.StoredUpload], parallelism: int | None = None) -> schemas.BatchResult:
+    """
+    Cria os contratos do lote e os seus jobs numa única transação e analisa os arquivos em paralelo
+    (até `parallelism` ao mesmo tempo). Uma falha marca como "failed" apenas o contrato afetado.
+    Os jobs ficam em nome deste processo: se ele for encerrado ou cair antes do fim do lote, os contratos
+    que faltavam voltam para a fila e são analisados pelos workers.
+    """
+    parallelism = parallelism or BATCH_MAX_PARALLELISM
+    items: list[schemas.BatchItemResult | None] = [None] * len(received)
+    accepted: list[tuple[int, uploads.StoredUpload]] = []
+
+    # Verificando os nomes de todos os arquivos numa única consulta
+    existing = crud.get_existing_filenames(db, [upload.filename for upload in received])
+    for index, upload in enumerate(received):
+        if not upload.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            items[index] = schemas.BatchItemResult(filename=upload.filename, status="rejected",
+                                                   error="Formato de arquivo não suportado.")
+        elif upload.filename in existing:
+            items[index] = schemas.BatchItemResult(filename=upload.filename, status="duplicate",
+                                                   error="Um contrato com este nome de arquivo já existe.")
+        else:
+            existing.add(upload.filename)  # Também recusa nomes repetidos dentro do próprio lote
+            accepted.append((index, upload))
+            continue
+        _remove(upload)
+
+    # Originais guardados pelo hash antes de criar os contratos (a mesma regra do upload individual)
+    try:
+        for _, upload in accepted:
+            blobs.store.put(upload.path, upload.sha256)
+    except Exception:
+        logger.exception("Falha ao guardar os arquivos originais do lote")
+        discard_all([upload for _, upload in accepted])
+        raise HTTPException(status_code=503, detail="Não foi possível guardar os arquivos. Tente novamente.")
+    jobs = crud.enqueue_claimed_contracts(db, [upload.filename for _, upload in accepted],
+                                          [upload.path for _, upload in accepted],
+                                          [upload.sha256 for _, upload in accepted], owner=worker.owner_id())
+    logger.info("Lote enviado para análise", extra={"contracts": len(jobs)})
+
+    bind = db.get_bind()
+
+    def analyze(job_id: int) -> str | None:
+        # Cada análise usa a sua própria sessão, já que as sessões não podem ser compartilhadas entre threads
+        with Session(bind) as own_db:
+            return worker.process_job(own_db, own_db.get(models.Job, job_id))
+
+    if accepted:
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(accepted)), thread_name_prefix="batch") as pool:
+            errors = list(pool.map(analyze, [job.id for job in jobs]))
+    else:
+        errors = []
+
+    for (index, upload), job, error in zip(accepted, jobs, errors):
+        items[index] = schemas.BatchItemResult(filename=upload.filename, contract_id=job.contract_id,
+                                               status="failed" if error else "completed", error=error)
+
+    return schemas.BatchResult(
+        total=len(items),
+        completed=sum(item.status == "completed" for item in items),
+        failed=sum(item.status == "failed" for item in items),
+        skipped=sum(item.status in ("duplicate", "rejected") for item in items),
+        items=items,
+    )
@@ -0,0 +1,185 @@
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import uuid
+from typing import Iterator
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do Armazenamento dos Arquivos Originais ---
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")  # "local" (pasta do servidor) ou "s3" (S3 ou compatível, ex.: MinIO)
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")  # Raiz do armazenamento local
+BLOB_S3_BUCKET = os.getenv("BLOB_S3_BUCKET")
+BLOB_S3_PREFIX = os.getenv("BLOB_S3_PREFIX", "contracts/")
+BLOB_S3_ENDPOINT_URL = os.getenv("BLOB_S3_ENDPOINT_URL")  # Para MinIO/serviços compatíveis (vazio = AWS)
+# Segundos entre a deleção do último contrato e a remoção do arquivo (ver crud.sweep_blobs)
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+BLOB_CHUNK_BYTES = 256 * 1024  # Tamanho dos blocos ao repassar um arquivo do S3
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def _shard(sha256: str) -> str:
+    """ab/cd/abcd...: duas camadas de pastas para nenhuma pasta acumular milhões de arquivos."""
+    if not SHA256_PATTERN.match(sha256):
+        raise ValueError(f"Hash de arquivo inválido: {sha256!r}")
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class LocalBlobStore:
+    """
+    Arquivos endereçados pelo SHA-256 numa pasta local. O mesmo conteúdo é guardado uma única vez,
+    e o arquivo recebido no upload entra por hard link quando está no mesmo disco (sem copiar os bytes).
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, _shard(sha256))
+
+    def put(self, source_path: str, sha256: str) -> bool:
+        """Guarda o arquivo; retorna False quando o conteúdo já estava guardado."""
+        path = self._path(sha256)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(source_path, temporary)
+        except OSError:  # Outro disco (ou sistema sem hard links): copia
+            shutil.copyfile(source_path, temporary)
+        os.replace(temporary, path)  # Atômico: quem lê nunca vê um arquivo pela metade
+        return True
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self._path(sha256))
+
+    def size(self, sha256: str) -> int | None:
+        try:
+            return os.path.getsize(self._path(sha256))
+        except FileNotFoundError:
+            return None
+
+    def local_path(self, sha256: str) -> str | None:
+        """Caminho do arquivo no disco, para o envio direto pelo servidor (sendfile)."""
+        path = self._path(sha256)
+        return path if os.path.exists(path) else None
+
+    def iter_range(self, sha256: str, start: int, end: int) -> Iterator[bytes]:
+        with open(self._path(sha256), "rb") as file:
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0 and (block := file.read(min(BLOB_CHUNK_BYTES, remaining))):
+                remaining -= len(block)
+                yield block
+
+    def delete(self, sha256: str) -> None:
+        try:
+            os.remove(self._path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore:
+    """
+    Arquivos endereçados pelo SHA-256 num bucket S3 (ou compatível). O boto3 só é carregado quando
+    este backend é usado; `client` permite passar um cliente já configurado (ou um substituto nos testes).
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str | None = BLOB_S3_BUCKET, prefix: str = BLOB_S3_PREFIX, client=None,
+                 endpoint_url: str | None = BLOB_S3_ENDPOINT_URL):
+        if not bucket:
+            raise ValueError("BLOB_S3_BUCKET não configurado para o armazenamento em S3")
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client
+
+    def _key(self, sha256: str) -> str:
+        return f"{self.prefix}{_shard(sha256)}"
+
+    def _head(self, sha256: str) -> dict | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(sha256))
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, source_path: str, sha256: str) -> bool:
+        if self._head(sha256) is not None:
+            return False
+        self.client.upload_file(source_path, self.bucket, self._key(sha256))
+        return True
+
+    def exists(self, sha256: str) -> bool:
+        return self._head(sha256) is not None
+
+    def size(self, sha256: str) -> int | None:
+        head = self._head(sha256)
+        return head["ContentLength"] if head is not None else None
+
+    def local_path(self, sha256: str) -> str | None:
+        return None  # Sempre repassado em blocos pela API
+
+    def iter_range(self, sha256: str, start: int, end: int) -> Iterator[bytes]:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(sha256), Range=f"bytes={start}-{end}")
+        yield from response["Body"].iter_chunks(BLOB_CHUNK_BYTES)
+
+    def delete(self, sha256: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(sha256))
+
+
+def create_store(name: str = BLOB_BACKEND):
+    if name == "local":
+        return LocalBlobStore()
+    if name == "s3":
+        return S3BlobStore()
+    raise ValueError(f"Backend de armazenamento não suportado: {name}")
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Intervalo (início, fim inclusivo) de um cabeçalho `Range: bytes=...` com um único intervalo.
+    Retorna None para enviar o arquivo inteiro (sem Range ou com vários intervalos).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:  # "bytes=-500": os últimos 500 bytes
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def media_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def content_disposition(filename: str) -> str:
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+# Armazenamento usado pelo upload, pelo download e pela deleção dos contratos
+store = create_store()
@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+# --- Configuração do Cache ---
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory", "sqlite" (compartilhado entre workers) ou "none"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))  # Limite de itens no cache em memória
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "604800"))  # Validade de cada item (padrão: 7 dias, 0 = sem validade)
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "cache.db")
+
+# --- Configuração do Cache de Detalhes (GET /contracts/{contract_name}) ---
+# "memory" só é invalidado pelo próprio processo; "sqlite" é invalidado por todos os processos da máquina.
+# "auto" usa o sqlite quando os contratos são alterados por outros processos (workers "python -m app.worker" ou
+# em processos; o app.server também escolhe o sqlite quando o gunicorn tem mais de um worker)
+DETAIL_CACHE_BACKEND = os.getenv("DETAIL_CACHE_BACKEND", "auto")
+if DETAIL_CACHE_BACKEND == "auto":
+    _shared = os.getenv("WORKER_MODE", "inprocess") == "external" or os.getenv("WORKER_KIND", "thread") == "process"
+    DETAIL_CACHE_BACKEND = "sqlite" if _shared else "memory"
+DETAIL_CACHE_MAX_ENTRIES = int(os.getenv("DETAIL_CACHE_MAX_ENTRIES", "10000"))
+DETAIL_CACHE_TTL_SECONDS = float(os.getenv("DETAIL_CACHE_TTL_SECONDS", "300"))  # Limita o atraso quando outro processo altera o contrato
+
+
+class MemoryCache:
+    """
+    Cache LRU em memória, com limite de itens e validade (TTL). Vale apenas para o processo atual.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float | None, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.time():
+                del self._items[key]  # Item vencido
+                return None
+            self._items.move_to_end(key)  # Marca como usado recentemente
+            return value
+
+    def set(self, key: str, value) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)  # Remove o item usado há mais tempo
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._items if key.startswith(prefix)]
+            for key in keys:
+                del self._items[key]
+            return len(keys)
+
+    def size(self) -> int:
+        return len(self._items)
+
+
+class SQLiteCache:
+    """
+    Cache em arquivo SQLite, compartilhado por todos os workers do gunicorn na mesma máquina.
+    Os valores são guardados em JSON.
+    """
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, ttl: float = CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()  # Uma conexão por thread (o sqlite3 não compartilha conexões entre threads)
+        db = self._connection()
+        db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        db.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():  # Não reaproveita a conexão herdada num fork (preload do gunicorn)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")  # Leitores não bloqueiam o escritor
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def get(self, key: str):
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        db = self._connection()
+        db.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                   (key, json.dumps(value), expires_at))
+        db.commit()
+
+    def delete(self, key: str) -> None:
+        db = self._connection()
+        db.execute("DELETE FROM cache WHERE key = ?", (key,))
+        db.commit()
+
+    def delete_prefix(self, prefix: str) -> int:
+        db = self._connection()
+        cursor = db.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        db.commit()
+        return cursor.rowcount
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ContentCache:
+    """
+    Cache endereçado por conteúdo, separado em namespaces ("text", "analysis"...),
+    com contadores de acertos (hits) e falhas (misses) por namespace.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+
+    def _count(self, namespace: str, counter: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {"hits": 0, "misses": 0})
+            counters[counter] += 1
+
+    def get(self, namespace: str, key: str):
+        if self.backend is None:
+            return None
+        value = self.backend.get(f"{namespace}:{key}")
+        self._count(namespace, "misses" if value is None else "hits")
+        return value
+
+    def set(self, namespace: str, key: str, value) -> None:
+        if self.backend is not None:
+            self.backend.set(f"{namespace}:{key}", value)
+
+    def invalidate(self, namespace: str) -> int:
+        """Apaga todos os itens de um namespace (ex.: "analysis" quando o prompt mudar)."""
+        if self.backend is None:
+            return 0
+        return self.backend.delete_prefix(f"{namespace}:")
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = {
+                namespace: {
+                    **counters,
+                    "hit_rate": counters["hits"] / (counters["hits"] + counters["misses"]),
+                }
+                for namespace, counters in self._counters.items()
+            }
+        return {
+            "backend": CACHE_BACKEND if self.backend is not None else "none",
+            "size": self.backend.size() if self.backend is not None else 0,
+            "namespaces": namespaces,
+        }
+
+
+class DetailCache:
+    """
+    Respostas prontas do detalhe dos contratos (corpo JSON + ETag), guardadas pelo id e com um apontador
+    nome do arquivo -> id. Só entram contratos concluídos ou com falha (os em análise mudam a todo momento).
+    O crud invalida a entrada a cada alteração, e uma leitura do banco iniciada antes de uma invalidação
+    não grava o resultado (contador `generation`), para a versão antiga não voltar ao cache.
+    """
+
+    CACHEABLE_STATUSES = ("completed", "failed")
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, filename: str) -> dict | None:
+        if self.backend is None:
+            return None
+        contract_id = self.backend.get(f"detail:name:{filename}")
+        entry = self.backend.get(f"detail:id:{contract_id}") if contract_id is not None else None
+        if entry is not None and entry["filename"] != filename:  # Apontador antigo (contrato apagado e id reutilizado)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if metrics.METRICS_ENABLED:
+            metrics.DETAIL_CACHE_REQUESTS.labels(result="miss" if entry is None else "hit").inc()
+        return entry
+
+    def set(self, entry: dict, generation: int) -> None:
+        """Guarda `entry` (id, filename, status, body, etag) se nada foi invalidado desde `generation`."""
+        if self.backend is None or entry["status"] not in self.CACHEABLE_STATUSES:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self.backend.set(f"detail:id:{entry['id']}", entry)
+            self.backend.set(f"detail:name:{entry['filename']}", entry["id"])
+
+    def invalidate(self, contract_id: int, filename: str | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+        if self.backend is not None:
+            self.backend.delete(f"detail:id:{contract_id}")
+            if filename is not None:
+                self.backend.delete(f"detail:name:{filename}")
+
+    def clear(self) -> int:
+        with self._lock:
+            self._generation += 1
+        return self.backend.delete_prefix("detail:") if self.backend is not None else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": DETAIL_CACHE_BACKEND if self.backend is not None else "none",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+            }
+
+
+def create_backend(name: str = CACHE_BACKEND, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+    if name == "memory":
+        return MemoryCache(max_entries, ttl)
+    if name == "sqlite":
+        return SQLiteCache(ttl=ttl)
+    if name == "none":
+        return None
+    raise ValueError(f"Backend de cache não suportado: {name}")
+
+
+# Cache usado pela extração e pela análise da IA
+content_cache = ContentCache(create_backend())
+
+# Cache do GET /contracts/{contract_name}, invalidado pelo crud
+detail_cache = DetailCache(create_backend(DETAIL_CACHE_BACKEND, DETAIL_CACHE_MAX_ENTRIES, DETAIL_CACHE_TTL_SECONDS))
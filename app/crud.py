@@ -1,8 +1,12 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, update
 from sqlmodel import Session, select
-from . import models, auth, schemas
+from . import models, auth, blobs, cache, metrics, normalization, schemas
 
 
 # --- Funções de Usuário 
+@metrics.db_operation
 def get_user_by_username(db: Session, username: str):
     """
     Busca o usuário no BD pelo seu nome
@@ -10,6 +14,7 @@ def get_user_by_username(db: Session, username: str):
     statement = select(models.User).where(models.User.username == username)  # definição da pesquisa
     return db.exec(statement).first()  # Execução da pesquisa pelo db
 
+@metrics.db_operation
 def create_user(db: Session, user: schemas.UserCreate):
     """
     Cria o usuário no BD
@@ -23,6 +28,7 @@ def create_user(db: Session, user: schemas.UserCreate):
 
 
 # --- Funções de Contrato 
+@metrics.db_operation
 def get_contract_by_filename(db: Session, filename: str):
     """
     Busca o contrato no BD pelo seu nome
@@ -30,6 +36,7 @@ def get_contract_by_filename(db: Session, filename: str):
     statement = select(models.Contract).where(models.Contract.filename == filename)  # Definição da pesquisa
     return db.exec(statement).first() # Execução da pesquisa pelo db pegar o primeiro item (.first())
 
+@metrics.db_operation
 def create_contract(db: Session, filename: str):
     """
     Cria o contract no BD
@@ -40,9 +47,59 @@ def create_contract(db: Session, filename: str):
     db.refresh(db_contract)
     return db_contract
 
-def update_contract_with_data(db: Session, contract_id: int, data: schemas.ContractData):
+@metrics.db_operation
+def get_existing_filenames(db: Session, filenames: list[str]) -> set[str]:
+    """
+    Dentre os nomes informados, retorna os que já existem no BD (uma única consulta)
+    """
+    if not filenames:
+        return set()
+    statement = select(models.Contract.filename).where(models.Contract.filename.in_(filenames))
+    return set(db.exec(statement).all())
+
+@metrics.db_operation
+def enqueue_claimed_contracts(db: Session, filenames: list[str], file_paths: list[str], content_hashes: list[str],
+                              owner: str) -> list[models.Job]:
+    """
+    Cria vários contracts e os seus jobs numa única transação (usado no upload em lote). Os jobs já nascem
+    em "running" em nome de `owner` (o processo que analisa o lote), então os workers da fila não os pegam,
+    mas o encerramento ou a queda desse processo os devolve à fila como qualquer outro job.
+    """
+    now = datetime.now(timezone.utc)
+    db_contracts = [models.Contract(filename=filename, status="processing", blob_hash=content_hash)
+                    for filename, content_hash in zip(filenames, content_hashes)]
+    db.add_all(db_contracts)
+    db.flush()  # Gera os ids dos contratos sem encerrar a transação
+    db_jobs = [models.Job(contract_id=db_contract.id, file_path=file_path, content_hash=content_hash,
+                          status="running", started_at=now, attempts=1, owner=owner)
+               for db_contract, file_path, content_hash in zip(db_contracts, file_paths, content_hashes)]
+    db.add_all(db_jobs)
+    db.commit()
+    for db_job in db_jobs:
+        db.refresh(db_job)
+    return db_jobs
+
+@metrics.db_operation
+def enqueue_contract(db: Session, filename: str, file_path: str, content_hash: str | None = None,
+                     blob_hash: str | None = None):
     """
-    Atualiza informações de algum contract
+    Cria o contract e o seu job de processamento na mesma transação
+    (assim nunca fica um contrato em "processing" sem job na fila)
+    """
+    db_contract = models.Contract(filename=filename, status="processing", blob_hash=blob_hash)
+    db.add(db_contract)
+    db.flush()  # Gera o id do contrato sem encerrar a transação
+    db.add(models.Job(contract_id=db_contract.id, file_path=file_path, content_hash=content_hash))
+    db.commit()
+    db.refresh(db_contract)
+    return db_contract
+
+@metrics.db_operation
+def update_contract_with_data(db: Session, contract_id: int, data: schemas.ContractData, text: str | None = None,
+                              analyzer_version: str | None = None):
+    """
+    Atualiza informações de algum contract, preenchendo também as colunas tipadas da normalização
+    (e guarda o texto extraído, usado pela busca textual e pela reanálise, e a versão do analisador)
     """
     db_contract = db.get(models.Contract, contract_id)
     if db_contract:
@@ -51,11 +108,24 @@ def update_contract_with_data(db: Session, contract_id: int, data: schemas.Contr
                                                            # a alteração neles
         for key, value in update_data.items():  # Aqui é feito de fato a att par cada item requisitado
             setattr(db_contract, key, value)  # aqui settamos os valores alterados
+        for key, value in normalization.normalize(data).items():  # Colunas tipadas (valor, moeda, datas, partes)
+            setattr(db_contract, key, value)
+        db_contract.normalization_version = normalization.NORMALIZATION_VERSION
         db_contract.status = "completed"
+        if analyzer_version is not None:
+            db_contract.analyzer_version = analyzer_version
+        if text is not None:
+            db_text = db.get(models.ContractText, contract_id)
+            if db_text is None:
+                db.add(models.ContractText(contract_id=contract_id, text=text))
+            else:
+                db_text.text = text
         db.commit()
+        cache.detail_cache.invalidate(contract_id, db_contract.filename)
         db.refresh(db_contract)
     return db_contract
 
+@metrics.db_operation
 def update_contract_status(db: Session, contract_id: int, status: str):
     """
     Atualiza apenas o status do contrato
@@ -64,23 +134,147 @@ def update_contract_status(db: Session, contract_id: int, status: str):
     if db_contract:
         db_contract.status = status
         db.commit()
+        cache.detail_cache.invalidate(contract_id, db_contract.filename)
         db.refresh(db_contract)
     return db_contract
 
 
+@metrics.db_operation
 def get_all_contract_filenames(db: Session):
     # Seleciona a coluna dos "filename" do objeto "Contract"
     statement = select(models.Contract.filename)
     return db.exec(statement).all()  # Aqui a pesquisa statment é feita pelo db e retornada a lista, (.all())
 
 
+@metrics.db_operation
 def delete_contract(db: Session, contract_id: int) -> models.Contract | None:
     """
     Encontra um contrato pelo ID e o deleta do banco de dados.
     """
     db_contract = db.get(models.Contract, contract_id)
     if db_contract:
+        # Remove também os jobs do contrato, para a fila não apontar para um contrato inexistente
+        for db_job in db.exec(select(models.Job).where(models.Job.contract_id == contract_id)).all():
+            db.delete(db_job)
+        db_text = db.get(models.ContractText, contract_id)
+        if db_text:
+            db.delete(db_text)
+        filename, blob_hash = db_contract.filename, db_contract.blob_hash
         db.delete(db_contract)
+        if blob_hash:  # O arquivo original fica para a limpeza adiada (sweep_blobs)
+            db.merge(models.BlobDeletion(sha256=blob_hash))
         db.commit()
+        cache.detail_cache.invalidate(contract_id, filename)
+        sweep_blobs(db)
         return db_contract
-    return None # Retorna None se o contrato não for encontrado
\ No newline at end of file
+    return None # Retorna None se o contrato não for encontrado
+
+
+@metrics.db_operation
+def sweep_blobs(db: Session, grace_seconds: float | None = None) -> int:
+    """
+    Apaga do armazenamento os arquivos marcados na deleção há mais de `grace_seconds` que continuam sem contrato.
+    A marca é retirada antes (só um processo fica com ela) e as referências são contadas na mesma transação;
+    um arquivo que voltou a ser usado só perde a marca. Retorna quantos arquivos foram apagados.
+    """
+    grace_seconds = blobs.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    marked = db.exec(select(models.BlobDeletion.sha256).where(models.BlobDeletion.marked_at <= cutoff)).all()
+    deleted = 0
+    for blob_hash in marked:
+        claim = delete(models.BlobDeletion).where(models.BlobDeletion.sha256 == blob_hash,
+                                                  models.BlobDeletion.marked_at <= cutoff)
+        claimed = db.exec(claim).rowcount == 1
+        referenced = db.exec(select(func.count()).where(models.Contract.blob_hash == blob_hash)).one()
+        db.commit()
+        if claimed and not referenced:
+            blobs.store.delete(blob_hash)
+            deleted += 1
+    return deleted
+
+
+# --- Funções da Fila de Processamento
+@metrics.db_operation
+def claim_next_job(db: Session, owner: str | None = None) -> models.Job | None:
+    """
+    Pega o próximo job da fila e o marca como "running" em nome de `owner` (o processo do worker).
+    O UPDATE condicional garante que dois workers nunca peguem o mesmo job.
+    """
+    while True:
+        statement = select(models.Job.id).where(models.Job.status == "queued").order_by(models.Job.id).limit(1)
+        job_id = db.exec(statement).first()
+        if job_id is None:
+            return None  # Fila vazia
+
+        claim = (
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.status == "queued")
+            .values(status="running", started_at=datetime.now(timezone.utc), attempts=models.Job.attempts + 1,
+                    owner=owner)
+        )
+        result = db.exec(claim)
+        db.commit()
+        if result.rowcount == 1:
+            return db.get(models.Job, job_id)
+        # Outro worker pegou esse job antes, tenta o próximo
+
+
+@metrics.db_operation
+def fail_exhausted_jobs(db: Session, owner: str, max_attempts: int) -> list[int]:
+    """
+    Jobs em "running" de um processo que saiu ou morreu e que já foram tentados `max_attempts` vezes: o arquivo
+    derruba ou trava o worker, então o job e o contrato vão para "failed" em vez de voltar à fila.
+    Retorna os ids dos contratos.
+    """
+    statement = select(models.Job).where(models.Job.status == "running", models.Job.owner == owner,
+                                         models.Job.attempts >= max_attempts)
+    jobs = db.exec(statement).all()
+    for job in jobs:
+        job.status = "failed"
+        job.error = f"Análise interrompida {job.attempts} vezes (o arquivo derruba ou trava o worker)."
+        job.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    contract_ids = [job.contract_id for job in jobs]
+    for contract_id in contract_ids:
+        update_contract_status(db, contract_id, "failed")
+    return contract_ids
+
+
+@metrics.db_operation
+def requeue_jobs(db: Session, owner: str) -> int:
+    """
+    Devolve à fila os jobs em "running" de um processo que está saindo ou que morreu (o contrato continua
+    em "processing" e é retomado por outro worker). Retorna quantos jobs voltaram.
+    """
+    statement = (
+        update(models.Job)
+        .where(models.Job.status == "running", models.Job.owner == owner)
+        .values(status="queued", owner=None, started_at=None)
+    )
+    result = db.exec(statement)
+    db.commit()
+    return result.rowcount
+
+
+@metrics.db_operation
+def finish_job(db: Session, job_id: int, status: str, error: str | None = None):
+    """
+    Finaliza o job com "done" ou "failed"
+    """
+    db_job = db.get(models.Job, job_id)
+    if db_job:
+        db_job.status = status
+        db_job.error = error
+        db_job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(db_job)
+    return db_job
+
+
+@metrics.db_operation
+def count_jobs_by_status(db: Session) -> dict[str, int]:
+    """
+    Conta os jobs agrupados por status (usado para ver o tamanho da fila)
+    """
+    statement = select(models.Job.status, func.count()).group_by(models.Job.status)
+    return {status: total for status, total in db.exec(statement).all()}
\ No newline at end of file
@@ -0,0 +1,309 @@
+from datetime import datetime, timedelta, timezone
+
+from anyio import to_thread
+from sqlalchemy import delete, func, null
+from sqlalchemy import select as select_columns
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import blobs, cache, metrics, models
+
+# Versões assíncronas das funções do crud, para os endpoints "async def" (mesmos nomes e comportamento).
+# O worker e o lote continuam usando o crud síncrono, já que rodam em threads/processos próprios.
+
+
+# --- Funções de Usuário
+@metrics.db_operation
+async def get_user_by_username(db: AsyncSession, username: str):
+    """
+    Busca o usuário no BD pelo seu nome
+    """
+    statement = select(models.User).where(models.User.username == username)
+    return (await db.exec(statement)).first()
+
+
+@metrics.db_operation
+async def create_user(db: AsyncSession, username: str, hashed_password: str):
+    """
+    Cria o usuário no BD (o hash da senha é calculado antes, no pool do bcrypt)
+    """
+    db_user = models.User(username=username, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@metrics.db_operation
+async def update_user_password_hash(db: AsyncSession, user: models.User, hashed_password: str):
+    """
+    Grava um novo hash da mesma senha (rehash no login quando o custo do bcrypt muda)
+    """
+    user.hashed_password = hashed_password
+    db.add(user)
+    await db.commit()
+    return user
+
+@metrics.db_operation
+async def update_user_password(db: AsyncSession, user_id: int, hashed_password: str):
+    """
+    Troca a senha do usuário e revoga os tokens emitidos antes (nova token_version), descartando também
+    os que estavam no cache de autenticação deste processo
+    """
+    from . import auth  # Import tardio: o auth também importa este módulo
+    db_user = await db.get(models.User, user_id)
+    if db_user:
+        db_user.hashed_password = hashed_password
+        db_user.token_version = (db_user.token_version or 0) + 1
+        await db.commit()
+        auth.invalidate_user(db_user.username)
+    return db_user
+
+@metrics.db_operation
+async def delete_user(db: AsyncSession, user_id: int) -> models.User | None:
+    """
+    Remove o usuário e descarta os tokens dele que estavam no cache de autenticação
+    """
+    from . import auth  # Import tardio: o auth também importa este módulo
+    db_user = await db.get(models.User, user_id)
+    if db_user:
+        await db.delete(db_user)
+        await db.commit()
+        auth.invalidate_user(db_user.username)
+        return db_user
+    return None
+
+
+# --- Funções de Contrato
+@metrics.db_operation
+async def get_contract(db: AsyncSession, contract_id: int):
+    """
+    Busca o contrato no BD pelo seu ID
+    """
+    return await db.get(models.Contract, contract_id)
+
+@metrics.db_operation
+async def get_contract_by_filename(db: AsyncSession, filename: str):
+    """
+    Busca o contrato no BD pelo seu nome
+    """
+    statement = select(models.Contract).where(models.Contract.filename == filename)
+    return (await db.exec(statement)).first()
+
+@metrics.db_operation
+async def get_existing_filenames(db: AsyncSession, filenames: list[str]) -> set[str]:
+    """
+    Dentre os nomes informados, retorna os que já existem no BD (uma única consulta)
+    """
+    if not filenames:
+        return set()
+    statement = select(models.Contract.filename).where(models.Contract.filename.in_(filenames))
+    return set((await db.exec(statement)).all())
+
+@metrics.db_operation
+async def enqueue_contract(db: AsyncSession, filename: str, file_path: str, content_hash: str | None = None,
+                           blob_hash: str | None = None):
+    """
+    Cria o contract e o seu job de processamento na mesma transação
+    """
+    db_contract = models.Contract(filename=filename, status="processing", blob_hash=blob_hash)
+    db.add(db_contract)
+    await db.flush()  # Gera o id do contrato sem encerrar a transação
+    db.add(models.Job(contract_id=db_contract.id, file_path=file_path, content_hash=content_hash))
+    await db.commit()
+    await db.refresh(db_contract)
+    return db_contract
+
+@metrics.db_operation
+async def update_contract_status(db: AsyncSession, contract_id: int, status: str):
+    """
+    Atualiza apenas o status do contrato
+    """
+    db_contract = await db.get(models.Contract, contract_id)
+    if db_contract:
+        db_contract.status = status
+        await db.commit()
+        cache.detail_cache.invalidate(contract_id, db_contract.filename)
+        await db.refresh(db_contract)
+    return db_contract
+
+async def iter_contract_filenames(db: AsyncSession, batch_size: int = 1000):
+    """
+    Percorre os nomes de todos os contratos em blocos (paginação por id), sem carregar a tabela inteira
+    """
+    last_id = 0
+    while True:
+        statement = (
+            select(models.Contract.id, models.Contract.filename)
+            .where(models.Contract.id > last_id)
+            .order_by(models.Contract.id)
+            .limit(batch_size)
+        )
+        rows = (await db.exec(statement)).all()
+        if not rows:
+            return
+        yield [filename for _, filename in rows]
+        last_id = rows[-1][0]
+
+@metrics.db_operation
+async def list_contracts(db: AsyncSession, fields: list[str], limit: int, order_by: str = "id",
+                         after=None, status: str | None = None) -> list[dict]:
+    """
+    Uma página da listagem de contratos (paginação por chave: "onde a página anterior parou", sem OFFSET).
+    Retorna até limit + 1 itens; o item extra indica que existe uma próxima página.
+    """
+    order_column = getattr(models.Contract, order_by)
+    statement = select_columns(*(getattr(models.Contract, field) for field in fields))
+    if status is not None:
+        statement = statement.where(models.Contract.status == status)
+    if after is not None:
+        statement = statement.where(order_column > after)
+    statement = statement.order_by(order_column).limit(limit + 1)
+    return [dict(row) for row in (await db.exec(statement)).mappings().all()]
+
+async def iter_contract_rows(db: AsyncSession, fields: list[str], batch_size: int, status: str | None = None,
+                             updated_since: datetime | None = None):
+    """
+    Percorre os contratos em ordem de id com um cursor do lado do servidor (yield_per): o banco entrega
+    `batch_size` linhas por vez, então a memória não depende do tamanho da tabela. Retorna tuplas na ordem de `fields`.
+    """
+    statement = select_columns(*(getattr(models.Contract, field) for field in fields))
+    if status is not None:
+        statement = statement.where(models.Contract.status == status)
+    if updated_since is not None:
+        if updated_since.tzinfo is None:  # Sem fuso informado: considera UTC, como as datas gravadas
+            updated_since = updated_since.replace(tzinfo=timezone.utc)
+        statement = statement.where(models.Contract.updated_at >= updated_since)
+    statement = statement.order_by(models.Contract.id).execution_options(yield_per=batch_size)
+    result = await db.stream(statement)
+    async for rows in result.partitions():
+        yield rows
+
+def _month(db: AsyncSession, column):
+    """Expressão "AAAA-MM" de uma data (a função muda de um banco para outro)"""
+    if db.bind.dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+@metrics.db_operation
+async def aggregate_contracts(db: AsyncSession, group_by: str, limit: int, status: str | None = None,
+                              currency: str | None = None, min_cents: int | None = None,
+                              max_cents: int | None = None) -> list[dict]:
+    """
+    Contagem e soma dos valores dos contratos agrupadas por parte, status, mês de início ou moeda,
+    calculadas inteiramente no banco sobre as colunas tipadas (nenhum contrato é carregado).
+    Os grupos também são separados por moeda, já que somar reais com dólares não faz sentido.
+    """
+    contract = models.Contract
+    label = null()
+    if group_by in ("contracting_party", "contracted_party"):
+        key = getattr(contract, f"{group_by}_key")
+        label = func.min(getattr(contract, group_by))  # Um dos nomes como aparece nos contratos
+    elif group_by == "month":
+        key = _month(db, contract.start_date)
+    else:
+        key = getattr(contract, group_by)  # status ou currency
+
+    statement = select_columns(
+        key.label("key"),
+        label.label("label"),
+        contract.currency.label("currency"),
+        func.count().label("count"),
+        func.count(contract.value_cents).label("valued"),
+        func.sum(contract.value_cents).label("total_cents"),
+    )
+    if status is not None:
+        statement = statement.where(contract.status == status)
+    if currency is not None:
+        statement = statement.where(contract.currency == currency)
+    if min_cents is not None:
+        statement = statement.where(contract.value_cents >= min_cents)
+    if max_cents is not None:
+        statement = statement.where(contract.value_cents <= max_cents)
+    statement = statement.group_by(key, contract.currency)
+    if group_by == "month":
+        statement = statement.order_by(key, contract.currency)
+    else:
+        statement = statement.order_by(func.count().desc(), key, contract.currency)
+    return [dict(row) for row in (await db.exec(statement.limit(limit))).mappings().all()]
+
+@metrics.db_operation
+async def delete_contract(db: AsyncSession, contract_id: int) -> models.Contract | None:
+    """
+    Encontra um contrato pelo ID e o deleta do banco de dados (junto com os seus jobs).
+    """
+    db_contract = await db.get(models.Contract, contract_id)
+    if db_contract:
+        for db_job in (await db.exec(select(models.Job).where(models.Job.contract_id == contract_id))).all():
+            await db.delete(db_job)
+        db_text = await db.get(models.ContractText, contract_id)
+        if db_text:
+            await db.delete(db_text)
+        filename, blob_hash = db_contract.filename, db_contract.blob_hash
+        await db.delete(db_contract)
+        if blob_hash:  # O arquivo original fica para a limpeza adiada (sweep_blobs)
+            await db.merge(models.BlobDeletion(sha256=blob_hash))
+        await db.commit()
+        cache.detail_cache.invalidate(contract_id, filename)
+        await sweep_blobs(db)
+        return db_contract
+    return None
+
+
+@metrics.db_operation
+async def discard_blob(db: AsyncSession, blob_hash: str) -> None:
+    """
+    Marca para a limpeza adiada um arquivo original que ficou sem contrato (ex.: o envio falhou depois de guardá-lo).
+    O sweep só apaga se, passado o prazo, nenhum contrato tiver passado a usar o mesmo conteúdo.
+    """
+    await db.merge(models.BlobDeletion(sha256=blob_hash))
+    await db.commit()
+    await sweep_blobs(db)
+
+
+@metrics.db_operation
+async def sweep_blobs(db: AsyncSession, grace_seconds: float | None = None) -> int:
+    """
+    Apaga do armazenamento os arquivos marcados na deleção há mais de `grace_seconds` que continuam sem contrato
+    (ver crud.sweep_blobs).
+    """
+    grace_seconds = blobs.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    marked = (await db.exec(select(models.BlobDeletion.sha256).where(models.BlobDeletion.marked_at <= cutoff))).all()
+    deleted = 0
+    for blob_hash in marked:
+        claim = delete(models.BlobDeletion).where(models.BlobDeletion.sha256 == blob_hash,
+                                                  models.BlobDeletion.marked_at <= cutoff)
+        claimed = (await db.exec(claim)).rowcount == 1
+        referenced = (await db.exec(select(func.count()).where(models.Contract.blob_hash == blob_hash))).one()
+        await db.commit()
+        if claimed and not referenced:
+            await to_thread.run_sync(blobs.store.delete, blob_hash)
+            deleted += 1
+    return deleted
+
+
+# --- Funções da Fila de Processamento
+@metrics.db_operation
+async def count_jobs_by_status(db: AsyncSession) -> dict[str, int]:
+    """
+    Conta os jobs agrupados por status (usado para ver o tamanho da fila)
+    """
+    statement = select(models.Job.status, func.count()).group_by(models.Job.status)
+    return {status: total for status, total in (await db.exec(statement)).all()}
+
+
+@metrics.db_operation
+async def get_queue_load(db: AsyncSession, samples: int) -> tuple[int, list[float]]:
+    """
+    Jobs aguardando na fila e a duração (em segundos) dos últimos `samples` jobs concluídos,
+    usados pelo controle de admissão para estimar a espera de um novo envio.
+    """
+    queued = (await db.exec(select(func.count()).select_from(models.Job).where(models.Job.status == "queued"))).one()
+    statement = (
+        select(models.Job.started_at, models.Job.finished_at)
+        .where(models.Job.status == "done", models.Job.started_at.is_not(None), models.Job.finished_at.is_not(None))
+        .order_by(models.Job.finished_at.desc())
+        .limit(samples)
+    )
+    durations = [(finished - started).total_seconds() for started, finished in (await db.exec(statement)).all()]
+    return queued, durations
@@ -1,23 +1,100 @@
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 import os
 
 # Se não encontrar, usa o valor padrão (nosso arquivo SQLite local).
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")  # Online
 # DATABASE_URL="sqlite:///database.db"  # Local
 
+# --- Configuração do Pool de Conexões (ignorada pelo SQLite, que usa um pool próprio) ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # Conexões mantidas abertas por processo
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # Conexões extras permitidas em picos
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Segundos esperando uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Recria conexões mais velhas que isso (segundos)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"  # Testa a conexão antes de usar
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Espera pelo lock de escrita do SQLite
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def async_url(url: str) -> str:
+    """
+    Converte a URL do banco para o driver assíncrono equivalente (aiosqlite ou asyncpg).
+    """
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgres", "postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+def engine_options(url: str) -> dict:
+    # O argumento 'connect_args' é um requisito apenas do SQLite.
+    # Este 'if' garante que só vamos usar esse argumento quando estivermos nos conectando a um banco SQLite.
+    if url.startswith("sqlite"):
+        # Arquivo local: não há conexão "caída" para o pre-ping detectar, e cada ping custaria uma consulta
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def apply_sqlite_pragmas(engine) -> None:
+    """
+    Ativa o modo WAL (leituras não bloqueiam a escrita) e o busy_timeout (a escrita espera o lock
+    em vez de falhar com "database is locked") em cada nova conexão do SQLite.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA synchronous=NORMAL")  # Seguro com WAL e bem mais rápido que FULL
+        cursor.close()
 
-# O argumento 'connect_args' é um requisito apenas do SQLite.
-# Este 'if' garante que só vamos usar esse argumento quando estivermos nos conectando a um banco SQLite.
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
 # echo=False é melhor para produção para não poluir os logs
-engine = create_engine(DATABASE_URL, connect_args=connect_args, echo=False)
+engine = create_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL))
+
+# Engine assíncrono (aiosqlite/asyncpg), usado pelos endpoints "async def" através do crud_async
+async_engine = create_async_engine(async_url(DATABASE_URL), echo=False, **engine_options(DATABASE_URL))
+
+if IS_SQLITE:
+    apply_sqlite_pragmas(engine)
+    apply_sqlite_pragmas(async_engine)
+
+async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 
 def get_session():
     """
     Função para prover uma sessão de banco de dados para os endpoints.
     """
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def get_async_session_factory():
+    """
+    Fábrica de sessões assíncronas (separada em uma dependência para os testes poderem trocá-la).
+    """
+    return async_session_factory
+
+
+async def get_async_session(factory: async_sessionmaker = Depends(get_async_session_factory)):
+    """
+    Versão assíncrona do get_session, para os endpoints "async def".
+    """
+    async with factory() as session:
+        yield session
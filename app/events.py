@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from . import database, logs, models
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração dos Eventos de Progresso ---
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "32"))  # Eventos guardados por contrato (reenviados a quem conecta depois)
+EVENTS_MAX_CONTRACTS = int(os.getenv("EVENTS_MAX_CONTRACTS", "10000"))  # Contratos com histórico em memória
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "64"))  # Eventos pendentes por assinante antes de desconectá-lo
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))  # Comentário enviado para proxies não fecharem a conexão
+# "memory": os eventos ficam no processo que os gerou (workers em threads dentro da API)
+# "database": gravados numa tabela e repassados por uma única tarefa em cada processo da API
+# (workers em processos, "python -m app.worker" ou API com vários processos); "auto" escolhe pelo modo dos workers
+EVENTS_RELAY = os.getenv("EVENTS_RELAY", "auto")
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))  # Segundos entre leituras da tabela (uma por processo)
+EVENTS_GAP_SECONDS = float(os.getenv("EVENTS_GAP_SECONDS", "30"))  # Quanto tempo o relay espera por um id pulado (ver relay_from_database)
+EVENTS_RETENTION_SECONDS = int(os.getenv("EVENTS_RETENTION_SECONDS", "600"))  # Eventos mais velhos que isso são apagados da tabela
+
+# Etapas da análise, na ordem em que acontecem
+STAGES = ("received", "extracted", "llm_started", "chunk_done", "analyzed", "persisted", "failed")
+TERMINAL_STAGES = ("persisted", "failed")
+
+# Identifica este processo nos eventos da tabela (para não repassar os próprios eventos duas vezes)
+INSTANCE_ID = uuid.uuid4().hex
+
+# Contrato sendo analisado na thread/tarefa atual (usado pelos pontos de instrumentação que só recebem o arquivo);
+# é o mesmo identificador que acompanha os logs
+current_contract = logs.current_contract
+
+
+class Subscription:
+    """
+    Um cliente acompanhando um contrato. Os eventos chegam por uma fila do event loop do cliente;
+    se ele não der conta de ler (fila cheia), é desconectado e reconecta com o Last-Event-ID.
+    """
+
+    def __init__(self, contract_id: int, loop: asyncio.AbstractEventLoop, replay: list[dict], queue_size: int):
+        self.contract_id = contract_id
+        self.loop = loop
+        self.replay = replay
+        self.lagged = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def push(self, event: dict | None) -> None:
+        if self.lagged:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)  # Encerra o stream
+
+    async def get(self) -> dict | None:
+        return await self._queue.get()
+
+
+class EventBroker:
+    """
+    Distribui os eventos de progresso aos assinantes deste processo. Cada evento é entregue uma única
+    vez por event loop (o repasse para os N assinantes acontece dentro do loop), e um histórico curto
+    por contrato atende quem se conecta depois do upload ou reconecta.
+    """
+
+    def __init__(self, history: int = EVENTS_HISTORY, max_contracts: int = EVENTS_MAX_CONTRACTS,
+                 queue_size: int = EVENTS_QUEUE_SIZE):
+        self.history = history
+        self.max_contracts = max_contracts
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._history: OrderedDict[int, deque] = OrderedDict()
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self._next_id = 0
+        self._published = 0
+        self._lagged = 0
+
+    def publish(self, event: dict) -> dict:
+        """
+        Registra o evento e o entrega aos assinantes. Pode ser chamado de qualquer thread.
+        Eventos que passaram pela tabela já chegam com o id da linha (o mesmo em todos os processos);
+        os demais recebem um id crescente deste processo.
+        """
+        contract_id = event["contract_id"]
+        with self._lock:
+            self._published += 1
+            if "id" not in event:
+                self._next_id += 1
+                event = {**event, "id": self._next_id}
+            history = self._history.get(contract_id)
+            if history is None:
+                history = self._history[contract_id] = deque(maxlen=self.history)
+            history.append(event)
+            self._history.move_to_end(contract_id)
+            while len(self._history) > self.max_contracts:
+                self._history.popitem(last=False)  # Contrato sem movimento há mais tempo
+            by_loop: dict[asyncio.AbstractEventLoop, list[Subscription]] = {}
+            for subscription in self._subscribers.get(contract_id, ()):
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+
+        for loop, subscriptions in by_loop.items():
+            if _running_loop() is loop:
+                self._deliver(subscriptions, event)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(self._deliver, subscriptions, event)
+        return event
+
+    def _deliver(self, subscriptions: list[Subscription], event: dict) -> None:
+        for subscription in subscriptions:
+            was_lagged = subscription.lagged
+            subscription.push(event)
+            if subscription.lagged and not was_lagged:
+                with self._lock:
+                    self._lagged += 1
+
+    def subscribe(self, contract_id: int, last_event_id: int | None = None) -> Subscription:
+        """
+        Inscreve o cliente (chamado dentro do event loop dele). A inscrição já traz os eventos do histórico
+        posteriores a `last_event_id`, e os próximos chegam pela fila, sem lacuna entre os dois.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            replay = [event for event in self._history.get(contract_id, ()) if last_event_id is None or event["id"] > last_event_id]
+            subscription = Subscription(contract_id, loop, replay, self.queue_size)
+            self._subscribers.setdefault(contract_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.contract_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.contract_id]
+
+    def subscriber_count(self, contract_id: int | None = None) -> int:
+        with self._lock:
+            if contract_id is not None:
+                return len(self._subscribers.get(contract_id, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": sum(len(subscriptions) for subscriptions in self._subscribers.values()),
+                "contracts_watched": len(self._subscribers),
+                "contracts_in_history": len(self._history),
+                "published": self._published,
+                "lagged_disconnects": self._lagged,
+                "relay": "database" if relay_enabled() else "memory",
+            }
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+broker = EventBroker()
+
+
+def relay_enabled() -> bool:
+    """Os eventos precisam passar pela tabela quando quem analisa não é o processo que atende os clientes."""
+    if EVENTS_RELAY == "auto":
+        from . import worker  # Import tardio: o worker também importa este módulo
+        return worker.WORKER_MODE == "external" or worker.WORKER_KIND == "process"
+    return EVENTS_RELAY == "database"
+
+
+def publish(contract_id: int, stage: str, **data) -> None:
+    """
+    Publica uma etapa da análise de um contrato. Nunca interrompe a análise: uma falha aqui só é registrada.
+    """
+    event = {"contract_id": contract_id, "stage": stage, "time": time.time(), **data}
+    try:
+        if relay_enabled():
+            with Session(database.engine) as db:
+                payload = json.dumps({"time": event["time"], **data})
+                row = models.ContractEvent(contract_id=contract_id, stage=stage, data=payload, origin=INSTANCE_ID)
+                db.add(row)
+                db.flush()
+                event["id"] = row.id  # Id da linha: o Last-Event-ID vale em qualquer processo da API
+                db.commit()
+        broker.publish(event)
+    except Exception:
+        logger.exception("Falha ao publicar o evento de progresso", extra={"stage": stage, "contract_id": contract_id})
+
+
+def emit(stage: str, **data) -> None:
+    """Publica uma etapa do contrato em análise na thread/tarefa atual (nada acontece fora de uma análise)."""
+    contract_id = current_contract.get()
+    if contract_id is not None:
+        publish(contract_id, stage, **data)
+
+
+def format_sse(event: dict) -> str:
+    """Serializa um evento no formato text/event-stream (o id permite retomar com Last-Event-ID)."""
+    lines = [f"id: {event['id']}"] if "id" in event else []
+    lines += [f"event: {event['stage']}", f"data: {json.dumps(event, ensure_ascii=False)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+async def relay_from_database(factory, poll_interval: float = EVENTS_POLL_INTERVAL,
+                              retention: int = EVENTS_RETENTION_SECONDS, gap_seconds: float = EVENTS_GAP_SECONDS) -> None:
+    """
+    Tarefa única por processo da API: lê os eventos gravados por workers de outros processos
+    e os entrega ao broker local. Apaga os eventos antigos de tempos em tempos.
+    No Postgres o id sai da sequence antes do commit, então uma linha de id menor pode aparecer depois de uma
+    maior: os ids pulados ficam anotados e são consultados de novo por `gap_seconds` (depois disso, a transação
+    foi desfeita). Sem isso o evento final de um contrato podia se perder e o cliente esperaria para sempre.
+    """
+    async with factory() as db:
+        last_id = (await db.exec(select(func.max(models.ContractEvent.id)))).one() or 0
+    gaps: dict[int, float] = {}  # id pulado -> quando foi notado
+    last_cleanup = time.monotonic()
+    while True:
+        try:
+            async with factory() as db:
+                statement = (
+                    select(models.ContractEvent)
+                    .where(models.ContractEvent.id > last_id)
+                    .order_by(models.ContractEvent.id)
+                    .limit(1000)
+                )
+                rows = (await db.exec(statement)).all()
+                if gaps:  # Linhas que chegaram atrasadas vêm antes das novas
+                    late = (await db.exec(select(models.ContractEvent).where(models.ContractEvent.id.in_(list(gaps))))).all()
+                    rows = sorted(late, key=lambda row: row.id) + list(rows)
+                now = time.monotonic()
+                for row in rows:
+                    gaps.pop(row.id, None)
+                    if row.id > last_id:
+                        if row.id - last_id <= 1000:  # Salto maior não vem de transações em paralelo (ex.: sequence reiniciada)
+                            gaps.update(dict.fromkeys(range(last_id + 1, row.id), now))
+                        last_id = row.id
+                    if row.origin != INSTANCE_ID:  # Os eventos deste processo já foram entregues na hora
+                        broker.publish({"contract_id": row.contract_id, "stage": row.stage, **json.loads(row.data), "id": row.id})
+                for gap, noticed in list(gaps.items()):
+                    if now - noticed > gap_seconds:
+                        del gaps[gap]
+                if time.monotonic() - last_cleanup > retention / 10:
+                    cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention)
+                    await db.exec(delete(models.ContractEvent).where(models.ContractEvent.created_at < cutoff))
+                    await db.commit()
+                    last_cleanup = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao ler os eventos do banco")
+        await asyncio.sleep(poll_interval)
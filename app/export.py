@@ -0,0 +1,145 @@
+import csv
+import importlib.util
+import io
+import json
+import os
+from datetime import date, datetime
+
+from anyio import to_thread
+from sqlalchemy import Date, DateTime, Integer
+
+from . import metrics, models
+
+# --- Configuração da Exportação ---
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # Linhas lidas do cursor do banco por vez
+EXPORT_PARQUET_ROW_GROUP = int(os.getenv("EXPORT_PARQUET_ROW_GROUP", "50000"))  # Linhas por row group do Parquet
+
+# Formato: (media type, extensão do arquivo baixado)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available() -> bool:
+    # O pyarrow é opcional: só é necessário para exportar em Parquet
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+async def to_ndjson(batches, fields: list[str]):
+    """Um objeto JSON por linha; cada lote do banco vira um único bloco da resposta."""
+    async for rows in batches:
+        yield "".join(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=_json_default) + "\n"
+                      for row in rows).encode()
+        metrics.EXPORTED_ROWS.labels(format="ndjson").inc(len(rows))
+
+
+async def to_csv(batches, fields: list[str]):
+    """CSV com cabeçalho; valores nulos viram campos vazios."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue().encode()
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        metrics.EXPORTED_ROWS.labels(format="csv").inc(len(rows))
+
+
+class _ChunkSink:
+    """Destino do ParquetWriter que só guarda os bytes escritos até o próximo bloco da resposta."""
+
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def arrow_schema(fields: list[str]):
+    """Esquema do Arrow a partir das colunas do modelo (assim um lote só de nulos não muda os tipos)."""
+    import pyarrow as pa
+
+    def arrow_type(column):
+        column_type = getattr(column.type, "impl", column.type)  # Tipos do SQLModel (AutoString, UTCDateTime)
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        if isinstance(column_type, DateTime):
+            return pa.timestamp("us", tz="UTC")
+        if isinstance(column_type, Date):
+            return pa.date32()
+        return pa.string()
+
+    columns = models.Contract.__table__.columns
+    return pa.schema([(field, arrow_type(columns[field])) for field in fields])
+
+
+async def to_parquet(batches, fields: list[str], row_group: int | None = None):
+    """
+    Parquet enviado aos poucos: cada lote do banco já vira colunas do Arrow (bem mais compactas que as tuplas),
+    a cada `row_group` linhas um row group é escrito e enviado, e o rodapé com os metadados vai no final.
+    A conversão e a compressão rodam fora do event loop.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    row_group = row_group or EXPORT_PARQUET_ROW_GROUP
+    schema = arrow_schema(fields)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    pending: list = []  # RecordBatches ainda não escritos
+
+    def convert(rows) -> "pa.RecordBatch":
+        return pa.record_batch([list(column) for column in zip(*rows)], schema=schema)
+
+    def write(table: "pa.Table") -> bytes:
+        writer.write_table(table, row_group_size=row_group)
+        return sink.take()
+
+    try:
+        async for rows in batches:
+            pending.append(await to_thread.run_sync(convert, rows))
+            table = pa.Table.from_batches(pending, schema=schema)
+            if table.num_rows >= row_group:
+                complete = table.num_rows - table.num_rows % row_group
+                chunk = await to_thread.run_sync(write, table.slice(0, complete))
+                pending = table.slice(complete).to_batches()
+                metrics.EXPORTED_ROWS.labels(format="parquet").inc(complete)
+                yield chunk
+        table = pa.Table.from_batches(pending, schema=schema)
+        if table.num_rows:
+            yield await to_thread.run_sync(write, table)
+            metrics.EXPORTED_ROWS.labels(format="parquet").inc(table.num_rows)
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+SERIALIZERS = {"ndjson": to_ndjson, "csv": to_csv, "parquet": to_parquet}
@@ -0,0 +1,484 @@
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_EXCEPTION, Future, wait
+from contextlib import nullcontext
+from typing import Iterator
+from xml.etree.ElementTree import ParseError, iterparse
+
+from PyPDF2 import PdfReader
+from PyPDF2.errors import FileNotDecryptedError, PyPdfError
+
+from . import cache, metrics, utils
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da Extração de PDF ---
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf2")  # "pypdf2" ou "unstructured"
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))  # Processos de extração (0 = extrai na própria thread)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))  # Abaixo disso o PDF é lido numa única faixa
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "20"))  # Segundos máximos por página (0 = sem limite)
+
+# --- Configuração do OCR (páginas sem camada de texto, ex.: PDFs escaneados) ---
+OCR_BACKEND = os.getenv("OCR_BACKEND", "ocr")  # Backend usado nas páginas vazias ("none" desliga o OCR)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))  # Processos do pool de OCR
+OCR_PAGE_TIMEOUT = float(os.getenv("OCR_PAGE_TIMEOUT", "120"))  # Segundos máximos de OCR por página (0 = sem limite)
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "16"))  # Páginas com menos caracteres que isso vão para o OCR
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "por,eng").split(",")  # Idiomas do Tesseract
+
+
+class PageTimeout(Exception):
+    pass
+
+
+class ExtractionError(ValueError):
+    """Arquivo que não pôde ser lido (corrompido, protegido por senha ou fora do formato); a mensagem traz a causa."""
+
+
+class PyPDF2Backend:
+    """Extração pela camada de texto do PDF (rápida, sem OCR)."""
+
+    name = "pypdf2"
+
+    def open(self, file_path: str):
+        return utils.mapped_file(file_path)
+
+    def extract_pages(self, view, start: int, end: int):
+        reader = PdfReader(view)
+        for index in range(start, end):
+            yield lambda index=index: reader.pages[index].extract_text() or ""
+
+
+class UnstructuredBackend:
+    """
+    Extração pelo UnstructuredLoader (langchain-unstructured). Como o unstructured lê o arquivo inteiro,
+    cada faixa de páginas é recortada antes com o pikepdf (que não extrai texto, mas divide PDFs sem re-renderizar).
+    Com a estratégia "hi_res" as páginas são renderizadas e passam pelo OCR (Tesseract).
+    """
+
+    def __init__(self, name: str = "unstructured", strategy: str = "fast"):
+        self.name = name
+        self.strategy = strategy
+
+    def open(self, file_path: str):
+        return nullcontext(file_path)
+
+    def extract_pages(self, file_path: str, start: int, end: int):
+        import pikepdf
+        from langchain_unstructured import UnstructuredLoader
+
+        for index in range(start, end):
+            def extract(index=index):
+                with pikepdf.open(file_path) as source, tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                    page_pdf = pikepdf.new()
+                    page_pdf.pages.append(source.pages[index])
+                    page_pdf.save(tmp)
+                try:
+                    options = {"languages": OCR_LANGUAGES} if self.strategy == "hi_res" else {}
+                    documents = UnstructuredLoader(tmp.name, strategy=self.strategy, **options).load()
+                    return "\n".join(doc.page_content for doc in documents)
+                finally:
+                    os.remove(tmp.name)
+            yield extract
+
+
+BACKENDS = {backend.name: backend for backend in (PyPDF2Backend(), UnstructuredBackend(),
+                                                  UnstructuredBackend("ocr", strategy="hi_res"))}
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_range(backend_name: str, file_path: str, start: int, end: int, page_timeout: float) -> list[str]:
+    return [text for text, _ in _extract_range_timed(backend_name, file_path, start, end, page_timeout)]
+
+
+def _extract_range_timed(backend_name: str, file_path: str, start: int, end: int,
+                         page_timeout: float) -> list[tuple[str, float]]:
+    """
+    Extrai as páginas [start, end), com o tempo de cada uma. Roda dentro dos processos do pool: o limite
+    por página usa um alarme (SIGALRM), então uma página problemática vira "" sem travar as demais.
+    """
+    backend = BACKENDS[backend_name]
+    use_alarm = (
+        page_timeout > 0 and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()  # Sinais só funcionam na thread principal
+    )
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+    pages = []
+    try:
+        with backend.open(file_path) as source:
+            for index, extract in enumerate(backend.extract_pages(source, start, end), start=start):
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                started = time.perf_counter()
+                try:
+                    pages.append((extract(), time.perf_counter() - started))
+                except PageTimeout:
+                    logger.warning("Página do PDF excedeu o tempo e foi ignorada", extra={"page": index + 1, "timeout_s": page_timeout})
+                    pages.append(("", time.perf_counter() - started))
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+    return pages
+
+
+# Pools de processos reaproveitados entre os uploads (criados na primeira extração paralela). O OCR tem
+# o seu próprio pool, para páginas escaneadas (segundos cada) não atrasarem os PDFs com camada de texto
+_pools: dict[str, "WorkerPool"] = {}
+_pool_lock = threading.Lock()
+_started = None  # Fila (tarefa, pid) recebida por cada processo do pool ao iniciar
+
+
+def _init_worker(started) -> None:
+    global _started
+    _started = started
+
+
+def _run_task(task: int, function, *args):
+    _started.put((task, os.getpid()))  # Avisa quem roda a tarefa antes de começar (para encerrar só este processo)
+    return function(*args)
+
+
+class WorkerPool:
+    """
+    multiprocessing.Pool compartilhado pelos uploads, que sabe qual processo está rodando cada tarefa: quando as
+    faixas de um PDF passam do prazo, só os processos presos nelas são encerrados (o Pool põe outros no lugar)
+    e as extrações dos outros uploads continuam.
+    """
+
+    def __init__(self, processes: int):
+        context = multiprocessing.get_context("spawn")  # "spawn" evita herdar threads e conexões abertas da API
+        self._started = context.SimpleQueue()
+        self._pool = context.Pool(processes, initializer=_init_worker, initargs=(self._started,))
+        self._lock = threading.Lock()
+        self._running: dict[int, int] = {}  # tarefa -> pid do processo que a executa
+        self._tasks = itertools.count()
+
+    def _collect_started(self) -> None:
+        while not self._started.empty():
+            task, pid = self._started.get()
+            self._running[task] = pid
+
+    def _finish(self, task: int) -> None:
+        with self._lock:
+            self._collect_started()  # O aviso de início sempre chega antes do resultado
+            self._running.pop(task, None)
+
+    def submit(self, function, *args) -> Future:
+        """Envia uma tarefa; o Future permite esperar várias com prazo (concurrent.futures.wait)."""
+        task = next(self._tasks)
+        future = Future()
+        future.task = task
+
+        def done(result):
+            self._finish(task)
+            future.set_result(result)
+
+        def failed(error):
+            self._finish(task)
+            future.set_exception(error)
+
+        self._pool.apply_async(_run_task, (task, function, *args), callback=done, error_callback=failed)
+        return future
+
+    def kill(self, futures) -> int:
+        """Encerra os processos que ainda executam as tarefas destes futures. Retorna quantos foram encerrados."""
+        with self._lock:
+            self._collect_started()
+            pids = [self._running.pop(future.task) for future in futures if future.task in self._running]
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        return len(pids)
+
+    def close(self) -> None:
+        # terminate() e não close()/join(): o join esperaria para sempre pelas tarefas dos processos encerrados
+        self._pool.terminate()
+
+
+def _get_pool(kind: str = "text") -> WorkerPool:
+    with _pool_lock:
+        if kind not in _pools:
+            _pools[kind] = WorkerPool(OCR_WORKERS if kind == "ocr" else PDF_WORKERS)
+        return _pools[kind]
+
+
+def shutdown() -> None:
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _read_error(error: Exception) -> ExtractionError:
+    if isinstance(error, FileNotDecryptedError):
+        return ExtractionError("Não foi possível ler o PDF: arquivo protegido por senha.")
+    return ExtractionError(f"Não foi possível ler o PDF: {error}")
+
+
+def count_pages(file_path: str) -> int:
+    try:
+        with utils.mapped_file(file_path) as view:
+            return len(PdfReader(view).pages)
+    except PyPdfError as e:  # Corrompido ou protegido por senha: falha já aqui, sem chegar ao OCR
+        raise _read_error(e) from e
+
+
+def extract_pdf_pages(file_path: str, backend: str | None = None, workers: int | None = None,
+                      page_timeout: float | None = None, ocr: str | None = None,
+                      file_hash: str | None = None) -> list[str]:
+    """
+    Extrai o texto de cada página do PDF e retorna uma lista (um item por página, na ordem do documento).
+    PDFs grandes são divididos em faixas de páginas processadas em paralelo pelo pool de processos.
+    As páginas sem camada de texto (escaneadas) passam depois pelo backend `ocr` (padrão OCR_BACKEND).
+    O modo (text/ocr/empty) e o tempo de cada página vão para o log e para as métricas.
+    Um PDF corrompido ou protegido por senha gera ExtractionError com a causa.
+    `file_hash` (SHA-256 do arquivo, se quem chama já o tem) indexa o cache do OCR.
+    """
+    backend = backend or PDF_BACKEND
+    workers = PDF_WORKERS if workers is None else workers
+    page_timeout = PDF_PAGE_TIMEOUT if page_timeout is None else page_timeout
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de extração não suportado: {backend}")
+
+    total = count_pages(file_path)
+    # Processos daemon (ex.: workers do tipo "process") não podem criar filhos, então extraem na própria thread
+    in_thread = workers <= 0 or multiprocessing.current_process().daemon
+    try:
+        if in_thread:
+            results = _extract_range_timed(backend, file_path, 0, total, page_timeout)
+        else:
+            results = _extract_parallel(backend, file_path, total, workers, page_timeout)
+    except PyPdfError as e:
+        raise _read_error(e) from e
+
+    pages = [text for text, _ in results]
+    modes = ["text" if len(text.strip()) >= OCR_MIN_CHARS else "empty" for text in pages]
+    seconds = [elapsed for _, elapsed in results]
+    ocr = OCR_BACKEND if ocr is None else ocr
+    if metrics.METRICS_ENABLED:
+        for elapsed in seconds:
+            metrics.EXTRACTION_PAGE_SECONDS.labels(backend=backend).observe(elapsed)
+
+    empty = [index for index, mode in enumerate(modes) if mode == "empty"]
+    if empty and ocr != "none" and ocr != backend:
+        for index, (text, elapsed) in zip(empty, _ocr_pages(ocr, file_path, empty, in_thread, file_hash)):
+            seconds[index] += elapsed
+            if metrics.METRICS_ENABLED:
+                metrics.EXTRACTION_PAGE_SECONDS.labels(backend=ocr).observe(elapsed)
+            if text.strip():
+                pages[index], modes[index] = text, "ocr"
+
+    if metrics.METRICS_ENABLED:
+        for mode in modes:
+            metrics.EXTRACTION_PAGES.labels(mode=mode).inc()
+    logger.info("PDF extraído", extra={
+        "pages": total, "text_pages": modes.count("text"), "ocr_pages": modes.count("ocr"),
+        "empty_pages": modes.count("empty"), "page_modes": "".join(mode[0] for mode in modes),
+        "page_ms": [round(elapsed * 1000) for elapsed in seconds],
+    })
+    return pages
+
+
+def _ocr_pages(backend: str, file_path: str, indexes: list[int], in_thread: bool,
+               file_hash: str | None = None) -> list[tuple[str, float]]:
+    """
+    OCR só das páginas sem camada de texto, no pool de OCR. Cada página fica no cache "ocr" (SHA-256 do
+    arquivo + página + backend + idiomas): um novo envio do mesmo arquivo não refaz o OCR das páginas já lidas.
+    """
+    prefix, suffix = file_hash or utils.file_sha256(file_path), f"{backend}:{'+'.join(OCR_LANGUAGES)}"
+    results: dict[int, tuple[str, float]] = {}
+    pending = []
+    for index in indexes:
+        text = cache.content_cache.get("ocr", f"{prefix}:{index}:{suffix}")
+        if text is None:
+            pending.append(index)
+        else:
+            results[index] = (text, 0.0)
+
+    if pending and in_thread:
+        for index in pending:
+            results[index] = _extract_range_timed(backend, file_path, index, index + 1, OCR_PAGE_TIMEOUT)[0]
+    elif pending:
+        pool = _get_pool("ocr")
+        futures = {index: pool.submit(_extract_range_timed, backend, file_path, index, index + 1, OCR_PAGE_TIMEOUT)
+                   for index in pending}
+        deadline = OCR_PAGE_TIMEOUT * math.ceil(len(pending) / OCR_WORKERS) + 10 if OCR_PAGE_TIMEOUT > 0 else None
+        done, not_done = wait(futures.values(), timeout=deadline)
+        if not_done:
+            killed = pool.kill(not_done)
+            logger.warning("Páginas do OCR não terminaram no prazo e foram ignoradas",
+                           extra={"pages": len(not_done), "killed_processes": killed})
+        for index, future in futures.items():
+            if future in done and future.exception() is None:
+                results[index] = future.result()[0]
+            else:
+                if future in done:
+                    logger.warning("Falha no OCR da página", exc_info=future.exception(), extra={"page": index + 1})
+                results[index] = ("", 0.0)
+
+    for index in pending:
+        if results[index][0].strip():  # Página sem texto nem no OCR (ou com falha) não é guardada
+            cache.content_cache.set("ocr", f"{prefix}:{index}:{suffix}", results[index][0])
+    return [results[index] for index in indexes]
+
+
+def _extract_parallel(backend: str, file_path: str, total: int, workers: int,
+                      page_timeout: float) -> list[tuple[str, float]]:
+    # Faixas pequenas o bastante para equilibrar a carga, grandes o bastante para diluir o custo de abrir o PDF
+    range_size = total if total < PDF_PARALLEL_MIN_PAGES else max(1, math.ceil(total / (workers * 2)))
+    ranges = [(start, min(start + range_size, total)) for start in range(0, total, range_size)]
+
+    pool = _get_pool()
+    futures = [pool.submit(_extract_range_timed, backend, file_path, start, end, page_timeout) for start, end in ranges]
+    # Limite total: cada worker processa no máximo ceil(total / workers) páginas, cada uma limitada a page_timeout
+    deadline = page_timeout * math.ceil(total / workers) + 10 if page_timeout > 0 else None
+    done, not_done = wait(futures, timeout=deadline, return_when=FIRST_EXCEPTION)
+    for future in done:
+        if future.exception() is not None:  # Erro de leitura do PDF: repassa o erro (as outras faixas são descartadas)
+            raise future.exception()
+    if not_done:
+        # Só os processos presos nas faixas deste PDF são encerrados; o contrato falha em vez de seguir sem páginas
+        killed = pool.kill(not_done)
+        logger.warning("Faixas de páginas do PDF não terminaram no prazo",
+                       extra={"ranges": len(not_done), "killed_processes": killed, "timeout_s": deadline})
+        raise ExtractionError(f"Não foi possível ler o PDF: {len(not_done)} de {len(ranges)} faixas de páginas "
+                              f"não terminaram em {deadline:.0f}s.")
+
+    pages: list[tuple[str, float]] = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+# --- Extração de DOCX ---
+# O DOCX é um zip de XMLs: o texto fica em word/document.xml e os cabeçalhos/rodapés em partes próprias.
+# Os XMLs são lidos em streaming (iterparse), descartando cada parágrafo/tabela depois de emitido, então a
+# memória não cresce com o tamanho do documento (o python-docx monta o DOM inteiro em memória).
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCX_HEADER_PART = re.compile(r"word/header(\d*)\.xml$")
+DOCX_FOOTER_PART = re.compile(r"word/footer(\d*)\.xml$")
+DOCX_CELL_SEPARATOR = " | "  # Entre as células de uma linha de tabela
+DOCX_PAGE_CHARS = 8000  # Tamanho dos grupos de blocos que fazem o papel das páginas do PDF
+
+
+def _docx_parts(names: list[str], pattern: re.Pattern) -> list[str]:
+    parts = [(int(match.group(1) or 0), name) for name in names if (match := pattern.match(name))]
+    return [name for _, name in sorted(parts)]
+
+
+def _iter_docx_part(source) -> Iterator[str]:
+    """
+    Linhas de uma parte do DOCX na ordem do documento: um item por parágrafo e um por linha de tabela
+    (células separadas por DOCX_CELL_SEPARATOR, inclusive em tabelas aninhadas).
+    """
+    stack = []  # Elementos abertos, para remover do pai o que já foi emitido
+    paragraph: list[str] = []
+    cells: list[list[str]] = []  # Células da linha atual de cada tabela aberta
+    cell_lines: list[list[str]] = []  # Parágrafos da célula atual de cada tabela aberta
+    for event, element in iterparse(source, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            stack.append(element)
+            if tag == f"{W}tr":
+                cells.append([])
+            elif tag == f"{W}tc":
+                cell_lines.append([])
+            continue
+
+        stack.pop()
+        if tag == f"{W}t":
+            paragraph.append(element.text or "")
+        elif tag == f"{W}tab":
+            paragraph.append("\t")
+        elif tag in (f"{W}br", f"{W}cr"):
+            paragraph.append("\n")
+        elif tag == f"{W}p":
+            text = "".join(paragraph)
+            paragraph.clear()
+            if cell_lines:
+                cell_lines[-1].append(text)
+            else:
+                yield text
+        elif tag == f"{W}tc" and cell_lines:
+            cell = "\n".join(line for line in cell_lines.pop() if line)
+            if cells:
+                cells[-1].append(cell)
+        elif tag == f"{W}tr" and cells:
+            row = DOCX_CELL_SEPARATOR.join(cells.pop())
+            if cell_lines:  # Tabela dentro de uma célula: a linha vira parte do texto da célula
+                cell_lines[-1].append(row)
+            else:
+                yield row
+        else:
+            continue
+        # Parágrafo ou tabela já emitidos: libera o elemento (e os filhos) da árvore parcial
+        element.clear()
+        if stack:
+            stack[-1].remove(element)
+
+
+def iter_docx_text(file_path: str) -> Iterator[str]:
+    """
+    Texto do DOCX em blocos (parágrafos e linhas de tabela), gerados aos poucos: cabeçalhos, corpo
+    e rodapés. Cabeçalhos/rodapés repetidos (primeira página, pares e ímpares) saem uma única vez.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        names = archive.namelist()
+        seen_parts = set()
+
+        def header_or_footer(name: str) -> list[str]:
+            with archive.open(name) as source:  # Partes pequenas: dá para ler e comparar inteiras
+                lines = tuple(line for line in _iter_docx_part(source) if line)
+            if lines in seen_parts:
+                return []
+            seen_parts.add(lines)
+            return list(lines)
+
+        for name in _docx_parts(names, DOCX_HEADER_PART):
+            yield from header_or_footer(name)
+        with archive.open("word/document.xml") as source:
+            yield from _iter_docx_part(source)
+        for name in _docx_parts(names, DOCX_FOOTER_PART):
+            yield from header_or_footer(name)
+
+
+def docx_pages(file_path: str, max_chars: int = DOCX_PAGE_CHARS) -> list[str]:
+    """
+    Blocos do DOCX agrupados em "páginas" de até `max_chars` (sempre cortadas entre parágrafos), no mesmo
+    formato das páginas do PDF: o cache, a busca e a divisão em partes para a IA recebem o documento em
+    pedaços, sem uma cópia extra do texto inteiro numa única string.
+    Um arquivo que não é um DOCX válido gera ExtractionError com a causa.
+    """
+    pages: list[str] = []
+    current: list[str] = []
+    size = 0
+    try:
+        for block in iter_docx_text(file_path):
+            if current and size + len(block) > max_chars:
+                pages.append("\n".join(current))
+                current, size = [], 0
+            current.append(block)
+            size += len(block) + 1
+    except (zipfile.BadZipFile, KeyError, ParseError) as e:
+        raise ExtractionError(f"Não foi possível ler o DOCX: {e}") from e
+    if current:
+        pages.append("\n".join(current))
+    return pages
@@ -0,0 +1,71 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# --- Configuração dos Logs ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" (uma linha por evento, para agregadores) ou "text" (desenvolvimento)
+
+# Identificadores de correlação: a requisição (preenchido pelo middleware, também devolvido no X-Request-ID)
+# e o contrato em análise na thread/tarefa atual (preenchido pelo worker e pelo lote)
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+current_contract: contextvars.ContextVar[int | None] = contextvars.ContextVar("current_contract", default=None)
+
+# Atributos que todo LogRecord tem; o que sobra veio do "extra" e vai para o JSON
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+
+class JSONFormatter(logging.Formatter):
+    """Uma linha JSON por evento, com os ids de correlação e os campos passados em `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if (rid := request_id.get()) is not None:
+            entry["request_id"] = rid
+        if (contract_id := current_contract.get()) is not None:
+            entry["contract_id"] = contract_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legível para desenvolvimento, com os mesmos campos no final da linha."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+        if (rid := request_id.get()) is not None:
+            fields["request_id"] = rid
+        if (contract_id := current_contract.get()) is not None:
+            fields["contract_id"] = contract_id
+        line = f"{record.levelname:<7} [{record.name}] {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def setup(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """
+    Configura os logs do pacote "app" (idempotente: a API, o worker e a migração chamam ao subir).
+    """
+    logger = logging.getLogger("app")
+    if any(getattr(handler, "_app_logs", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    handler._app_logs = True
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
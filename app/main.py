@@ -1,26 +1,74 @@
-import os
-import shutil
-import tempfile
+import asyncio
+import json
+import logging
 from contextlib import asynccontextmanager
-
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile
+from datetime import datetime
+from decimal import Decimal
+from typing import Literal, Optional
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from . import auth, crud, models, schemas, database, processing
+from . import admission, auth, batch, blobs, cache, crud, crud_async, events, export, logs, metrics, migrations, models, schemas, database, extraction, pagination, processing, search, uploads, worker
+from .cache import content_cache
+from .timing import ServerTimingMiddleware, request_timings
 from .database import engine  # Importamos o engine para o lifespan
 
+logs.setup()  # Logs em JSON com o id da requisição e do contrato (LOG_FORMAT=text para desenvolvimento)
+logger = logging.getLogger(__name__)
+
+# True depois do prepare_database: com o preload do gunicorn ele roda uma vez no master, e os workers
+# (criados por fork) já nascem com o valor True e pulam essa etapa no lifespan
+database_ready = False
+
+
+def prepare_database() -> None:
+    """
+    Cria as tabelas, aplica as migrações e prepara a busca textual (idempotente).
+    """
+    global database_ready
+    if database_ready:
+        return
+    models.SQLModel.metadata.create_all(bind=engine)  # Criando as tabelas (se não criadas)
+    migrations.upgrade(engine)  # Colunas novas em tabelas que já existiam + preenchimento das linhas antigas
+    search.setup(engine)  # Índice da busca textual e os triggers que o mantêm atualizado
+    with Session(engine) as db:
+        crud.sweep_blobs(db)  # Arquivos originais de contratos deletados cujo prazo já passou
+    database_ready = True
+
+
 # A função de ciclo de vida que cria as tabelas na inicialização
 # Serve para executar o codigo dentro dessa função antes da aplicação FastAPI iniciar, de depois dela ser desligada
 # para isso, você assegura que, sempre que sua aplicação for iniciada (seja em desenvolvimento ou produção), ela 
 # automaticamente verificará e criará as tabelas definidas em seus modelos SQLModel, caso elas ainda não existam. 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Iniciando a aplicação...")
-    models.SQLModel.metadata.create_all(bind=engine)  # Criando as tabelas (se não criadas)
+    logger.info("Iniciando a aplicação")
+    prepare_database()
+    if worker.WORKER_MODE == "inprocess":
+        processing.warm_up()  # Carrega a LangChain e cria o analisador em segundo plano, sem atrasar a subida da API
+        worker.start_pool()  # Workers que consomem a fila de análises dentro do próprio processo da API
+    auth.password_hasher.start()  # Sobe os processos do bcrypt antes do primeiro login
+    relay = None
+    if events.relay_enabled():  # Eventos de progresso vindos de workers em outros processos
+        relay = asyncio.create_task(events.relay_from_database(database.async_session_factory))
     yield  # Linha de divisão (pausa e o próximo só acontece ao encerrar a aplicação)
-    print("Finalizando a aplicação.")
+    if relay is not None:
+        relay.cancel()
+    worker.stop_pool()  # Espera as análises em andamento (WORKER_DRAIN_SECONDS) e devolve à fila as que não terminarem
+    processing.set_analyzer(None)
+    extraction.shutdown()  # Encerra o pool de processos da extração de PDF
+    auth.password_hasher.shutdown()
+    await database.async_engine.dispose()  # Fecha as conexões do pool assíncrono
+    logger.info("Finalizando a aplicação")
 
 
 # Inicialização do App e o lifespan como função de inicialização
@@ -39,8 +87,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permite todos os métodos (GET, POST, etc.)
     allow_headers=["*"],  # Permite todos os cabeçalhos
+    expose_headers=["ETag", "Server-Timing", "X-Request-ID"],  # Cabeçalhos que o front-end pode ler
 )
 
+# Mede a latência de cada rota (exibida no /stats e no cabeçalho Server-Timing)
+app.add_middleware(ServerTimingMiddleware)
+
 @app.get("/", tags=["Root"])
 def read_root():
     """Endpoint raiz para verificar se a API está online."""
@@ -49,34 +101,42 @@ def read_root():
 # --- Endpoints de Autenticação e Usuários ---
 
 @app.post("/users/", response_model=schemas.UserRead, tags=["Users"])
-def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_session)):
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_session)):
     """
     Função para criação de um novo usuário via API.
+    O bcrypt roda no pool dedicado; com o pool cheio a resposta é 503 (com Retry-After).
     """
-    db_user = crud.get_user_by_username(db, username=user.username)
+    db_user = await crud_async.get_user_by_username(db, username=user.username)
     if db_user:  # Testa se o usuário já existe no banco de dados
         raise HTTPException(status_code=400, detail="Usuário já registrado")
-    return crud.create_user(db=db, user=user)
+    hashed_password = await auth.get_password_hash_async(user.password)
+    return await crud_async.create_user(db, username=user.username, hashed_password=hashed_password)
 
 
 @app.post("/login", response_model=schemas.Token, tags=["Users"])
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),  # Espera credenciais no formato OAuth2
-    db: Session = Depends(database.get_session)
+    db: AsyncSession = Depends(database.get_async_session)
 ):
     """
     Endpoint para login de usuário e obtenção de um token de acesso JWT.
+    O bcrypt roda no pool dedicado; com o pool cheio a resposta é 503 (com Retry-After).
     """
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await crud_async.get_user_by_username(db, username=form_data.username)
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await auth.verify_password_async(form_data.password, user.hashed_password)
+    if not valid:
         # Levanta exceção se o usuário não for encontrado ou a senha estiver incorreta
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuário ou senha incorretos",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:  # O custo do bcrypt mudou (BCRYPT_ROUNDS): guarda o hash refeito com o custo atual
+        await crud_async.update_user_password_hash(db, user, new_hash)
     # Cria o token de acesso para o usuário autenticado
-    access_token = auth.create_access_token(data={"sub": user.username})
+    access_token = auth.create_access_token(data={"sub": user.username, "ver": user.token_version or 0})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -89,107 +149,502 @@ def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
 
 
-# --- Endpoint de Upload de Contrato (AGORA SÍNCRONO) ---
-@app.post("/contracts/upload", response_model=models.Contract, tags=["Contracts"])
-def upload_contract(
-    file: UploadFile = File(...),  # Upload de arquivo obrigatório
-    db: Session = Depends(database.get_session),  # Dependência de sessão do banco de dados
-    current_user: models.User = Depends(auth.get_current_user)  # Verificação do token
+@app.put("/users/me/password", response_model=schemas.UserRead, tags=["Users"])
+async def change_password(
+    passwords: schemas.PasswordChange,
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
 ):
     """
-    Recebe um arquivo de contrato, salva-o temporariamente,
-    executa a análise da IA de forma síncrona e retorna
-    o contrato com todos os detalhes extraídos.
+    Troca a senha do usuário logado (a senha atual é conferida antes).
+    Os tokens emitidos antes da troca deixam de valer (é preciso fazer login de novo).
     """
-    # Verificando nome do arquivo
-    if crud.get_contract_by_filename(db, filename=file.filename):
-        raise HTTPException(status_code=400, detail="Um contrato com este nome de arquivo já existe.")
+    valid, _ = await auth.verify_password_async(passwords.current_password, current_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Senha atual incorreta.")
+    hashed_password = await auth.get_password_hash_async(passwords.new_password)
+    db_user = await crud_async.update_user_password(db, current_user.id, hashed_password)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado.")
+    return db_user
+
+
+@app.delete("/users/me", response_model=schemas.UserRead, tags=["Users"])
+async def delete_current_user(
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Remove o usuário logado. Os tokens dele deixam de valer na hora (o cache de autenticação é limpo).
+    """
+    db_user = await crud_async.delete_user(db, current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado.")
+    return db_user
+
+
+# --- Endpoint de Upload de Contrato (Assíncrono, via fila) ---
+# O corpo é lido direto do stream (sem o UploadFile do Starlette), então o formulário é descrito aqui para a documentação
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+
+@app.post("/contracts/upload", response_model=models.Contract, status_code=status.HTTP_202_ACCEPTED,
+          tags=["Contracts"], openapi_extra=UPLOAD_OPENAPI)
+async def upload_contract(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_session),  # Dependência de sessão do banco de dados
+    current_user: models.User = Depends(admission.upload_principal)  # Verificação do token e do limite de envios
+):
+    """
+    Recebe um arquivo de contrato e o grava em blocos direto na pasta de uploads
+    (calculando o hash e validando o tamanho durante a leitura), depois coloca a análise da IA na fila.
+    Retorna imediatamente (202) com o contrato em "processing"; o andamento
+    pode ser acompanhado em `GET /contracts/{id}/events` (ou consultado em `GET /contracts/{id}/status`).
+    Responde 429 (com Retry-After) se o usuário passou do limite de envios ou se a fila está longa demais.
+    """
+    queued, durations = await crud_async.get_queue_load(db, admission.JOB_DURATION_SAMPLES)
+    admission.controller.check_queue(queued, durations, admission.queue_parallelism())
+
+    async def check_filename(filename: str):
+        # Verificando nome do arquivo antes de gravar qualquer byte
+        if await crud_async.get_contract_by_filename(db, filename):
+            raise HTTPException(status_code=400, detail="Um contrato com este nome de arquivo já existe.")
+
+    content_length = request.headers.get("content-length")
+    with metrics.timed(metrics.UPLOAD_SECONDS, endpoint="upload"):
+        upload = await uploads.receive_upload(
+            request.stream(),
+            request.headers.get("content-type", ""),
+            content_length=int(content_length) if content_length else None,
+            before_write=check_filename,
+        )
+    metrics.UPLOAD_BYTES.observe(upload.size)
 
-    tmp_path = None  # Inicializa para garantir que o caminho do arquivo temporário esteja definido
+    # O original fica guardado pelo hash (uma única vez por conteúdo) antes do 202
     try:
-        # Cria um arquivo único no sistema de arquivos temporário.
-        # `delete=False` impede que o arquivo seja apagado automaticamente ao fechar.
-        # `suffix` mantém a extensão original do arquivo.
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp:
-            shutil.copyfileobj(file.file, tmp)  # Copia o conteúdo do arquivo carregado para o arquivo temporário
-            tmp_path = tmp.name  # Armazena o caminho completo do arquivo temporário para uso posterior
-
-        # Criação do contrato no db
-        db_contract = crud.create_contract(db, filename=file.filename)
+        blob_created = await run_in_threadpool(blobs.store.put, upload.path, upload.sha256)
+    except Exception:
+        logger.exception("Falha ao guardar o arquivo original")
+        batch.discard_all([upload])
+        raise HTTPException(status_code=503, detail="Não foi possível guardar o arquivo. Tente novamente.")
 
+    # Criação do contrato e do job no db
+    try:
+        db_contract = await crud_async.enqueue_contract(
+            db, filename=upload.filename, file_path=upload.path, content_hash=upload.sha256, blob_hash=upload.sha256
+        )
+    except Exception as e:
+        # Nada foi para a fila: o arquivo enviado e o original guardado agora não pertencem a nenhum contrato
+        await db.rollback()
+        batch.discard_all([upload])
+        if blob_created:  # Um original que já existia é de outro contrato
+            try:
+                await crud_async.discard_blob(db, upload.sha256)
+            except Exception:
+                logger.exception("Falha ao marcar o arquivo original para remoção")
+        if isinstance(e, IntegrityError):  # Outro envio com o mesmo nome ganhou a corrida depois do check_filename
+            raise HTTPException(status_code=400, detail="Um contrato com este nome de arquivo já existe.") from e
+        raise
+    logger.info("Contrato enviado para a fila de análise", extra={"contract_id": db_contract.id, "size": upload.size})
+    # O "received" sai antes de acordar os workers, para nunca chegar depois do "extracted"
+    await run_in_threadpool(events.publish, db_contract.id, "received", filename=upload.filename, size=upload.size)
+    worker.notify()  # Acorda os workers ociosos
 
-        print(f"[IA] Iniciando análise do contrato ID {db_contract.id}")
+    return db_contract
 
-        # Verificação de segurança
-        if not os.path.exists(tmp_path):
-            print(f"[IA] Erro: Arquivo temporário não encontrado em {tmp_path}")
-            # Atualiza o status do contrato para falha
-            crud.update_contract_status(db, db_contract.id, "failed")
-            raise HTTPException(status_code=500, detail="Erro interno: Arquivo temporário para análise não encontrado.")
 
-        # Chama a função de processamento da IA. E Salva os dados no formato do schemas.ContractData
-        extracted_data: schemas.ContractData = processing.analyze_contract_with_ai(tmp_path)
-        print(f"[IA] Extração concluída para contrato {db_contract.id}")
+BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            "required": ["files"],
+        }}},
+    }
+}
 
-        # Atualização do contrato no db
-        crud.update_contract_with_data(db, db_contract.id, extracted_data)
 
-        # Atualiza o banco de dados para certeza dos dados atualizados
-        db.refresh(db_contract)
+@app.post("/contracts/batch", response_model=schemas.BatchResult, tags=["Contracts"], openapi_extra=BATCH_OPENAPI)
+async def upload_contract_batch(
+    request: Request,
+    db: Session = Depends(database.get_session),
+    current_user: models.User = Depends(admission.upload_principal)
+):
+    """
+    Recebe vários contratos de uma vez (campo "files", podendo incluir arquivos .zip),
+    cria todos os contratos numa única transação e analisa os arquivos em paralelo.
+    Retorna um manifesto com o resultado de cada arquivo. Cada arquivo conta no limite de envios em lote do usuário.
+    """
+    content_length = request.headers.get("content-length")
+    with metrics.timed(metrics.UPLOAD_SECONDS, endpoint="batch"):
+        received = await uploads.receive_files(
+            request.stream(),
+            request.headers.get("content-type", ""),
+            field_name="files",
+            max_files=batch.BATCH_MAX_FILES,
+            content_length=int(content_length) if content_length else None,
+        )
+    for upload in received:
+        metrics.UPLOAD_BYTES.observe(upload.size)
+    stored = await run_in_threadpool(batch.expand_archives, received)
+    try:
+        # O pedido já pagou um envio na dependência upload_principal; os arquivos saem do saldo de lotes
+        await admission.controller.acheck_batch(current_user.username, len(stored))
+    except HTTPException:
+        batch.discard_all(stored)
+        raise
+    return await run_in_threadpool(batch.run_batch, db, stored)
 
-    except Exception as e:
-        # o status do contrato é definido como "failed".
-        print(f"[Erro IA] Contrato ID {db_contract.id}: {e}")
-        crud.update_contract_status(db, db_contract.id, "failed")
-        raise HTTPException(status_code=500, detail=f"Erro na análise do contrato: {e}")
-    finally:
-        # Limpeza
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
-            print(f"[IA] Arquivo temporário removido: {tmp_path}")
 
+@app.get("/contracts/{contract_id}/status", response_model=schemas.ContractStatus, tags=["Contracts"])
+async def get_contract_status(
+    contract_id: int,
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Consulta o status do processamento de um contrato (processing, completed ou failed).
+    """
+    db_contract = await crud_async.get_contract(db, contract_id)
+    if db_contract is None:
+        raise HTTPException(status_code=404, detail="Contrato não encontrado.")
     return db_contract
 
 
+@app.get("/contracts/{contract_id}/file", tags=["Contracts"], response_class=FileResponse,
+         responses={200: {"content": {"application/octet-stream": {}}}, 206: {"description": "Parte do arquivo (Range)"}})
+async def download_contract_file(
+    contract_id: int,
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Baixa o arquivo original do contrato, com suporte a `Range` (206) e `If-None-Match` (304, o ETag é o SHA-256).
+    No armazenamento local o arquivo é enviado direto do disco (sendfile, quando o servidor ASGI suporta);
+    no S3 ele é repassado em blocos, pedindo ao bucket só o intervalo solicitado.
+    """
+    db_contract = await crud_async.get_contract(db, contract_id)
+    if db_contract is None or db_contract.blob_hash is None:
+        raise HTTPException(status_code=404, detail="Arquivo do contrato não encontrado.")
+    blob_hash = db_contract.blob_hash
+    headers = {"ETag": f'"{blob_hash}"', "Cache-Control": "private, no-cache"}
+    if pagination.etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    media_type = blobs.media_type(db_contract.filename)
+    path = await run_in_threadpool(blobs.store.local_path, blob_hash)
+    if path is not None:
+        return FileResponse(path, media_type=media_type, filename=db_contract.filename, headers=headers)
+
+    size = await run_in_threadpool(blobs.store.size, blob_hash)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Arquivo do contrato não encontrado.")
+    try:
+        requested = blobs.parse_range(request.headers.get("range"), size)
+    except blobs.RangeNotSatisfiable:
+        raise HTTPException(status_code=416, detail="Intervalo fora do arquivo.", headers={"Content-Range": f"bytes */{size}"})
+    start, end = requested or (0, size - 1)
+    headers.update({"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1),
+                    "Content-Disposition": blobs.content_disposition(db_contract.filename)})
+    if requested:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(iterate_in_threadpool(blobs.store.iter_range(blob_hash, start, end)),
+                             status_code=206 if requested else 200, media_type=media_type, headers=headers)
+
+
+@app.get("/contracts/{contract_id}/events", tags=["Contracts"], response_class=StreamingResponse,
+         responses={200: {"content": {"text/event-stream": {}}}})
+async def stream_contract_events(
+    contract_id: int,
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Acompanha a análise de um contrato por Server-Sent Events: received, extracted (com o número de páginas),
+    llm_started, chunk_done (parte N de M), analyzed e, por fim, persisted ou failed, quando o stream termina.
+    Quem conecta depois recebe as etapas que já aconteceram; ao reconectar, o `Last-Event-ID` evita repetições.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    # Inscreve antes de ler o status no banco, assim nenhum evento se perde entre as duas coisas
+    subscription = events.broker.subscribe(contract_id, int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+    try:
+        db_contract = await crud_async.get_contract(db, contract_id)
+        if db_contract is None:
+            raise HTTPException(status_code=404, detail="Contrato não encontrado.")
+        contract_status = db_contract.status
+    except BaseException:
+        events.broker.unsubscribe(subscription)
+        raise
+    await db.close()  # Libera a conexão: o stream pode ficar aberto por minutos
+
+    async def stream():
+        try:
+            yield f"retry: {int(events.EVENTS_HEARTBEAT_SECONDS * 1000)}\n\n"
+            for event in subscription.replay:
+                yield events.format_sse(event)
+                if event["stage"] in events.TERMINAL_STAGES:
+                    return
+            if contract_status in ("completed", "failed"):  # Análise terminada antes (ou em outro processo)
+                stage = "persisted" if contract_status == "completed" else "failed"
+                yield events.format_sse({"contract_id": contract_id, "stage": stage, "status": contract_status})
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=events.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:  # Cliente lento: desconectado, ele reconecta com o Last-Event-ID
+                    return
+                yield events.format_sse(event)
+                if event["stage"] in events.TERMINAL_STAGES:
+                    return
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # Sem buffer no nginx
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+def read_metrics():
+    """
+    Métricas no formato do Prometheus: requisições por rota e status, duração de cada etapa da análise
+    (upload, extração por formato, chamadas e tokens da IA, funções do crud), pool do banco e itens em andamento.
+    Sem autenticação, como é comum para o scraper; restrinja o acesso no proxy se a API for pública.
+    """
+    content, media_type = metrics.render()
+    return Response(content=content, media_type=media_type)
+
+
+@app.get("/stats", tags=["Root"])
+async def read_stats(
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Números operacionais da API: tamanho da fila e uso do pool (para dimensionar os workers),
+    acertos dos caches e latência das rotas neste worker.
+    """
+    jobs = await crud_async.count_jobs_by_status(db)
+    return {
+        "queue": worker.queue_stats(jobs),
+        "cache": content_cache.stats(),
+        "detail_cache": cache.detail_cache.stats(),
+        "auth": {**auth.token_cache.stats(), "password_hasher": auth.password_hasher.stats()},
+        "events": events.broker.stats(),
+        "admission": admission.controller.stats(),
+        "requests": request_timings.stats(),
+    }
+
+
+@app.delete("/cache/{namespace}", tags=["Root"])
+def invalidate_cache(
+    namespace: str,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Invalida um namespace do cache ("pages", "ocr", "analysis" ou "detail", o cache do detalhe dos contratos).
+    Mudanças no prompt/modelo já invalidam "analysis" sozinhas (a chave inclui a versão do analisador),
+    este endpoint serve para forçar a limpeza.
+    """
+    if namespace == "detail":
+        return {"namespace": namespace, "removed": cache.detail_cache.clear()}
+    if namespace not in ("pages", "ocr", "analysis"):
+        raise HTTPException(status_code=404, detail="Namespace de cache não encontrado.")
+    return {"namespace": namespace, "removed": content_cache.invalidate(namespace)}
+
+
 # --- Endpoints de Contrato (Busca, Listagem, Deleção) ---
 
+@app.get("/contracts/search", response_model=schemas.SearchResult, tags=["Contracts"])
+async def search_contracts(
+    q: str = Query(..., min_length=1, description="Palavras buscadas no texto do contrato e nos campos extraídos"),
+    limit: int = Query(search.SEARCH_PAGE_DEFAULT, ge=1, le=search.SEARCH_PAGE_MAX),
+    offset: int = Query(0, ge=0, le=search.SEARCH_MAX_OFFSET),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Busca textual nos contratos (texto extraído, partes, obrigações e cláusula de rescisão),
+    ordenada por relevância e com um trecho destacando os termos encontrados.
+    Declarado antes de `/contracts/{contract_name}` para "search" não ser lido como nome de arquivo.
+    """
+    if not search.supported(db.bind.dialect.name):
+        raise HTTPException(status_code=501, detail="Busca textual não disponível neste banco de dados.")
+    hits = await search.search_contracts(db, q, limit, offset=offset, status=status_filter)
+    next_offset = offset + limit if len(hits) > limit else None
+    return {"items": hits[:limit], "next_offset": next_offset}
+
+
+@app.get("/contracts/aggregate", response_model=schemas.AggregateResult, tags=["Contracts"])
+async def aggregate_contracts(
+    group_by: Literal["contracting_party", "contracted_party", "status", "month", "currency"] = "status",
+    status_filter: Optional[str] = Query(None, alias="status"),
+    currency: Optional[str] = Query(None, min_length=3, max_length=3, description="Código da moeda (ex.: BRL)"),
+    min_value: Optional[Decimal] = Query(None, ge=0, description="Valor mínimo do contrato, na moeda"),
+    max_value: Optional[Decimal] = Query(None, ge=0, description="Valor máximo do contrato, na moeda"),
+    limit: int = Query(pagination.AGGREGATE_GROUPS_DEFAULT, ge=1, le=pagination.AGGREGATE_GROUPS_MAX),
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Contagem e soma dos valores dos contratos por parte, status, mês de início da vigência ou moeda
+    (ex.: contratos acima de R$ 1 milhão por contratada: `group_by=contracted_party&currency=BRL&min_value=1000000`).
+    Usa as colunas tipadas preenchidas pela normalização. Declarado antes de `/contracts/{contract_name}`.
+    """
+    rows = await crud_async.aggregate_contracts(
+        db, group_by, limit, status=status_filter, currency=currency.upper() if currency else None,
+        min_cents=int(min_value * 100) if min_value is not None else None,
+        max_cents=int(max_value * 100) if max_value is not None else None,
+    )
+    groups = []
+    for row in rows:
+        total = row.pop("total_cents")
+        groups.append({
+            **row,
+            "total_value": total / 100 if total is not None else None,
+            "average_value": round(total / row["valued"] / 100, 2) if row["valued"] else None,
+        })
+    return {"group_by": group_by, "groups": groups}
+
+
+@app.get("/contracts/export", tags=["Contracts"], response_class=StreamingResponse,
+         responses={200: {"content": {media_type: {} for media_type, _ in export.FORMATS.values()}}})
+async def export_contracts(
+    export_format: Literal["ndjson", "csv", "parquet"] = Query("ndjson", alias="format"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    updated_since: Optional[datetime] = Query(None, description="Só contratos alterados a partir desse momento (ISO 8601)"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula (ex.: filename,status)"),
+    session_factory: async_sessionmaker = Depends(database.get_async_session_factory),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Exporta todos os contratos (filtrados por status e/ou alteração desde `updated_since`) numa única resposta,
+    em NDJSON, CSV ou Parquet. As linhas vêm de um cursor do banco e são enviadas aos poucos, então a memória
+    usada não depende do número de contratos. Declarado antes de `/contracts/{contract_name}`.
+    """
+    columns = pagination.parse_fields(fields, "id")
+    if export_format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Exportação em Parquet indisponível: o pyarrow não está instalado no servidor (pip install -r requirements.txt).")
+    media_type, extension = export.FORMATS[export_format]
+
+    async def stream():
+        # Sessão própria: ela precisa continuar aberta enquanto a resposta é enviada
+        async with session_factory() as db:
+            batches = crud_async.iter_contract_rows(db, columns, export.EXPORT_BATCH_SIZE,
+                                                    status=status_filter, updated_since=updated_since)
+            async for chunk in export.SERIALIZERS[export_format](batches, columns):
+                yield chunk
+
+    headers = {"Content-Disposition": blobs.content_disposition(f"contracts.{extension}")}
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+
+@app.get("/contracts", response_model=schemas.ContractPage, tags=["Contracts"])
+async def list_contracts(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.CONTRACTS_PAGE_DEFAULT, ge=1, le=pagination.CONTRACTS_PAGE_MAX),
+    order_by: Literal["id", "filename"] = "id",
+    status_filter: Optional[str] = Query(None, alias="status"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula (ex.: filename,status)"),
+    db: AsyncSession = Depends(database.get_async_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Lista os contratos em páginas. O `next_cursor` da resposta é passado em `cursor` para buscar a próxima página.
+    Responde 304 quando o `If-None-Match` enviado corresponde à página atual (ETag).
+    """
+    columns = pagination.parse_fields(fields, order_by)
+    after = pagination.decode_cursor(cursor, order_by) if cursor else None
+    rows = await crud_async.list_contracts(db, columns, limit, order_by=order_by, after=after, status=status_filter)
+
+    next_cursor = None
+    if len(rows) > limit:  # Veio o item extra: existe uma próxima página
+        rows = rows[:limit]
+        next_cursor = pagination.encode_cursor(order_by, rows[-1][order_by])
+
+    body = json.dumps(jsonable_encoder({"items": rows, "next_cursor": next_cursor}), ensure_ascii=False).encode()
+    headers = {"ETag": pagination.etag_for(body), "Cache-Control": "private, no-cache"}  # O navegador sempre revalida
+    if pagination.etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/contracts/{contract_name}", response_model=models.Contract, tags=["Contracts"])
-def get_contract_details(
+async def get_contract_details(
     contract_name: str,
-    db: Session = Depends(database.get_session),
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_session),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """
     Recupera os detalhes de um contrato específico pelo seu nome de arquivo.
+    Contratos concluídos saem do cache de detalhes; responde 304 quando o `If-None-Match` corresponde (ETag).
     """
-    db_contract = crud.get_contract_by_filename(db, filename=contract_name)
-    if db_contract is None:
-        raise HTTPException(status_code=404, detail="Contrato não encontrado.")
-    return db_contract
+    entry = cache.detail_cache.get(contract_name)
+    if entry is None:
+        generation = cache.detail_cache.generation()  # Antes da leitura: uma alteração no meio do caminho impede a gravação
+        db_contract = await crud_async.get_contract_by_filename(db, filename=contract_name)
+        if db_contract is None:
+            raise HTTPException(status_code=404, detail="Contrato não encontrado.")
+        body = json.dumps(jsonable_encoder(db_contract), ensure_ascii=False).encode()
+        entry = {"id": db_contract.id, "filename": db_contract.filename, "status": db_contract.status,
+                 "body": body.decode(), "etag": pagination.etag_for(body, weak=False)}
+        cache.detail_cache.set(entry, generation)
+
+    headers = {"ETag": entry["etag"], "Cache-Control": "private, no-cache"}  # O navegador sempre revalida
+    if pagination.etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
 
 
 @app.get("/contracts/list/filenames", response_model=list[str], tags=["Contracts"])
-def get_contract_filenames(
-    db: Session = Depends(database.get_session),
+async def get_contract_filenames(
+    session_factory: async_sessionmaker = Depends(database.get_async_session_factory),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """
     Recupera uma lista com os nomes de todos os contratos existentes.
+    A lista é enviada aos poucos, em blocos lidos do banco; para listas grandes prefira o `GET /contracts` paginado.
     """
-    filenames = crud.get_all_contract_filenames(db)
-    return filenames
+    async def stream():
+        # Sessão própria: ela precisa continuar aberta enquanto a resposta é enviada
+        async with session_factory() as db:
+            yield "["
+            separator = ""
+            async for filenames in crud_async.iter_contract_filenames(db):
+                yield separator + ",".join(json.dumps(filename, ensure_ascii=False) for filename in filenames)
+                separator = ","
+            yield "]"
+
+    return StreamingResponse(stream(), media_type="application/json")
 
 
 @app.delete("/contracts/{contract_id}", response_model=models.Contract, tags=["Contracts"])
-def remove_contract(
+async def remove_contract(
     contract_id: int,
-    db: Session = Depends(database.get_session),
+    db: AsyncSession = Depends(database.get_async_session),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """
     Deleta um contrato do banco de dados usando seu ID.
     """
-    deleted_contract = crud.delete_contract(db, contract_id=contract_id)
+    deleted_contract = await crud_async.delete_contract(db, contract_id=contract_id)
     if deleted_contract is None:
         raise HTTPException(status_code=404, detail="Contrato não encontrado para deletar.")
     return deleted_contract
\ No newline at end of file
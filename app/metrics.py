@@ -0,0 +1,168 @@
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# --- Configuração das Métricas ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Com vários processos (workers em processos, gunicorn), cada um grava as métricas nesta pasta e o /metrics
+# de qualquer um deles soma todos (ver a documentação do prometheus_client sobre o modo multiprocesso)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Faixas dos histogramas (segundos): rotas e banco são rápidos; extração e IA levam de segundos a minutos
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+# --- Requisições
+REQUESTS = Counter("http_requests_total", "Requisições atendidas", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Duração das requisições até o início da resposta",
+                            ["method", "route"], buckets=FAST_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requisições em andamento", multiprocess_mode="livesum")
+
+# --- Etapas da análise
+UPLOAD_SECONDS = Histogram("upload_receive_seconds", "Recebimento do upload (stream para o disco, com hash)",
+                           ["endpoint"], buckets=SLOW_BUCKETS)
+UPLOAD_BYTES = Histogram("upload_bytes", "Tamanho dos arquivos recebidos",
+                         buckets=(10_000, 100_000, 1_000_000, 10_000_000, 100_000_000))
+EXTRACTION_SECONDS = Histogram("extraction_seconds", "Extração do texto do arquivo", ["format"], buckets=SLOW_BUCKETS)
+EXTRACTION_PAGE_SECONDS = Histogram("extraction_page_seconds", "Extração de cada página do PDF (camada de texto ou OCR)",
+                                    ["backend"], buckets=SLOW_BUCKETS)
+EXTRACTION_PAGES = Counter("extraction_pages_total", "Páginas de PDF por origem do texto (text, ocr ou empty)", ["mode"])
+LLM_SECONDS = Histogram("llm_call_seconds", "Chamadas à IA (sem a espera pela vaga)", ["outcome"], buckets=SLOW_BUCKETS)
+LLM_SLOT_WAIT_SECONDS = Histogram("llm_slot_wait_seconds", "Espera por uma vaga na IA", buckets=SLOW_BUCKETS)
+LLM_TOKENS = Histogram("llm_tokens", "Tokens por chamada à IA (do provedor ou estimados)", ["direction"],
+                       buckets=TOKEN_BUCKETS)
+LLM_COALESCED = Counter("llm_coalesced_total", "Análises que aproveitaram a chamada à IA de uma análise idêntica em andamento")
+LLM_BATCH_SIZE = Histogram("llm_batch_size", "Contratos por chamada em lote à IA (LLM_BATCH_ENABLED)",
+                           buckets=(1, 2, 4, 8, 16, 32, 64))
+LLM_CALLS_IN_FLIGHT = Gauge("llm_calls_in_flight", "Chamadas à IA em andamento", multiprocess_mode="livesum")
+ANALYSIS_SECONDS = Histogram("analysis_seconds", "Análise completa de um contrato (extração, IA e gravação)",
+                             ["status"], buckets=SLOW_BUCKETS)
+ANALYSES_IN_FLIGHT = Gauge("analyses_in_flight", "Contratos sendo analisados", multiprocess_mode="livesum")
+DETAIL_CACHE_REQUESTS = Counter("contract_detail_cache_total", "Leituras do detalhe dos contratos pelo cache",
+                                ["result"])
+JOBS_REQUEUED = Counter("jobs_requeued_total", "Jobs em andamento devolvidos à fila (encerramento ou queda de um worker)",
+                        ["reason"])
+JOBS_EXHAUSTED = Counter("jobs_exhausted_total",
+                         "Jobs marcados como falha por terem sido interrompidos WORKER_MAX_ATTEMPTS vezes")
+EXPORTED_ROWS = Counter("contracts_exported_total", "Contratos enviados pela exportação (GET /contracts/export)", ["format"])
+REANALYSES = Counter("reanalysis_contracts_total", "Contratos reanalisados com a versão nova do analisador", ["outcome"])
+DB_SECONDS = Histogram("db_operation_seconds", "Funções do crud e do crud_async", ["operation"], buckets=FAST_BUCKETS)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Registra a duração do bloco no histograma (também quando o bloco falha)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - start)
+
+
+def db_operation(func):
+    """Decorador das funções do crud: mede cada chamada com o nome da função (síncronas ou assíncronas)."""
+    operation = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return await func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                DB_SECONDS.labels(operation=operation).observe(time.perf_counter() - start)
+        return wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not METRICS_ENABLED:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_SECONDS.labels(operation=operation).observe(time.perf_counter() - start)
+    return wrapper
+
+
+@functools.cache
+def token_usage():
+    """
+    Callback da LangChain que conta os tokens de cada chamada à IA: usa o que o provedor informa
+    (usage_metadata) e, quando ele não informa, a estimativa de ~4 caracteres por token.
+    Criado na primeira análise (a LangChain só é carregada junto com o analisador).
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageCallback(BaseCallbackHandler):
+        def __init__(self):
+            self._prompts: dict = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._prompts[run_id] = sum(len(str(message.content)) for batch in messages for message in batch)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._prompts[run_id] = sum(len(prompt) for prompt in prompts)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            prompt_chars = self._prompts.pop(run_id, 0)
+            if not METRICS_ENABLED:
+                return
+            generation = response.generations[0][0] if response.generations and response.generations[0] else None
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens, response_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+            else:
+                prompt_tokens = prompt_chars // 4
+                response_tokens = len(generation.text) // 4 if generation is not None else 0
+            LLM_TOKENS.labels(direction="prompt").observe(prompt_tokens)
+            LLM_TOKENS.labels(direction="response").observe(response_tokens)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._prompts.pop(run_id, None)
+
+    return TokenUsageCallback()
+
+
+class DatabasePoolCollector:
+    """Estado dos pools de conexão (síncrono e assíncrono) lido a cada coleta, sem custo nas requisições."""
+
+    def collect(self):
+        from . import database  # Import tardio: o database não depende das métricas
+
+        family = GaugeMetricFamily("db_pool_connections", "Conexões do pool por estado", labels=["engine", "state"])
+        for name, engine in (("sync", database.engine), ("async", database.async_engine.sync_engine)):
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):  # NullPool/StaticPool não têm contadores
+                continue
+            family.add_metric([name, "checked_out"], pool.checkedout())
+            family.add_metric([name, "idle"], pool.checkedin())
+            family.add_metric([name, "overflow"], max(0, pool.overflow()))
+            family.add_metric([name, "size"], pool.size())
+        yield family
+
+
+REGISTRY.register(DatabasePoolCollector())
+
+
+def render() -> tuple[bytes, str]:
+    """Conteúdo do /metrics no formato texto do Prometheus."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # Soma os arquivos de todos os processos
+        registry.register(DatabasePoolCollector())  # Pool deste processo
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
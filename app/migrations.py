@@ -0,0 +1,112 @@
+import logging
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, inspect, or_, select, update
+
+from . import cache, database, logs, models, normalization
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da Migração ---
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))  # Contratos renormalizados por transação
+
+# Campos de texto lidos para preencher as colunas tipadas
+SOURCE_FIELDS = ("contracting_party", "contracted_party", "contract_value", "main_obligations", "additional_data")
+
+
+def add_missing_columns(engine, table) -> list[str]:
+    """
+    O create_all só cria tabelas novas: colunas adicionadas ao modelo depois são criadas aqui
+    com ALTER TABLE (todas são opcionais, então nenhuma linha existente precisa de valor padrão).
+    Os índices que faltarem também são criados. Retorna os nomes das colunas adicionadas.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []  # Tabela nova: o create_all a cria inteira
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    added = []
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+            added.append(column.name)
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+    return added
+
+
+def backfill_normalized_fields(engine, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Preenche as colunas tipadas dos contratos analisados antes da normalização existir (ou com uma versão
+    antiga das regras). Anda pelo id em lotes, cada um na sua transação, para não travar o banco.
+    Retorna quantos contratos foram atualizados.
+    """
+    contract = models.Contract.__table__
+    pending = or_(contract.c.normalization_version.is_(None),
+                  contract.c.normalization_version < normalization.NORMALIZATION_VERSION)
+    columns = [contract.c.id] + [contract.c[field] for field in SOURCE_FIELDS]
+    # Sem .values(): no executemany as colunas do SET vêm das chaves de cada dicionário
+    statement = update(contract).where(contract.c.id == bindparam("contract_id"))
+
+    updated, last_id = 0, 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(*columns)
+                .where(contract.c.status == "completed", contract.c.id > last_id, pending)
+                .order_by(contract.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            connection.execute(statement, [
+                {"contract_id": row.id, **normalization.normalize(row),
+                 "normalization_version": normalization.NORMALIZATION_VERSION}
+                for row in rows
+            ])
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+def backfill_updated_at(engine) -> int:
+    """
+    Contratos de antes da coluna updated_at recebem o momento da migração: a próxima exportação
+    incremental (`updated_since`) os inclui uma vez, em vez de nunca. Retorna quantos foram preenchidos.
+    """
+    contract = models.Contract.__table__
+    with engine.begin() as connection:
+        result = connection.execute(
+            update(contract).where(contract.c.updated_at.is_(None)).values(updated_at=datetime.now(timezone.utc))
+        )
+    return result.rowcount
+
+
+def upgrade(engine) -> None:
+    """
+    Leva um banco existente ao esquema atual (idempotente, chamado na inicialização da API e do worker).
+    """
+    added = add_missing_columns(engine, models.Contract.__table__)
+    if added:
+        logger.info("Colunas adicionadas em contract", extra={"columns": added})
+    user_columns = add_missing_columns(engine, models.User.__table__)
+    if user_columns:
+        logger.info("Colunas adicionadas em user", extra={"columns": user_columns})
+    job_columns = add_missing_columns(engine, models.Job.__table__)
+    if job_columns:
+        logger.info("Colunas adicionadas em job", extra={"columns": job_columns})
+    updated = backfill_normalized_fields(engine)
+    if updated:
+        logger.info("Contratos normalizados", extra={"contracts": updated, "version": normalization.NORMALIZATION_VERSION})
+    stamped = backfill_updated_at(engine)
+    if added or updated or stamped:
+        cache.detail_cache.clear()  # As respostas guardadas não têm as colunas novas/preenchidas
+
+
+if __name__ == "__main__":
+    # Execução manual (ex.: depois de aumentar NORMALIZATION_VERSION): python -m app.migrations
+    logs.setup()
+    models.SQLModel.metadata.create_all(bind=database.engine)
+    upgrade(database.engine)
@@ -1,3 +1,4 @@
+from datetime import date, datetime, timezone
 from typing import Optional
 from sqlmodel import Field, SQLModel
 # Diferente do "schemas.py" aqui temos a representação dos dados para o banco de dados
@@ -8,6 +9,8 @@ class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(index=True, unique=True)
     hashed_password: str
+    # Vai no JWT ("ver") e aumenta a cada troca de senha: os tokens emitidos antes deixam de valer
+    token_version: Optional[int] = Field(default=0)
 
 class Contract(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -20,4 +23,60 @@ class Contract(SQLModel, table=True):
     contract_value: Optional[str] = None
     main_obligations: Optional[str] = None
     additional_data: Optional[str] = None
-    termination_clause: Optional[str] = None
\ No newline at end of file
+    termination_clause: Optional[str] = None
+
+    # Campos tipados extraídos dos textos acima (normalization.py), para filtrar e agregar direto no SQL
+    value_cents: Optional[int] = Field(default=None, index=True)  # Valor total em centavos (inteiro, sem erro de arredondamento)
+    currency: Optional[str] = Field(default=None, index=True)  # Código ISO da moeda (BRL, USD, EUR)
+    start_date: Optional[date] = Field(default=None, index=True)  # Início da vigência
+    end_date: Optional[date] = None  # Fim da vigência
+    contracting_party_key: Optional[str] = Field(default=None, index=True)  # CNPJ (só dígitos) ou nome normalizado
+    contracted_party_key: Optional[str] = Field(default=None, index=True)
+    normalization_version: Optional[int] = None  # Versão das regras usadas (a migração renormaliza as antigas)
+    blob_hash: Optional[str] = Field(default=None, index=True)  # SHA-256 do arquivo original no blobs.store (compartilhado por cópias)
+    analyzer_version: Optional[str] = Field(default=None, index=True)  # processing.ANALYZER_VERSION da última análise (reanalysis.py)
+    # Última alteração da linha (preenchida também nos UPDATEs do SQLAlchemy), usada pela exportação incremental
+    updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), index=True,
+                                           sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)})
+
+
+class Job(SQLModel, table=True):
+    # Fila de processamento persistida no próprio banco, assim tanto os workers dentro da API quanto os
+    # iniciados com "python -m app.worker" consomem a mesma fila
+    id: Optional[int] = Field(default=None, primary_key=True)
+    contract_id: int = Field(index=True)
+    file_path: str  # Caminho do arquivo salvo no upload, que será lido pelo worker
+    content_hash: Optional[str] = None  # SHA-256 calculado durante o upload (evita reler o arquivo para o cache)
+    status: str = Field(default="queued", index=True)  # queued -> running -> done/failed
+    attempts: int = Field(default=0)
+    owner: Optional[str] = Field(default=None, index=True)  # Processo que está com o job em "running" (worker.owner_id)
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ContractText(SQLModel, table=True):
+    # Texto extraído do arquivo, guardado numa tabela à parte para a busca textual
+    # (assim as consultas comuns em "contract" não carregam documentos inteiros)
+    contract_id: int = Field(primary_key=True)
+    text: str
+
+
+class ContractEvent(SQLModel, table=True):
+    # Eventos de progresso gravados por workers de outros processos, repassados aos clientes pela API
+    # (só usada com EVENTS_RELAY="database"; as linhas antigas são apagadas pela própria API)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    contract_id: int
+    stage: str
+    data: str  # Demais campos do evento, em JSON
+    origin: str  # Processo que gerou o evento
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+
+class BlobDeletion(SQLModel, table=True):
+    # Arquivo original que ficou sem contrato numa deleção. Só é apagado do blobs.store depois de
+    # BLOB_GC_GRACE_SECONDS e se nenhum contrato voltou a apontar para ele (um upload do mesmo conteúdo
+    # feito nesse meio tempo reaproveita o arquivo guardado)
+    sha256: str = Field(primary_key=True)
+    marked_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
@@ -0,0 +1,173 @@
+import re
+import unicodedata
+from datetime import date
+
+from . import models, schemas
+
+# Versão das regras abaixo: ao mudar alguma regra, aumente o número para os contratos antigos
+# serem normalizados de novo pela migração (python -m app.migrations)
+NORMALIZATION_VERSION = 1
+
+# Campos tipados gravados em "contract" a partir do que a IA devolveu em texto
+TYPED_FIELDS = ("value_cents", "currency", "start_date", "end_date", "contracting_party_key", "contracted_party_key")
+
+UNIDENTIFIED = {"NAO IDENTIFICADO", "NAO IDENTIFICADA", "NAO INFORMADO", "NAO INFORMADA", "N A"}
+
+CURRENCIES = {"R$": "BRL", "BRL": "BRL", "REAIS": "BRL", "REAL": "BRL",
+              "US$": "USD", "U$": "USD", "USD": "USD", "DOLARES": "USD",
+              "€": "EUR", "EUR": "EUR", "EUROS": "EUR"}
+MULTIPLIERS = {"MIL": 10**3, "MI": 10**6, "MILHAO": 10**6, "MILHOES": 10**6, "BI": 10**9, "BILHAO": 10**9, "BILHOES": 10**9}
+
+AMOUNT_PATTERN = re.compile(
+    r"(?P<prefix>R\$|US\$|U\$|USD|BRL|EUR|€)?\s*(?P<number>\d[\d.,]*)"
+    r"(?:\s*(?P<multiplier>mil|milh(?:ão|ao|ões|oes)|bilh(?:ão|ao|ões|oes)|mi|bi)\b)?"
+    r"(?:\s*(?P<suffix>reais|real|d[óo]lares|euros)\b)?",
+    re.IGNORECASE,
+)
+NUMERIC_DATE = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b")
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+WRITTEN_DATE = re.compile(r"\b(\d{1,2})º?\s+de\s+([a-zç]+)\s+de\s+(\d{4})\b", re.IGNORECASE)
+DURATION = re.compile(r"\b(\d{1,3})\s*\(?[a-z\s]*\)?\s*(meses|m[eê]s|anos?)\b", re.IGNORECASE)
+CNPJ_PATTERN = re.compile(r"\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b")
+
+MONTHS = {"janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6, "julho": 7,
+          "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12}
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+def _parse_number(raw: str) -> float | None:
+    """
+    Converte números escritos no formato brasileiro (1.500.000,00) ou americano (1,500,000.00).
+    O último separador seguido de 1 ou 2 dígitos é o decimal ("2,5 milhões"); os demais são de milhar.
+    """
+    raw = raw.rstrip(".,")
+    separators = [index for index, char in enumerate(raw) if char in ".,"]
+    if separators and len(raw) - separators[-1] - 1 in (1, 2):
+        integer, decimals = raw[:separators[-1]], raw[separators[-1] + 1:]
+    else:
+        integer, decimals = raw, "0"
+    digits = integer.replace(".", "").replace(",", "")
+    if not digits.isdigit():
+        return None
+    return float(f"{digits}.{decimals}")
+
+
+def parse_amount(text: str | None) -> tuple[int | None, str | None]:
+    """
+    Extrai o valor monetário em centavos e a moeda (ex.: "R$ 1,5 milhão" -> (150000000, "BRL")).
+    Com vários valores no texto (parcelas + total), fica o maior, que costuma ser o valor global.
+    """
+    if not text:
+        return None, None
+    best: tuple[int, str | None] | None = None
+    for match in AMOUNT_PATTERN.finditer(text):
+        marker = match.group("prefix") or match.group("suffix")
+        multiplier = match.group("multiplier")
+        if marker is None and multiplier is None:
+            continue  # Número solto (prazo, cláusula, percentual...), não é valor monetário
+        number = _parse_number(match.group("number"))
+        if number is None:
+            continue
+        if multiplier:
+            number *= MULTIPLIERS[_strip_accents(multiplier).upper()]
+        currency = CURRENCIES.get(_strip_accents(marker).upper()) if marker else None
+        cents = round(number * 100)
+        if best is None or cents > best[0]:
+            best = (cents, currency)
+    return best if best is not None else (None, None)
+
+
+def _safe_date(year: int, month: int, day: int) -> date | None:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _add_months(start: date, months: int) -> date:
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    for day in (start.day, 30, 29, 28):  # Fim de mês: 31/01 + 1 mês = 28 ou 29/02
+        result = _safe_date(year, month, day)
+        if result is not None:
+            return result
+    raise ValueError("Data inválida")
+
+
+def parse_dates(text: str | None) -> tuple[date | None, date | None]:
+    """
+    Início e fim da vigência: a menor e a maior data do texto. Com uma única data e um prazo
+    ("12 meses", "2 anos"), o fim é calculado a partir dela.
+    """
+    if not text:
+        return None, None
+    found = [_safe_date(int(y), int(m), int(d)) for d, m, y in NUMERIC_DATE.findall(text)]
+    found += [_safe_date(int(y), int(m), int(d)) for y, m, d in ISO_DATE.findall(text)]
+    for day, month_name, year in WRITTEN_DATE.findall(text):
+        month = MONTHS.get(_strip_accents(month_name).lower())
+        if month:
+            found.append(_safe_date(int(year), month, int(day)))
+    found = sorted({value for value in found if value is not None})
+    if not found:
+        return None, None
+    if len(found) > 1:
+        return found[0], found[-1]
+
+    duration = DURATION.search(text)
+    if duration:
+        amount, unit = int(duration.group(1)), _strip_accents(duration.group(2)).lower()
+        months = amount * 12 if unit.startswith("ano") else amount
+        return found[0], _add_months(found[0], months)
+    return found[0], None
+
+
+def _valid_cnpj(digits: str) -> bool:
+    if len(digits) != 14 or digits == digits[0] * 14:
+        return False
+    for length in (12, 13):
+        weights = list(range(length - 7, 1, -1)) + list(range(9, 1, -1))
+        total = sum(int(digit) * weight for digit, weight in zip(digits[:length], weights))
+        check = 0 if total % 11 < 2 else 11 - total % 11
+        if int(digits[length]) != check:
+            return False
+    return True
+
+
+def party_key(name: str | None) -> str | None:
+    """
+    Identificador normalizado da parte, para agrupar: o CNPJ (só dígitos) quando aparece e é válido,
+    senão o nome sem acentos, pontuação e diferenças de caixa ("Empresa S.A." == "EMPRESA SA").
+    """
+    if not name:
+        return None
+    for match in CNPJ_PATTERN.finditer(name):
+        digits = re.sub(r"\D", "", match.group(0))
+        if _valid_cnpj(digits):
+            return digits
+    normalized = _strip_accents(CNPJ_PATTERN.sub(" ", name)).upper()
+    normalized = re.sub(r"[./]", "", normalized)  # "S.A." e "S/A" viram "SA"
+    normalized = re.sub(r"\bCNPJ\b|[^A-Z0-9]+", " ", normalized).strip()
+    normalized = re.sub(r"\s+", " ", normalized)
+    if not normalized or normalized in UNIDENTIFIED:
+        return None
+    return normalized
+
+
+def normalize(data: schemas.ContractData | models.Contract) -> dict:
+    """
+    Etapa de normalização depois da resposta da IA: converte os campos em texto nas colunas tipadas.
+    Aceita também um contrato já gravado (usado pela migração para preencher as linhas antigas).
+    """
+    value_cents, currency = parse_amount(data.contract_value)
+    start_date, end_date = parse_dates(" ".join(filter(None, [data.additional_data, data.main_obligations])))
+    return {
+        "value_cents": value_cents,
+        "currency": currency,
+        "start_date": start_date,
+        "end_date": end_date,
+        "contracting_party_key": party_key(data.contracting_party),
+        "contracted_party_key": party_key(data.contracted_party),
+    }
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import json
+import os
+
+from fastapi import HTTPException
+
+from . import models
+
+# --- Configuração da Listagem Paginada ---
+CONTRACTS_PAGE_DEFAULT = int(os.getenv("CONTRACTS_PAGE_DEFAULT", "50"))  # Itens por página quando o limit não é informado
+CONTRACTS_PAGE_MAX = int(os.getenv("CONTRACTS_PAGE_MAX", "500"))  # Maior limit aceito
+AGGREGATE_GROUPS_DEFAULT = int(os.getenv("AGGREGATE_GROUPS_DEFAULT", "100"))  # Grupos devolvidos pela agregação
+AGGREGATE_GROUPS_MAX = int(os.getenv("AGGREGATE_GROUPS_MAX", "1000"))
+
+ORDER_FIELDS = ("id", "filename")  # Colunas únicas, então servem sozinhas como chave do cursor
+LISTABLE_FIELDS = tuple(models.Contract.model_fields)  # Campos que podem ser pedidos em "fields"
+
+
+def parse_fields(fields: str | None, order_by: str) -> list[str]:
+    """
+    Converte "filename,status" na lista de colunas da projeção.
+    O id e a coluna da ordenação sempre vão junto (são necessários para montar o cursor).
+    """
+    if not fields:
+        return list(LISTABLE_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in LISTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown)}.")
+    columns = ["id", order_by] + requested
+    return list(dict.fromkeys(columns))  # Remove repetidos mantendo a ordem
+
+
+def encode_cursor(order_by: str, value) -> str:
+    raw = json.dumps({"o": order_by, "v": value}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str):
+    """
+    Retorna o último valor da página anterior. O cursor só vale para a mesma ordenação em que foi gerado.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value = data["v"]
+        cursor_order = data["o"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    if cursor_order != order_by:
+        raise HTTPException(status_code=400, detail="O cursor foi gerado para outra ordenação.")
+    return value
+
+
+def etag_for(body: bytes, weak: bool = True) -> str:
+    # Forte quando o corpo é sempre o mesmo byte a byte para a mesma versão (detalhe de um contrato)
+    tag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return f"W/{tag}" if weak else tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # A comparação de If-None-Match é sempre "fraca": W/"x" e "x" são equivalentes
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag.removeprefix("W/") for candidate in candidates)
@@ -1,40 +1,435 @@
+import asyncio
+import hashlib
+import logging
 import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_unstructured import UnstructuredLoader
-from . import schemas, utils
+from . import admission, events, metrics, schemas, utils
+from .cache import content_cache
 
+logger = logging.getLogger(__name__)
+
+# As bibliotecas da LangChain/Gemini só são importadas quando o analisador é criado (ver ContractAnalyzer),
+# assim a API sobe rápido e o "/" responde antes delas estarem carregadas
 load_dotenv()
 
-def analyze_contract_with_ai(file_path: str) -> schemas.ContractData:
+MODEL_NAME = "gemini-2.5-flash"  # Modelo usado na análise
+
+# --- Configuração da análise em partes (map-reduce) ---
+LLM_CHUNK_THRESHOLD_TOKENS = int(os.getenv("LLM_CHUNK_THRESHOLD_TOKENS", "24000"))  # Acima disso o contrato é analisado em partes
+LLM_CHUNK_MAX_TOKENS = int(os.getenv("LLM_CHUNK_MAX_TOKENS", "6000"))  # Tamanho máximo de cada parte
+LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))  # Partes enviadas à IA ao mesmo tempo
+CHARS_PER_TOKEN = 4  # Estimativa de caracteres por token (suficiente para dimensionar as partes)
+
+# --- Configuração dos lotes de contratos curtos (micro-batching) ---
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "false").lower() == "true"
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))  # Contratos por chamada em lote
+LLM_BATCH_MAX_WAIT_MS = int(os.getenv("LLM_BATCH_MAX_WAIT_MS", "100"))  # Espera máxima para completar o lote
+LLM_BATCH_MAX_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", "4000"))  # Só contratos até esse tamanho entram em lotes
+
+# Prompt com as perguntas
+PROMPT_TEMPLATE = "Analise o texto do contrato abaixo e extraia as informações solicitadas. \n{format_instructions}\n\nTexto do Contrato:\n---\n{contract_text}\n---"
+
+# Prompt de cada parte no modo map-reduce
+CHUNK_PROMPT_TEMPLATE = "Analise o trecho {chunk_number} de {chunk_count} de um contrato e extraia as informações solicitadas que aparecem NESTE trecho. Use null para o que não estiver no trecho. \n{format_instructions}\n\nTrecho do Contrato:\n---\n{contract_text}\n---"
+
+# Versão do analisador: muda sempre que o prompt, o schema de saída ou o modelo mudam,
+# fazendo com que as análises antigas no cache deixem de ser usadas automaticamente
+ANALYZER_VERSION = hashlib.sha256(
+    "\n".join([
+        PROMPT_TEMPLATE, CHUNK_PROMPT_TEMPLATE, str(schemas.ContractData.model_json_schema()), MODEL_NAME,
+    ]).encode("utf-8")
+).hexdigest()[:16]
+
+# Início de cláusula/artigo/item numerado: pontos preferidos para dividir o contrato
+CLAUSE_BOUNDARY = re.compile(r"(?m)^(?=[ \t]*(?:CL[ÁA]USULA|Cl[áa]usula|ARTIGO|Art\.|\d+(?:\.\d+)*[ \t]*[-–.)][ \t]))")
+
+
+def analysis_cache_key(document_text: str) -> str:
     """
-    Carrega um documento, extrai o texto e usa a IA para analisar o conteúdo.
+    Chave da análise no cache: hash do texto normalizado (espaços colapsados) + versão do analisador
     """
-    document_text = utils.extract_text_from_file(file_path) # Texto do arquivo
+    normalized = " ".join(document_text.split())
+    return hashlib.sha256(f"{ANALYZER_VERSION}\n{normalized}".encode("utf-8")).hexdigest()
 
-    # Inicializa a IA
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-        google_api_key=os.getenv("GEMINI_API_KEY")
-    )
-    
-    parser = PydanticOutputParser(pydantic_object=schemas.ContractData)  # Aqui é um analisador para saber a estrutura da saida (Mostra pra ia como formatar a resposta)
-
-    # Prompt com as perguntas
-    prompt = PromptTemplate(
-        template="Analise o texto do contrato abaixo e extraia as informações solicitadas. \n{format_instructions}\n\nTexto do Contrato:\n---\n{contract_text}\n---",
-        input_variables=["contract_text"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},  # Usa o parser e faz as pergutnas de acordo com o ContractData
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split_oversized(block: str, max_chars: int) -> list[str]:
+    """
+    Divide um bloco maior que o limite: primeiro por parágrafo, depois por frase e, em último caso, no limite.
+    """
+    parts = []
+    while len(block) > max_chars:
+        window = block[:max_chars]
+        cut = max(window.rfind("\n\n"), window.rfind(". "), window.rfind("\n"))
+        cut = cut + 1 if cut > max_chars // 2 else max_chars
+        parts.append(block[:cut])
+        block = block[cut:]
+    if block:
+        parts.append(block)
+    return parts
+
+
+def split_into_chunks(pages: list[str], max_tokens: int | None = None) -> list[str]:
+    """
+    Agrupa o texto (já separado por página) em partes de até `max_tokens`, quebrando
+    preferencialmente no início das cláusulas para não cortar uma cláusula ao meio.
+    """
+    max_chars = (max_tokens or LLM_CHUNK_MAX_TOKENS) * CHARS_PER_TOKEN
+    blocks = []
+    for page in pages:
+        for block in CLAUSE_BOUNDARY.split(f"{page}\n"):
+            if block.strip():
+                blocks.extend(_split_oversized(block, max_chars))
+
+    chunks, current, size = [], [], 0
+    for block in blocks:
+        if current and size + len(block) > max_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+class EmptyDocumentError(ValueError):
+    """Documento sem texto (nem pela camada de texto, nem pelo OCR): não vale uma chamada à IA."""
+
+
+class MicroBatcher:
+    """
+    Junta os contratos curtos que chegam dentro de `max_wait` segundos numa única chamada `batch` da cadeia
+    (até `max_size` contratos, ocupando uma vaga da IA). Não há thread própria: quem abre o lote espera a janela
+    e envia os contratos de todos; os demais só aguardam o resultado do seu.
+    """
+
+    def __init__(self, chain, max_size: int, max_wait: float):
+        self.chain = chain
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._open: list[tuple[dict, Future]] | None = None  # Lote ainda recebendo contratos
+
+    def submit(self, inputs: dict):
+        future = Future()
+        with self._condition:
+            batch = self._open
+            if batch is None:
+                batch = self._open = []
+            batch.append((inputs, future))
+            leader = len(batch) == 1
+            if len(batch) >= self.max_size:
+                self._open = None  # Lote cheio: o próximo contrato abre outro
+                self._condition.notify_all()
+            elif leader:
+                deadline = time.monotonic() + self.max_wait
+                while self._open is batch and (remaining := deadline - time.monotonic()) > 0:
+                    self._condition.wait(remaining)
+                if self._open is batch:
+                    self._open = None
+        if leader:
+            self._run(batch)
+        return future.result()
+
+    def _run(self, batch: list[tuple[dict, Future]]) -> None:
+        """Envia o lote; um contrato que falhar com erro temporário é refeito sozinho (com as novas tentativas)."""
+        try:
+            inputs = [item for item, _ in batch]
+            config = {"callbacks": [metrics.token_usage()], "max_concurrency": len(batch)}
+            metrics.LLM_BATCH_SIZE.observe(len(batch))
+            try:
+                results = admission.controller.call_llm(self.chain.batch, inputs, config=config, return_exceptions=True)
+            except Exception as e:  # Sem vaga na IA (LLMBusy): todos os contratos do lote falham juntos
+                results = [e] * len(batch)
+            for (item, future), result in zip(batch, results):
+                if isinstance(result, Exception) and admission.is_transient(result):
+                    try:
+                        result = admission.controller.call_llm(self.chain.invoke, item,
+                                                               config={"callbacks": [metrics.token_usage()]})
+                    except Exception as e:
+                        result = e
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            # Lote interrompido no meio (ex.: BaseException na thread de quem o abriu): os demais não esperam para sempre
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Lote da IA interrompido antes do resultado."))
+
+
+class ContractAnalyzer:
+    """
+    Analisador de longa duração: o cliente do Gemini (com a conexão reaproveitada entre chamadas),
+    os parsers, os prompts (com as instruções de formato já renderizadas) e as cadeias são criados
+    uma única vez e reutilizados em todas as análises.
+    """
+
+    def __init__(self, llm=None):
+        from langchain.prompts import PromptTemplate
+        from langchain_core.output_parsers import PydanticOutputParser
+
+        if llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            # Inicializa a IA
+            llm = ChatGoogleGenerativeAI(
+                model=MODEL_NAME,
+                temperature=0,
+                google_api_key=os.getenv("GEMINI_API_KEY")
+            )
+        self.llm = llm
+
+        def build_chain(template: str, output_schema):
+            parser = PydanticOutputParser(pydantic_object=output_schema)  # Aqui é um analisador para saber a estrutura da saida (Mostra pra ia como formatar a resposta)
+            prompt = PromptTemplate(
+                template=template,
+                input_variables=[name for name in ("contract_text", "chunk_number", "chunk_count") if f"{{{name}}}" in template],
+                partial_variables={"format_instructions": parser.get_format_instructions()},  # Usa o parser e faz as pergutnas de acordo com o schema
+            )
+            return prompt | llm | parser  # Cadeia da LangChain, no final o parser "traduzirá a resposta da forma como queremos"
+
+        self.chain = build_chain(PROMPT_TEMPLATE, schemas.ContractData)
+        self.chunk_chain = build_chain(CHUNK_PROMPT_TEMPLATE, schemas.PartialContractData)
+        self.batcher = MicroBatcher(self.chain, LLM_BATCH_MAX_SIZE, LLM_BATCH_MAX_WAIT_MS / 1000)
+
+    def analyze_text(self, document_text: str) -> schemas.ContractData:
+        """
+        Executa a cadeia prompt | llm | parser sobre o texto inteiro do contrato.
+        Com LLM_BATCH_ENABLED, os contratos curtos vão à IA em lotes (ver MicroBatcher).
+        """
+        try:
+            if LLM_BATCH_ENABLED and estimate_tokens(document_text) <= LLM_BATCH_MAX_TOKENS:
+                return self.batcher.submit({"contract_text": document_text})
+            # Executa de fato, de acordo com a ordem da cadeia (com vaga na IA e novas tentativas em erros temporários)
+            result = admission.controller.call_llm(self.chain.invoke, {"contract_text": document_text},
+                                                   config={"callbacks": [metrics.token_usage()]})
+            return result
+        except Exception:
+            logger.exception("Erro ao invocar a cadeia da IA")
+            raise
+
+    async def _analyze_chunks(self, chunks: list[str], concurrency: int) -> list[schemas.PartialContractData]:
+        semaphore = asyncio.Semaphore(concurrency)  # Limita quantas partes estão na IA ao mesmo tempo
+
+        done = 0
+
+        async def analyze(number: int, chunk: str):
+            nonlocal done
+            async with semaphore:
+                result = await admission.controller.acall_llm(
+                    self.chunk_chain.ainvoke,
+                    {"contract_text": chunk, "chunk_number": number, "chunk_count": len(chunks)},
+                    config={"callbacks": [metrics.token_usage()]},
+                )
+            done += 1
+            events.emit("chunk_done", chunk=number, done=done, chunks=len(chunks))
+            return result
+
+        return await asyncio.gather(*(analyze(number, chunk) for number, chunk in enumerate(chunks, start=1)))
+
+    def analyze_chunks(self, pages: list[str], concurrency: int | None = None) -> schemas.ContractData:
+        """
+        Modo map-reduce: divide o contrato em partes, analisa as partes em paralelo e junta os resultados.
+        """
+        chunks = split_into_chunks(pages)
+        logger.info("Contrato longo: análise em partes", extra={"chunks": len(chunks)})
+        events.emit("llm_started", chunks=len(chunks))
+        try:
+            partials = asyncio.run(self._analyze_chunks(chunks, concurrency or LLM_CHUNK_CONCURRENCY))
+        except Exception:
+            logger.exception("Erro ao invocar a cadeia da IA")
+            raise
+        return merge_partial_results(partials)
+
+
+# Analisador compartilhado pelo processo (criado no lifespan da API ou na primeira análise)
+_analyzer: ContractAnalyzer | None = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer() -> ContractAnalyzer:
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = ContractAnalyzer()
+    return _analyzer
+
+
+def set_analyzer(analyzer: ContractAnalyzer | None) -> None:
+    """Troca o analisador compartilhado (usado no lifespan e pelos testes/benchmarks com uma IA falsa)."""
+    global _analyzer
+    with _analyzer_lock:
+        _analyzer = analyzer
+
+
+def warm_up() -> threading.Thread:
+    """
+    Cria o analisador numa thread em segundo plano, para a primeira análise não pagar
+    o custo de importar a LangChain e montar o cliente.
+    """
+    def build():
+        try:
+            get_analyzer()
+            logger.info("Analisador carregado")
+        except Exception:
+            logger.exception("Não foi possível carregar o analisador")
+
+    thread = threading.Thread(target=build, name="analyzer-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _analyzer_for(llm) -> ContractAnalyzer:
+    return ContractAnalyzer(llm) if llm is not None else get_analyzer()
+
+
+def run_analysis_chain(document_text: str, llm=None) -> schemas.ContractData:
+    """
+    Analisa o texto inteiro numa única chamada (com `llm`, usa uma IA específica em vez da compartilhada).
+    """
+    return _analyzer_for(llm).analyze_text(document_text)
+
+
+def merge_partial_results(partials: list[schemas.PartialContractData]) -> schemas.ContractData:
+    """
+    Etapa "reduce": junta os resultados das partes num único ContractData.
+    Partes e valor ficam com a resposta mais frequente; resumos são concatenados sem repetição.
+    """
+    def values(field: str) -> list[str]:
+        return [value.strip() for partial in partials if (value := getattr(partial, field)) and value.strip()]
+
+    def most_common(field: str) -> str | None:
+        found = values(field)
+        return Counter(found).most_common(1)[0][0] if found else None  # Empates ficam com a primeira ocorrência
+
+    def combined(field: str) -> str | None:
+        return "\n".join(dict.fromkeys(values(field))) or None
+
+    return schemas.ContractData(
+        contracting_party=most_common("contracting_party"),
+        contracted_party=most_common("contracted_party"),
+        contract_value=most_common("contract_value"),
+        main_obligations=combined("main_obligations") or "Não identificado",
+        additional_data=combined("additional_data"),
+        termination_clause=combined("termination_clause") or "Não identificado",
     )
 
-    chain = prompt | llm | parser  # Cadeia da LangChain, no final o parser "traduzirá a resposta da forma como queremos"
-    
+
+def run_chunked_analysis(pages: list[str], llm=None, concurrency: int | None = None) -> schemas.ContractData:
+    """
+    Analisa o contrato no modo map-reduce (com `llm`, usa uma IA específica em vez da compartilhada).
+    """
+    return _analyzer_for(llm).analyze_chunks(pages, concurrency=concurrency)
+
+
+def pages_to_text(pages: list[str]) -> str:
+    return "".join(f"{page}\n" for page in pages)
+
+
+def analyze_pages(pages: list[str], llm=None) -> schemas.ContractData:
+    """
+    Escolhe o modo da análise pelo tamanho do documento: uma única chamada ou map-reduce.
+    """
+    document_text = pages_to_text(pages)
+    if estimate_tokens(document_text) <= LLM_CHUNK_THRESHOLD_TOKENS:
+        events.emit("llm_started", chunks=1)
+        return run_analysis_chain(document_text, llm=llm)
+    return run_chunked_analysis(pages, llm=llm)
+
+
+def load_pages(file_path: str, file_hash: str | None = None) -> list[str]:
+    """
+    Texto do arquivo, por página, passando pelo cache "pages" (indexado pelo SHA-256 do arquivo).
+    """
+    file_hash = file_hash or utils.file_sha256(file_path)
+    pages = content_cache.get("pages", file_hash)
+    cached = pages is not None
+    if pages is None:
+        pages = utils.extract_pages_from_file(file_path, file_hash) # Texto do arquivo, por página
+        if any(pages):  # Texto vazio indica falha na extração, não guardamos
+            content_cache.set("pages", file_hash, pages)
+    events.emit("extracted", pages=len(pages), cached=cached)
+    return pages
+
+
+def analyze_contract_with_ai(file_path: str, file_hash: str | None = None,
+                             pages: list[str] | None = None) -> schemas.ContractData:
+    """
+    Carrega um documento, extrai o texto e usa a IA para analisar o conteúdo.
+    As duas etapas passam pelo cache: as páginas são indexadas pelo SHA-256 do arquivo
+    e a análise pelo hash do texto + versão do analisador.
+    `file_hash` pode vir do upload (já calculado durante a gravação) para não reler o arquivo,
+    e `pages` quando o texto já foi extraído (o worker extrai antes para guardá-lo na busca).
+    """
+    if pages is None:
+        pages = load_pages(file_path, file_hash)
+    return analyze_cached(pages)
+
+
+# Análises em andamento neste processo, pela chave do cache: um mesmo texto enviado de novo antes de a
+# primeira análise terminar (clientes que repetem o upload) espera o resultado dela em vez de chamar a IA
+_in_flight: dict[str, Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+def analyze_cached(pages: list[str]) -> schemas.ContractData:
+    """
+    Só a etapa da IA, passando pelo cache "analysis" (hash do texto + versão do analisador).
+    Usada também pela reanálise, que parte do texto já guardado no banco.
+    Um documento sem texto falha aqui, antes de qualquer chamada à IA.
+    """
+    if not any(page.strip() for page in pages):
+        raise EmptyDocumentError("Nenhum texto encontrado no documento (nem pelo OCR).")
+    analysis_key = analysis_cache_key(pages_to_text(pages))
+    cached = content_cache.get("analysis", analysis_key)
+    if cached is None:
+        with _in_flight_lock:
+            future = _in_flight.get(analysis_key)
+            leader = future is None
+            if leader:
+                future = _in_flight[analysis_key] = Future()
+        if not leader:
+            logger.info("Análise idêntica em andamento, aguardando o resultado", extra={"analysis_key": analysis_key[:12]})
+            metrics.LLM_COALESCED.inc()
+            result = future.result()
+            events.emit("analyzed", cached=True)
+            return result.model_copy(deep=True)
+        # Uma análise igual pode ter terminado entre a consulta acima e a reserva da chave
+        cached = content_cache.get("analysis", analysis_key)
+        if cached is not None:
+            future.set_result(schemas.ContractData.model_validate(cached))
+            with _in_flight_lock:
+                del _in_flight[analysis_key]
+    if cached is not None:
+        logger.info("Análise reaproveitada do cache", extra={"analysis_key": analysis_key[:12]})
+        events.emit("analyzed", cached=True)
+        return schemas.ContractData.model_validate(cached)
+
     try:
-        result = chain.invoke({"contract_text": document_text})  # Executa de fato, de acordo com a ordem da cadeia
-        return result
-    except Exception as e:
-        print(f"Erro ao invocar a cadeia da IA: {e}")
-        raise
\ No newline at end of file
+        result = analyze_pages(pages)
+    except BaseException as e:
+        future.set_exception(e)  # Quem estava esperando recebe o mesmo erro
+        raise
+    else:
+        future.set_result(result)
+        try:  # Ainda reservada em _in_flight, para ninguém chamar a IA entre o fim da análise e o cache
+            content_cache.set("analysis", analysis_key, result.model_dump())
+        except Exception:  # A análise deu certo: uma falha do cache não derruba quem a pediu
+            logger.exception("Falha ao guardar a análise no cache", extra={"analysis_key": analysis_key[:12]})
+    finally:
+        with _in_flight_lock:
+            del _in_flight[analysis_key]
+    events.emit("analyzed", cached=False)
+    return result
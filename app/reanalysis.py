@@ -0,0 +1,150 @@
+import argparse
+import json
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import and_, func, or_, select
+from sqlmodel import Session
+
+from . import cache, crud, database, logs, metrics, migrations, models, processing, schemas
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da Reanálise ---
+REANALYSIS_BATCH_SIZE = int(os.getenv("REANALYSIS_BATCH_SIZE", "50"))  # Contratos lidos do banco por vez
+REANALYSIS_CONCURRENCY = int(os.getenv("REANALYSIS_CONCURRENCY", "2"))  # Contratos reanalisados ao mesmo tempo
+
+# Uma vez o texto do prompt e o esquema pedido (as instruções de formato repetem o esquema em JSON)
+PROMPT_OVERHEAD_TOKENS = (processing.estimate_tokens(processing.PROMPT_TEMPLATE)
+                          + processing.estimate_tokens(json.dumps(schemas.ContractData.model_json_schema())))
+
+Contract, ContractText = models.Contract, models.ContractText
+
+
+def _stale(version: str):
+    """Contratos concluídos com outra versão do analisador (ou de antes da versão ser registrada)."""
+    return and_(Contract.status == "completed",
+                or_(Contract.analyzer_version.is_(None), Contract.analyzer_version != version))
+
+
+def stale_batch(engine, version: str, after_id: int = 0, limit: int = REANALYSIS_BATCH_SIZE) -> list:
+    """
+    Próximo lote de contratos desatualizados que têm o texto guardado, em ordem de id (id, tamanho do texto).
+    A paginação é pelo id e o filtro é pela versão: uma execução interrompida recomeça só com o que falta.
+    """
+    statement = (
+        select(Contract.id, func.length(ContractText.text).label("chars"))
+        .join(ContractText, ContractText.contract_id == Contract.id)
+        .where(_stale(version), Contract.id > after_id)
+        .order_by(Contract.id)
+        .limit(limit)
+    )
+    with engine.connect() as connection:
+        return connection.execute(statement).all()
+
+
+def estimate_calls(chars: int) -> tuple[int, int]:
+    """Chamadas à IA e tokens de entrada de um contrato, pelo mesmo critério do analyze_pages."""
+    tokens = chars // processing.CHARS_PER_TOKEN + 1
+    calls = 1 if tokens <= processing.LLM_CHUNK_THRESHOLD_TOKENS else math.ceil(tokens / processing.LLM_CHUNK_MAX_TOKENS)
+    return calls, tokens + calls * PROMPT_OVERHEAD_TOKENS
+
+
+def plan(engine, batch_size: int = REANALYSIS_BATCH_SIZE) -> dict:
+    """
+    Simulação (--dry-run): quantos contratos seriam reanalisados e o custo estimado, sem chamar a IA.
+    É um teto: análises que já estiverem no cache da versão nova não chegam à IA.
+    """
+    version = processing.ANALYZER_VERSION
+    result = {"analyzer_version": version, "stale": 0, "without_text": 0, "llm_calls": 0, "estimated_prompt_tokens": 0}
+    last_id = 0
+    while rows := stale_batch(engine, version, last_id, batch_size):
+        for row in rows:
+            calls, tokens = estimate_calls(row.chars or 0)
+            result["llm_calls"] += calls
+            result["estimated_prompt_tokens"] += tokens
+        result["stale"] += len(rows)
+        last_id = rows[-1].id
+
+    # Contratos analisados antes do texto ser guardado: só um novo upload consegue atualizá-los
+    without_text = (
+        select(func.count()).select_from(Contract)
+        .outerjoin(ContractText, ContractText.contract_id == Contract.id)
+        .where(_stale(version), ContractText.contract_id.is_(None))
+    )
+    with engine.connect() as connection:
+        result["without_text"] = connection.execute(without_text).scalar_one()
+    return result
+
+
+def reanalyze_contract(engine, contract_id: int, version: str) -> bool:
+    """
+    Refaz só a etapa da IA de um contrato a partir do texto guardado e grava o resultado com a versão nova.
+    Uma falha é registrada e mantém os dados anteriores (o contrato continua "completed" e desatualizado).
+    """
+    context = logs.current_contract.set(contract_id)
+    try:
+        with Session(engine) as db:
+            db_text = db.get(ContractText, contract_id)
+            if db_text is None:  # Apagado depois da leitura do lote
+                return False
+            data = processing.analyze_cached([db_text.text])
+            crud.update_contract_with_data(db, contract_id, data, analyzer_version=version)
+        metrics.REANALYSES.labels(outcome="updated").inc()
+        return True
+    except Exception:
+        logger.exception("Falha na reanálise")
+        metrics.REANALYSES.labels(outcome="failed").inc()
+        return False
+    finally:
+        logs.current_contract.reset(context)
+
+
+def run(engine, batch_size: int = REANALYSIS_BATCH_SIZE, concurrency: int = REANALYSIS_CONCURRENCY,
+        limit: int | None = None) -> dict:
+    """
+    Reanalisa os contratos desatualizados em lotes, com até `concurrency` chamadas à IA ao mesmo tempo
+    (além do limite global do admission). Cada contrato é gravado na sua própria transação, então após
+    uma queda basta rodar de novo. `limit` encerra depois de tantos contratos (útil para testar a versão nova).
+    """
+    version = processing.ANALYZER_VERSION
+    result = {"analyzer_version": version, "updated": 0, "failed": 0}
+    last_id = 0
+    logger.info("Reanálise iniciada", extra={"analyzer_version": version})
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="reanalysis") as executor:
+        while limit is None or result["updated"] + result["failed"] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - result["updated"] - result["failed"])
+            rows = stale_batch(engine, version, last_id, size)
+            if not rows:
+                break
+            for updated in executor.map(lambda row: reanalyze_contract(engine, row.id, version), rows):
+                result["updated" if updated else "failed"] += 1
+            last_id = rows[-1].id
+            logger.info("Lote reanalisado", extra={"last_id": last_id, **result})
+    logger.info("Reanálise concluída", extra=result)
+    if result["updated"] and cache.DETAIL_CACHE_BACKEND == "memory":
+        # Este processo não alcança o cache em memória da API: os detalhes antigos valem até o TTL
+        logger.warning("A API pode mostrar os dados anteriores por até DETAIL_CACHE_TTL_SECONDS; "
+                       "use DETAIL_CACHE_BACKEND=sqlite ou chame DELETE /cache/detail",
+                       extra={"ttl_s": cache.DETAIL_CACHE_TTL_SECONDS})
+    return result
+
+
+if __name__ == "__main__":
+    # Depois de mudar o prompt, o esquema ou o modelo: python -m app.reanalysis --dry-run
+    parser = argparse.ArgumentParser(description="Reanálise dos contratos feitos com outra versão do analisador")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra quantos contratos e tokens a reanálise custaria")
+    parser.add_argument("--batch-size", type=int, default=REANALYSIS_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=REANALYSIS_CONCURRENCY)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    logs.setup()
+    models.SQLModel.metadata.create_all(bind=database.engine)
+    migrations.upgrade(database.engine)
+    if args.dry_run:
+        logger.info("Simulação da reanálise", extra=plan(database.engine, args.batch_size))
+    else:
+        run(database.engine, args.batch_size, args.concurrency, args.limit)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict 
-from typing import Optional
+from typing import Any, Optional
 # Aqui dentro do "schemas.py" os esquemas representam os dados que entram e saem da API
 
 
@@ -9,6 +9,12 @@ class UserCreate(BaseModel):
     password: str
 
 
+# Esquema para a troca de senha (a atual confirma que é o próprio usuário)
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
+
 # Esquema para exibir dados de um usuário (sem a senha)
 class UserRead(BaseModel):
     id: int
@@ -32,4 +38,76 @@ class ContractData(BaseModel):
     main_obligations: str = Field(description="Resumo das principais obrigações")
     additional_data: Optional[str] = Field(description="Outros dados importantes (objeto, vigência)")
     termination_clause: str = Field(description="Resumo da cláusula de rescisão")
-    
\ No newline at end of file
+    
+
+# Esquema da consulta de status do processamento de um contrato
+class ContractStatus(BaseModel):
+    id: int
+    filename: str
+    status: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Resultado parcial da IA para um trecho do contrato (no modo em partes tudo pode faltar no trecho)
+class PartialContractData(BaseModel):
+    contracting_party: Optional[str] = Field(default=None, description="O nome ou razão social da parte Contratante")
+    contracted_party: Optional[str] = Field(default=None, description="O nome ou razão social da parte Contratada")
+    contract_value: Optional[str] = Field(default=None, description="O valor monetário total do contrato")
+    main_obligations: Optional[str] = Field(default=None, description="Resumo das principais obrigações presentes no trecho")
+    additional_data: Optional[str] = Field(default=None, description="Outros dados importantes (objeto, vigência)")
+    termination_clause: Optional[str] = Field(default=None, description="Resumo da cláusula de rescisão, se estiver no trecho")
+
+
+
+# Página da listagem de contratos (os itens trazem apenas os campos pedidos em "fields")
+class ContractPage(BaseModel):
+    items: list[dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+# Resultado da busca textual
+class SearchHit(BaseModel):
+    id: int
+    filename: str
+    status: str
+    rank: float  # Relevância (maior = mais relevante; a escala depende do banco)
+    snippet: Optional[str] = None  # Trecho com os termos encontrados entre [colchetes]
+
+
+class SearchResult(BaseModel):
+    items: list[SearchHit]
+    next_offset: Optional[int] = None
+
+
+# Agregação dos contratos (calculada no banco sobre as colunas tipadas)
+class AggregateGroup(BaseModel):
+    key: Optional[str] = None  # CNPJ/nome normalizado da parte, status, mês (AAAA-MM) ou moeda; None = não identificado
+    label: Optional[str] = None  # Nome da parte como aparece num dos contratos (só nos agrupamentos por parte)
+    currency: Optional[str] = None
+    count: int  # Contratos no grupo
+    valued: int  # Quantos deles têm valor identificado
+    total_value: Optional[float] = None  # Soma dos valores na moeda do grupo
+    average_value: Optional[float] = None
+
+
+class AggregateResult(BaseModel):
+    group_by: str
+    groups: list[AggregateGroup]
+
+
+# Resultado de cada arquivo do upload em lote
+class BatchItemResult(BaseModel):
+    filename: str
+    contract_id: Optional[int] = None
+    status: str  # completed, failed, duplicate ou rejected
+    error: Optional[str] = None
+
+
+# Manifesto do upload em lote
+class BatchResult(BaseModel):
+    total: int
+    completed: int
+    failed: int
+    skipped: int  # Duplicados ou formatos não suportados (não geram contrato)
+    items: list[BatchItemResult]
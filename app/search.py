@@ -0,0 +1,207 @@
+import logging
+import os
+import re
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da Busca Textual ---
+SEARCH_PAGE_DEFAULT = int(os.getenv("SEARCH_PAGE_DEFAULT", "20"))  # Resultados por página quando o limit não é informado
+SEARCH_PAGE_MAX = int(os.getenv("SEARCH_PAGE_MAX", "100"))  # Maior limit aceito
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "1000"))  # Resultados ranqueados: além disso, refine a busca
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "portuguese")  # Configuração de texto do Postgres (stemming)
+
+# Bancos com busca textual (nos demais o endpoint responde 501)
+SUPPORTED_DIALECTS = ("sqlite", "postgresql")
+
+# Campos indexados, do mais para o menos relevante (os pesos seguem a mesma ordem)
+INDEXED_FIELDS = ("filename", "contracting_party", "contracted_party", "main_obligations", "termination_clause", "text")
+
+# Documento de busca de cada contrato: campos da IA + texto extraído (que fica em "contracttext")
+SOURCE_VIEW = """
+CREATE VIEW IF NOT EXISTS contract_search_source AS
+SELECT c.id AS id, c.filename AS filename, c.contracting_party AS contracting_party,
+       c.contracted_party AS contracted_party, c.main_obligations AS main_obligations,
+       c.termination_clause AS termination_clause, t.text AS text
+FROM contract c LEFT JOIN contracttext t ON t.contract_id = c.id
+"""
+
+# --- SQLite: FTS5 com conteúdo externo (o índice não guarda uma segunda cópia do texto) ---
+# As entradas são mantidas por triggers: antes de cada mudança a versão antiga é removida do índice
+# (o FTS5 precisa dos valores antigos para isso) e depois a nova é inserida.
+_FTS_COLUMNS = ", ".join(INDEXED_FIELDS)
+_FTS_DELETE = (f"INSERT INTO contract_fts(contract_fts, rowid, {_FTS_COLUMNS}) "
+               f"SELECT 'delete', id, {_FTS_COLUMNS} FROM contract_search_source WHERE id = {{id}};")
+_FTS_INSERT = f"INSERT INTO contract_fts(rowid, {_FTS_COLUMNS}) SELECT id, {_FTS_COLUMNS} FROM contract_search_source WHERE id = {{id}};"
+_CONTRACT_FIELDS = ", ".join(INDEXED_FIELDS[:-1])
+
+SQLITE_TRIGGERS = {
+    "contract_fts_ai": f"AFTER INSERT ON contract BEGIN {_FTS_INSERT.format(id='new.id')} END",
+    "contract_fts_bu": f"BEFORE UPDATE OF {_CONTRACT_FIELDS} ON contract BEGIN {_FTS_DELETE.format(id='old.id')} END",
+    "contract_fts_au": f"AFTER UPDATE OF {_CONTRACT_FIELDS} ON contract BEGIN {_FTS_INSERT.format(id='new.id')} END",
+    "contract_fts_bd": f"BEFORE DELETE ON contract BEGIN {_FTS_DELETE.format(id='old.id')} END",
+    "contracttext_fts_bi": f"BEFORE INSERT ON contracttext BEGIN {_FTS_DELETE.format(id='new.contract_id')} END",
+    "contracttext_fts_ai": f"AFTER INSERT ON contracttext BEGIN {_FTS_INSERT.format(id='new.contract_id')} END",
+    "contracttext_fts_bu": f"BEFORE UPDATE ON contracttext BEGIN {_FTS_DELETE.format(id='old.contract_id')} END",
+    "contracttext_fts_au": f"AFTER UPDATE ON contracttext BEGIN {_FTS_INSERT.format(id='new.contract_id')} END",
+    "contracttext_fts_bd": f"BEFORE DELETE ON contracttext BEGIN {_FTS_DELETE.format(id='old.contract_id')} END",
+    "contracttext_fts_ad": f"AFTER DELETE ON contracttext BEGIN {_FTS_INSERT.format(id='old.contract_id')} END",
+}
+
+SQLITE_SEARCH = """
+SELECT c.id AS id, c.filename AS filename, c.status AS status, -contract_fts.rank AS rank,
+       snippet(contract_fts, -1, '[', ']', '…', 16) AS snippet
+FROM contract_fts JOIN contract c ON c.id = contract_fts.rowid
+WHERE contract_fts MATCH :query {status_filter}
+ORDER BY contract_fts.rank
+LIMIT :limit OFFSET :offset
+"""
+
+# --- Postgres: tsvector com pesos numa tabela própria, índice GIN, mantido por triggers ---
+POSTGRES_SETUP = [
+    SOURCE_VIEW.replace("CREATE VIEW IF NOT EXISTS", "CREATE OR REPLACE VIEW"),
+    "CREATE TABLE IF NOT EXISTS contract_search (contract_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_contract_search_document ON contract_search USING GIN (document)",
+    f"""
+    CREATE OR REPLACE FUNCTION refresh_contract_search(target_id INTEGER) RETURNS VOID AS $$
+    BEGIN
+        DELETE FROM contract_search WHERE contract_id = target_id;
+        INSERT INTO contract_search (contract_id, document)
+        SELECT id,
+               setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(filename, '')), 'A') ||
+               setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(contracting_party, '') || ' ' || coalesce(contracted_party, '')), 'A') ||
+               setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(main_obligations, '') || ' ' || coalesce(termination_clause, '')), 'B') ||
+               setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(text, '')), 'D')
+        FROM contract_search_source WHERE id = target_id;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION contract_search_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_TABLE_NAME = 'contract' THEN
+            PERFORM refresh_contract_search(CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+        ELSE
+            PERFORM refresh_contract_search(CASE WHEN TG_OP = 'DELETE' THEN OLD.contract_id ELSE NEW.contract_id END);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS contract_search_contract ON contract",
+    f"""
+    CREATE TRIGGER contract_search_contract
+    AFTER INSERT OR DELETE OR UPDATE OF {_CONTRACT_FIELDS} ON contract
+    FOR EACH ROW EXECUTE FUNCTION contract_search_trigger()
+    """,
+    "DROP TRIGGER IF EXISTS contract_search_text ON contracttext",
+    """
+    CREATE TRIGGER contract_search_text
+    AFTER INSERT OR UPDATE OR DELETE ON contracttext
+    FOR EACH ROW EXECUTE FUNCTION contract_search_trigger()
+    """,
+]
+
+# O ts_headline é caro, então roda só nas linhas da página (depois do ranking e do LIMIT)
+POSTGRES_SEARCH = f"""
+WITH query AS (SELECT websearch_to_tsquery('{SEARCH_LANGUAGE}', :query) AS q),
+page AS (
+    SELECT s.contract_id, ts_rank_cd(s.document, query.q) AS rank
+    FROM contract_search s
+    CROSS JOIN query
+    JOIN contract c ON c.id = s.contract_id
+    WHERE s.document @@ query.q {{status_filter}}
+    ORDER BY rank DESC, s.contract_id
+    LIMIT :limit OFFSET :offset
+)
+SELECT c.id AS id, c.filename AS filename, c.status AS status, page.rank AS rank,
+       ts_headline('{SEARCH_LANGUAGE}',
+                   coalesce(t.text, concat_ws(' ', c.main_obligations, c.termination_clause), ''), query.q,
+                   'MaxFragments=1, MaxWords=24, MinWords=8, StartSel=[, StopSel=]') AS snippet
+FROM page
+JOIN contract c ON c.id = page.contract_id
+LEFT JOIN contracttext t ON t.contract_id = c.id
+CROSS JOIN query
+ORDER BY page.rank DESC, c.id
+"""
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def setup(engine) -> None:
+    """
+    Cria o índice de busca e os triggers que o mantêm (idempotente, chamado na inicialização).
+    Num banco que já tinha contratos, o índice é preenchido com o que já existe.
+    """
+    with engine.begin() as connection:
+        if engine.dialect.name == "sqlite":
+            connection.exec_driver_sql(SOURCE_VIEW)
+            created = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contract_fts'"
+            ).first() is None
+            connection.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS contract_fts USING fts5({_FTS_COLUMNS}, "
+                "content='contract_search_source', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            for name, body in SQLITE_TRIGGERS.items():
+                connection.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            if created:
+                weights = ", ".join(["4.0", "3.0", "3.0", "2.0", "2.0", "1.0"])
+                connection.exec_driver_sql(f"INSERT INTO contract_fts(contract_fts, rank) VALUES('rank', 'bm25({weights})')")
+                connection.exec_driver_sql("INSERT INTO contract_fts(contract_fts) VALUES('rebuild')")
+        elif engine.dialect.name == "postgresql":
+            created = connection.exec_driver_sql("SELECT to_regclass('contract_search')").scalar() is None
+            for statement in POSTGRES_SETUP:
+                connection.exec_driver_sql(statement)
+            if created:
+                connection.exec_driver_sql("SELECT refresh_contract_search(id) FROM contract")
+        else:
+            logger.warning("Banco sem suporte à busca textual: GET /contracts/search responderá 501",
+                           extra={"dialect": engine.dialect.name})
+
+
+def supported(dialect: str) -> bool:
+    return dialect in SUPPORTED_DIALECTS
+
+
+def sqlite_match_query(query: str) -> str | None:
+    """
+    Converte o texto digitado numa consulta FTS5 segura: cada palavra vira um termo entre aspas
+    (todas precisam aparecer) e a última também casa como prefixo, para a busca enquanto se digita.
+    """
+    terms = TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+async def search_contracts(db: AsyncSession, query: str, limit: int, offset: int = 0,
+                           status: str | None = None) -> list[dict]:
+    """
+    Busca textual ranqueada nos campos da IA e no texto extraído. Retorna até limit + 1 resultados
+    (o extra indica que existe uma próxima página), cada um com um trecho destacando os termos.
+    Quem chama confere antes o banco com `supported`.
+    """
+    dialect = db.bind.dialect.name
+    params = {"limit": limit + 1, "offset": offset}
+    status_filter = ""
+    if status is not None:
+        status_filter = "AND c.status = :status"
+        params["status"] = status
+
+    if dialect == "sqlite":
+        match = sqlite_match_query(query)
+        if match is None:
+            return []
+        statement = SQLITE_SEARCH.format(status_filter=status_filter)
+        params["query"] = match
+    else:
+        statement = POSTGRES_SEARCH.format(status_filter=status_filter)
+        params["query"] = query
+
+    result = await db.exec(text(statement), params=params)
+    return [dict(row) for row in result.mappings().all()]
@@ -0,0 +1,118 @@
+"""
+Perfil de produção: gunicorn com workers do uvicorn. Este módulo é ao mesmo tempo a configuração do gunicorn
+(`gunicorn -c python:app.server app.main:app`) e o ponto de entrada (`python -m app.server`).
+
+- Um worker por CPU disponível (`WEB_CONCURRENCY`), com a aplicação carregada uma única vez no master
+  (preload): as tabelas e as migrações rodam antes do fork, e os workers compartilham a memória dos imports.
+- Cada worker é reciclado depois de `GUNICORN_MAX_REQUESTS` requisições (com jitter, para não reciclarem
+  todos juntos), o que limita o crescimento de memória da LangChain e das bibliotecas de PDF.
+- No SIGTERM (ou na reciclagem) o worker para de aceitar conexões, espera as requisições e as análises em
+  andamento (`WORKER_DRAIN_SECONDS`) e devolve à fila as que não terminarem. Se um worker morrer sem esse
+  encerramento (OOM, SIGKILL, timeout), o master devolve à fila os jobs que estavam com ele.
+"""
+import glob
+import logging
+import os
+import sys
+
+try:
+    from uvicorn_worker import UvicornWorker
+except ImportError:  # Versões do uvicorn que ainda traziam o worker do gunicorn
+    from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    # Respeita a afinidade do processo (taskset/cpuset do contêiner), não só o total da máquina
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# --- Configuração do Servidor ---
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(available_cpus())))  # Workers do gunicorn
+SERVER_BIND = os.getenv("SERVER_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+GUNICORN_MAX_REQUESTS = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))  # Requisições até reciclar o worker (0 = nunca)
+GUNICORN_MAX_REQUESTS_JITTER = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+GUNICORN_TIMEOUT = int(os.getenv("GUNICORN_TIMEOUT", "60"))  # Segundos sem sinal de vida até o master matar o worker
+GUNICORN_KEEPALIVE = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Segundos que as conexões abertas (uploads, streams de eventos) têm para terminar antes de serem encerradas
+HTTP_DRAIN_SECONDS = int(os.getenv("HTTP_DRAIN_SECONDS", "15"))
+
+# Antes de importar a aplicação (o preload acontece depois de ler esta configuração):
+# com vários workers, cada um teria os próprios pools de extração do tamanho da máquina inteira
+_cpus_per_worker = max(1, available_cpus() // WEB_CONCURRENCY)
+os.environ.setdefault("PDF_WORKERS", str(_cpus_per_worker))
+os.environ.setdefault("OCR_WORKERS", str(max(1, _cpus_per_worker // 2)))
+if WEB_CONCURRENCY > 1:
+    # O job de um upload pode ser analisado por outro worker: o progresso passa pela tabela de eventos
+    os.environ.setdefault("EVENTS_RELAY", "database")
+    # E o contrato alterado num worker não pode continuar sendo servido (200/304) pelo cache dos outros
+    os.environ.setdefault("DETAIL_CACHE_BACKEND", "sqlite")
+
+from .worker import WORKER_DRAIN_SECONDS  # noqa: E402 - depois dos valores padrão acima
+
+
+class Worker(UvicornWorker):
+    """Worker do uvicorn que encerra as conexões que não terminarem em HTTP_DRAIN_SECONDS (ex.: SSE)."""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "timeout_graceful_shutdown": HTTP_DRAIN_SECONDS}
+
+
+# --- Configurações lidas pelo gunicorn ---
+bind = SERVER_BIND
+workers = WEB_CONCURRENCY
+worker_class = "app.server.Worker"
+preload_app = True
+max_requests = GUNICORN_MAX_REQUESTS
+max_requests_jitter = GUNICORN_MAX_REQUESTS_JITTER
+timeout = GUNICORN_TIMEOUT
+keepalive = GUNICORN_KEEPALIVE
+# Tempo total do encerramento de um worker: conexões abertas, depois as análises e uma folga
+graceful_timeout = HTTP_DRAIN_SECONDS + int(WORKER_DRAIN_SECONDS) + 10
+
+
+def on_starting(server) -> None:
+    """No master, depois do preload e antes do fork: prepara o banco uma única vez."""
+    from . import database, main, metrics
+
+    if metrics.PROMETHEUS_MULTIPROC_DIR:  # Arquivos de uma execução anterior somariam métricas de processos mortos
+        for path in glob.glob(os.path.join(metrics.PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+    main.prepare_database()
+    database.engine.dispose()  # Os workers abrem as próprias conexões (conexões não sobrevivem ao fork)
+    logger.info("Servidor iniciando", extra={"workers": workers, "max_requests": max_requests,
+                                             "graceful_timeout": graceful_timeout})
+
+
+def child_exit(server, worker) -> None:
+    """
+    No master, quando um worker sai (normalmente ou não). Num encerramento normal os jobs dele já voltaram
+    à fila no lifespan; se ele morreu no meio de análises, elas voltam aqui (ou falham, se já esgotaram
+    WORKER_MAX_ATTEMPTS: o arquivo derruba o worker e não deve continuar ocupando um).
+    """
+    from . import database, metrics
+    from .worker import owner_id, release_jobs
+
+    if metrics.PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+    try:
+        requeued = release_jobs(owner_id(worker.pid), "worker_exit")
+        database.engine.dispose()  # Nenhuma conexão fica aberta no master para ser herdada pelo próximo fork
+    except Exception:
+        logger.exception("Falha ao devolver à fila os jobs do worker", extra={"pid": worker.pid})
+        return
+    if requeued:
+        logger.warning("Jobs de um worker encerrado devolvidos à fila", extra={"pid": worker.pid, "jobs": requeued})
+
+
+if __name__ == "__main__":
+    # python -m app.server [opções extras do gunicorn]
+    from gunicorn.app.wsgiapp import run
+
+    sys.argv = ["gunicorn", "-c", "python:app.server", *sys.argv[1:], "app.main:app"]
+    run()
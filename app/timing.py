@@ -0,0 +1,103 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from . import logs, metrics
+
+# --- Configuração da Medição de Latência ---
+REQUEST_TIMING_SAMPLES = int(os.getenv("REQUEST_TIMING_SAMPLES", "1000"))  # Últimas requisições guardadas por rota
+
+# X-Request-ID aceito do proxy/cliente (senão um novo é gerado); outros valores são descartados
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestTimings:
+    """
+    Latência das últimas requisições de cada rota (janela deslizante), para o /stats.
+    """
+
+    def __init__(self, samples: int = REQUEST_TIMING_SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._durations: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+
+    def record(self, route: str, seconds: float) -> None:
+        with self._lock:
+            durations = self._durations.get(route)
+            if durations is None:
+                durations = self._durations[route] = deque(maxlen=self.samples)
+            durations.append(seconds)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {route: sorted(durations) for route, durations in self._durations.items()}
+            counts = dict(self._counts)
+        return {
+            route: {
+                "count": counts[route],
+                "avg_ms": round(sum(durations) / len(durations) * 1000, 2),
+                "p50_ms": round(durations[len(durations) // 2] * 1000, 2),
+                "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 2),
+            }
+            for route, durations in snapshot.items()
+        }
+
+
+request_timings = RequestTimings()
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI que mede cada requisição: registra a latência por rota (no /stats e nas métricas do
+    Prometheus) e envia o cabeçalho Server-Timing (com o resultado do cache de autenticação, quando houver),
+    visível nas ferramentas do navegador. Também define o id de correlação da requisição, usado nos logs
+    e devolvido no cabeçalho X-Request-ID.
+    """
+
+    def __init__(self, app, timings: RequestTimings = request_timings):
+        self.app = app
+        self.timings = timings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else os.urandom(16).hex()
+        context = logs.request_id.set(request_id)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                route = scope.get("route")  # Preenchido pelo roteador (o scope é o mesmo dicionário)
+                path = route.path if route else "unmatched"
+                self.timings.record(f"{scope['method']} {path}", elapsed)
+                if metrics.METRICS_ENABLED:
+                    metrics.REQUESTS.labels(method=scope["method"], route=path, status=message["status"]).inc()
+                    metrics.REQUEST_SECONDS.labels(method=scope["method"], route=path).observe(elapsed)
+
+                server_timing = [f"app;dur={elapsed * 1000:.2f}"]
+                auth_cache = scope.get("state", {}).get("auth_cache")
+                if auth_cache:
+                    server_timing.append(f'auth;desc="{auth_cache}"')
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", ", ".join(server_timing).encode()),
+                    (b"x-request-id", request_id.encode()),
+                ]
+            await send(message)
+
+        enabled = metrics.METRICS_ENABLED
+        if enabled:
+            metrics.REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if enabled:
+                metrics.REQUESTS_IN_FLIGHT.dec()
+            logs.request_id.reset(context)
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import uuid
+import zipfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from anyio import to_thread
+from fastapi import HTTPException
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from . import utils
+
+# --- Configuração do Upload ---
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))  # Tamanho máximo do arquivo (padrão: 100 MB)
+UPLOAD_FLUSH_BYTES = 1024 * 1024  # Quantidade de dados acumulada antes de cada escrita em disco
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Folga para cabeçalhos e demais campos do formulário
+
+
+@dataclass
+class StoredUpload:
+    filename: str  # Nome original enviado pelo cliente
+    path: str  # Onde o arquivo foi gravado
+    sha256: str  # Hash do conteúdo, calculado durante a gravação
+    size: int
+
+
+class _FileSink:
+    """
+    Destino do arquivo: grava no local final e calcula o hash no mesmo passo, sem cópia intermediária.
+    """
+
+    def __init__(self, filename: str):
+        os.makedirs(utils.UPLOAD_DIR, exist_ok=True)
+        self.filename = filename
+        self.path = os.path.join(utils.UPLOAD_DIR, f"{uuid.uuid4().hex}{os.path.splitext(filename)[1]}")
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, "wb")
+
+    def write_many(self, chunks: list[bytes]) -> None:
+        for chunk in chunks:
+            self._file.write(chunk)
+            self._digest.update(chunk)
+
+    def close(self) -> StoredUpload:
+        self._file.close()
+        return StoredUpload(self.filename, self.path, self._digest.hexdigest(), self.size)
+
+    def discard(self) -> None:
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def receive_upload(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    field_name: str = "file",
+    max_bytes: Optional[int] = None,
+    content_length: Optional[int] = None,
+    before_write: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> StoredUpload:
+    """
+    Lê o corpo multipart em blocos (ex.: `request.stream()`) e grava o campo `field_name`
+    direto no destino final, calculando o SHA-256 e aplicando o limite de tamanho durante a leitura.
+
+    `before_write` é chamado com o nome do arquivo assim que os cabeçalhos da parte chegam,
+    antes de qualquer byte ser gravado (permite recusar duplicados sem gastar disco).
+    """
+    stored = await receive_files(chunks, content_type, field_name, max_files=1, max_bytes=max_bytes,
+                                 content_length=content_length, before_write=before_write)
+    return stored[0]
+
+
+async def receive_files(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    field_name: str = "files",
+    max_files: int = 1,
+    max_bytes: Optional[int] = None,
+    content_length: Optional[int] = None,
+    before_write: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> list[StoredUpload]:
+    """
+    Versão com vários arquivos no mesmo campo (ex.: upload em lote): cada parte é gravada
+    no seu destino final, com o limite de tamanho aplicado por arquivo.
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if content_length is not None and content_length > max_files * (max_bytes + MULTIPART_OVERHEAD_BYTES):
+        raise HTTPException(status_code=413, detail="Arquivo maior que o limite permitido.")
+
+    mimetype, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if mimetype != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="O upload deve ser enviado como multipart/form-data.")
+
+    state = {"headers": {}, "field": b"", "value": b"", "sink": None}
+    sinks: list[_FileSink] = []  # Arquivos abertos, na ordem em que chegaram
+    unchecked: list[_FileSink] = []  # Arquivos que ainda não passaram pelo before_write
+    pending: list[tuple[_FileSink, bytes]] = []  # Dados aguardando escrita (um bloco da rede pode ter partes de dois arquivos)
+    pending_size = 0
+    stored: list[StoredUpload] = []
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        filename = disposition.get(b"filename")
+        if disposition.get(b"name") != field_name.encode() or filename is None:
+            return  # Demais campos do formulário são ignorados
+        if len(sinks) >= max_files:
+            raise HTTPException(status_code=400, detail=f"Envie no máximo {max_files} arquivo(s) por requisição.")
+        state["sink"] = _FileSink(filename.decode("utf-8", errors="replace"))
+        sinks.append(state["sink"])
+        unchecked.append(state["sink"])
+
+    def on_part_data(data, start, end):
+        nonlocal pending_size
+        sink = state["sink"]
+        if sink is None:
+            return
+        sink.size += end - start
+        if sink.size > max_bytes:
+            raise HTTPException(status_code=413, detail="Arquivo maior que o limite permitido.")
+        pending.append((sink, data[start:end]))
+        pending_size += end - start
+
+    def on_part_end():
+        state["sink"] = None
+
+    def write_pending(batch: list[tuple[_FileSink, bytes]]) -> None:
+        for sink, data in batch:
+            sink.write_many([data])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    try:
+        async for chunk in chunks:
+            parser.write(chunk)
+            while unchecked:
+                sink = unchecked.pop(0)
+                if before_write is not None:
+                    await before_write(sink.filename)
+            if pending and (pending_size >= UPLOAD_FLUSH_BYTES or state["sink"] is None):
+                # A escrita em disco roda numa thread para não travar o event loop
+                await to_thread.run_sync(write_pending, pending[:])
+                pending.clear()
+                pending_size = 0
+        parser.finalize()
+
+        if not sinks:
+            raise HTTPException(status_code=400, detail=f"Campo '{field_name}' com o arquivo não encontrado.")
+        if pending:
+            await to_thread.run_sync(write_pending, pending[:])
+        for sink in sinks:
+            stored.append(sink.close())
+        return stored
+    except Exception as e:
+        for sink in sinks[len(stored):]:
+            sink.discard()
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, ValueError):  # Erros de formato do corpo multipart
+            raise HTTPException(status_code=400, detail=f"Upload inválido: {e}")
+        raise
+
+
+def expand_zip(archive: StoredUpload, max_files: int, max_bytes: Optional[int] = None) -> list[StoredUpload]:
+    """
+    Extrai os arquivos de um .zip para a pasta de uploads (um a um, em blocos, com hash e limite de tamanho
+    por arquivo) e apaga o .zip. Pastas e arquivos ocultos do zip são ignorados.
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    extracted: list[_FileSink] = []
+    try:
+        with zipfile.ZipFile(archive.path) as zf:
+            entries = [
+                info for info in zf.infolist()
+                if not info.is_dir() and not os.path.basename(info.filename).startswith((".", "__MACOSX"))
+                and "__MACOSX/" not in info.filename
+            ]
+            if len(entries) > max_files:
+                raise HTTPException(status_code=400, detail=f"Envie no máximo {max_files} arquivo(s) por requisição.")
+            for info in entries:
+                sink = _FileSink(os.path.basename(info.filename))
+                extracted.append(sink)
+                with zf.open(info) as source:
+                    # O tamanho declarado no zip não é confiável (zip bomb), então o limite é conferido na leitura
+                    for block in iter(lambda: source.read(UPLOAD_FLUSH_BYTES), b""):
+                        sink.size += len(block)
+                        if sink.size > max_bytes:
+                            raise HTTPException(status_code=413, detail=f"Arquivo '{sink.filename}' do zip maior que o limite permitido.")
+                        sink.write_many([block])
+        return [sink.close() for sink in extracted]
+    except zipfile.BadZipFile:
+        for sink in extracted:
+            sink.discard()
+        raise HTTPException(status_code=400, detail=f"Arquivo zip inválido: {archive.filename}")
+    except Exception:
+        for sink in extracted:
+            sink.discard()
+        raise
+    finally:
+        os.remove(archive.path)
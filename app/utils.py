@@ -1,34 +1,81 @@
+import hashlib
+import logging
+import mmap
 import os
-from PyPDF2 import PdfReader
-from docx import Document
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+from . import extraction, metrics
+
+logger = logging.getLogger(__name__)
+
+# Pasta onde os uploads ficam guardados até o worker processá-los
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Calcula o SHA-256 do arquivo lendo em blocos (sem carregar o arquivo inteiro na memória)
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def mapped_file(file_path: str) -> Iterator[BinaryIO]:
+    """
+    Abre o arquivo como memória mapeada (somente leitura): as bibliotecas de extração leem
+    direto do cache de páginas do sistema, sem copiar o arquivo inteiro para um buffer.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield f  # Arquivos vazios não podem ser mapeados
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
 
 def extract_text_from_file(file_path: str) -> str:
     ext = os.path.splitext(file_path)[1].lower()
 
     if ext == ".pdf":
-        return extract_text_from_pdf(file_path)
+        with metrics.timed(metrics.EXTRACTION_SECONDS, format="pdf"):
+            return extract_text_from_pdf(file_path)
     elif ext == ".docx":
-        return extract_text_from_docx(file_path)
+        with metrics.timed(metrics.EXTRACTION_SECONDS, format="docx"):
+            return extract_text_from_docx(file_path)
     else:
         raise ValueError(f"Formato de arquivo não suportado: {ext}")
 
+def extract_pages_from_file(file_path: str, file_hash: str | None = None) -> list[str]:
+    """
+    Texto separado por página (o DOCX não tem páginas, então vem em grupos de parágrafos, ver extraction.docx_pages).
+    Permite que as etapas seguintes dividam o documento sem precisar re-separar o texto.
+    `file_hash` é o SHA-256 do arquivo, quando quem chama já o calculou (evita reler o arquivo para o cache do OCR).
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == ".pdf":
+        with metrics.timed(metrics.EXTRACTION_SECONDS, format="pdf"):
+            return extract_pages_from_pdf(file_path, file_hash)
+    elif ext == ".docx":
+        with metrics.timed(metrics.EXTRACTION_SECONDS, format="docx"):
+            return extraction.docx_pages(file_path)
+    else:
+        raise ValueError(f"Formato de arquivo não suportado: {ext}")
+
+def extract_pages_from_pdf(file_path: str, file_hash: str | None = None) -> list[str]:
+    # As páginas são lidas em paralelo (ver extraction.py), cada uma com limite de tempo. Um PDF que não pode
+    # ser lido falha com a causa (extraction.ExtractionError), que o worker grava no job
+    return extraction.extract_pdf_pages(file_path, file_hash=file_hash)
+
 def extract_text_from_pdf(file_path: str) -> str:
-    try:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-            text += "\n"
-        return text
-    except Exception as e:
-        print(f"[Erro PDF] {e}")
-        return ""
+    # Um único join no final, em vez de concatenar o texto página a página
+    return "".join(f"{page}\n" for page in extract_pages_from_pdf(file_path))
 
 def extract_text_from_docx(file_path: str) -> str:
-    try:
-        doc = Document(file_path)
-        text = "\n".join([para.text for para in doc.paragraphs])
-        return text
-    except Exception as e:
-        print(f"[Erro DOCX] {e}")
-        return ""
+    # Leitura em streaming, com tabelas, cabeçalhos e rodapés (ver extraction.docx_pages)
+    return "".join(f"{page}\n" for page in extraction.docx_pages(file_path))
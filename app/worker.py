@@ -0,0 +1,313 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from sqlmodel import Session
+
+from . import blobs, crud, database, events, logs, metrics, migrations, models, processing, schemas, search
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração dos Workers ---
+WORKER_MODE = os.getenv("WORKER_MODE", "inprocess")  # "inprocess" (workers dentro da API) ou "external" (python -m app.worker)
+WORKER_KIND = os.getenv("WORKER_KIND", "thread")  # "thread" ou "process"
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))  # Quantidade de workers consumindo a fila
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))  # Segundos entre verificações da fila quando ociosos
+# Segundos que o encerramento (SIGTERM, reciclagem do gunicorn) espera as análises em andamento terminarem;
+# as que passarem disso voltam para a fila e são retomadas por outro worker
+WORKER_DRAIN_SECONDS = float(os.getenv("WORKER_DRAIN_SECONDS", "30"))
+# Tentativas de um job: o que for interrompido (queda ou encerramento do worker) esse número de vezes vai para "failed"
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+
+
+def owner_id(pid: int | None = None) -> str:
+    """Identifica o processo dono dos jobs em "running" (o master do gunicorn usa o pid do worker que morreu)."""
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def analyze_contract_file(db: Session, contract_id: int, file_path: str, file_hash: str | None = None) -> str | None:
+    """
+    Executa a análise da IA de um arquivo e move o contrato de "processing" para "completed" ou "failed".
+    Retorna a mensagem de erro (ou None em caso de sucesso). O arquivo é removido ao final.
+    """
+    context = events.current_contract.set(contract_id)  # Os eventos e os logs da extração e da IA saem com este contrato
+    logger.info("Iniciando análise")
+    start = time.perf_counter()
+    status = "failed"
+    metrics.ANALYSES_IN_FLIGHT.inc()
+    try:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Arquivo do upload não encontrado em {file_path}")
+
+        # Extrai o texto antes da IA, para guardá-lo junto do contrato (índice da busca textual)
+        pages = processing.load_pages(file_path, file_hash)
+
+        # Chama a função de processamento da IA. E Salva os dados no formato do schemas.ContractData
+        extracted_data: schemas.ContractData = processing.analyze_contract_with_ai(file_path, file_hash=file_hash, pages=pages)
+        logger.info("Análise da IA concluída")
+
+        crud.update_contract_with_data(db, contract_id, extracted_data, text=processing.pages_to_text(pages),
+                                       analyzer_version=processing.ANALYZER_VERSION)
+        events.emit("persisted", status="completed")
+        status = "completed"
+        return None
+    except Exception as e:
+        # o status do contrato é definido como "failed".
+        logger.exception("Falha na análise")
+        db.rollback()
+        crud.update_contract_status(db, contract_id, "failed")
+        error = str(e) or e.__class__.__name__
+        events.emit("failed", status="failed", error=error)
+        return error
+    finally:
+        metrics.ANALYSES_IN_FLIGHT.dec()
+        if metrics.METRICS_ENABLED:
+            metrics.ANALYSIS_SECONDS.labels(status=status).observe(time.perf_counter() - start)
+        # Limpeza
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logger.debug("Arquivo do upload removido", extra={"file": file_path})
+        events.current_contract.reset(context)
+
+
+def restore_upload(db: Session, job: models.Job) -> bool:
+    """
+    Job devolvido à fila (encerramento ou queda de um worker) pode ser retomado noutro contêiner, ou depois de um
+    reinício que limpou a pasta de uploads: o arquivo é recuperado do armazenamento dos originais.
+    Retorna False quando não há o que recuperar.
+    """
+    if os.path.exists(job.file_path):
+        return True
+    db_contract = db.get(models.Contract, job.contract_id)
+    size = blobs.store.size(db_contract.blob_hash) if db_contract and db_contract.blob_hash else None
+    if not size:
+        return False
+    os.makedirs(os.path.dirname(job.file_path) or ".", exist_ok=True)
+    temporary = f"{job.file_path}.restore"
+    with open(temporary, "wb") as file:
+        for block in blobs.store.iter_range(db_contract.blob_hash, 0, size - 1):
+            file.write(block)
+    os.replace(temporary, job.file_path)
+    logger.info("Arquivo do upload recuperado do armazenamento", extra={"contract_id": job.contract_id})
+    return True
+
+
+def process_job(db: Session, job: models.Job) -> str | None:
+    """
+    Processa um job da fila e registra o resultado nele. Retorna a mensagem de erro (ou None em caso de sucesso).
+    """
+    if job.attempts > 1:  # Retomada: o arquivo pode ter ficado no disco de outro processo
+        restore_upload(db, job)
+    error = analyze_contract_file(db, job.contract_id, job.file_path, job.content_hash)
+    crud.finish_job(db, job.id, "failed" if error else "done", error=error)
+    return error
+
+
+def process_next_job(db: Session) -> bool:
+    """
+    Pega e processa um job da fila. Retorna False se a fila estiver vazia.
+    """
+    job = crud.claim_next_job(db)
+    if job is None:
+        return False
+    process_job(db, job)
+    return True
+
+
+def _worker_loop(wakeup, stop, busy, poll_interval: float, owner: str | None = None) -> None:
+    """
+    Laço de um worker: drena a fila e, quando ela esvazia, espera um aviso de novo upload (ou o poll_interval).
+    """
+    while not stop.is_set():
+        with Session(database.engine) as db:
+            job = crud.claim_next_job(db, owner=owner)
+            if job is not None:
+                with busy.get_lock():
+                    busy.value += 1
+                try:
+                    process_job(db, job)
+                finally:
+                    with busy.get_lock():
+                        busy.value -= 1
+                continue
+        wakeup.wait(poll_interval)
+        wakeup.clear()
+
+
+def _process_main(wakeup, stop, busy, poll_interval: float, owner: str | None = None) -> None:
+    # Processos filhos ignoram o Ctrl+C e o SIGTERM, quem decide o encerramento é o processo pai via "stop"
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    _worker_loop(wakeup, stop, busy, poll_interval, owner)
+
+
+class WorkerPool:
+    """
+    Conjunto de workers (threads ou processos) que consomem a fila de jobs do banco.
+    """
+
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, kind: str = WORKER_KIND,
+                 poll_interval: float = WORKER_POLL_INTERVAL):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Tipo de worker não suportado: {kind}")
+        self.concurrency = concurrency
+        self.kind = kind
+        self.poll_interval = poll_interval
+        # "spawn" evita herdar threads e conexões abertas do processo da API
+        ctx = multiprocessing.get_context("spawn")
+        if kind == "process":
+            self._wakeup, self._stop = ctx.Event(), ctx.Event()
+        else:
+            self._wakeup, self._stop = threading.Event(), threading.Event()
+        self._busy = ctx.Value("i", 0)  # Quantidade de workers processando um job neste momento
+        self._ctx = ctx
+        self._workers = []
+        self.owner = owner_id()  # Os jobs deste pool (também os dos processos filhos) ficam no nome deste processo
+
+    def start(self) -> None:
+        for i in range(self.concurrency):
+            args = (self._wakeup, self._stop, self._busy, self.poll_interval, self.owner)
+            if self.kind == "process":
+                worker = self._ctx.Process(target=_process_main, args=args, name=f"contract-worker-{i}", daemon=True)
+            else:
+                worker = threading.Thread(target=_worker_loop, args=args, name=f"contract-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info("Workers iniciados", extra={"workers": self.concurrency, "kind": self.kind})
+
+    def notify(self) -> None:
+        """Acorda os workers ociosos assim que um job entra na fila."""
+        self._wakeup.set()
+
+    def stop(self, timeout: float | None = None) -> int:
+        """
+        Para de pegar jobs e espera os que estão em andamento por até `timeout` segundos (None = sem limite).
+        Os que não terminarem a tempo voltam para a fila (o contrato continua em "processing") e os processos
+        filhos são encerrados; threads ainda ocupadas morrem com o processo. Retorna quantos jobs voltaram.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self.kind == "process":
+            for worker in self._workers:
+                if worker.is_alive():
+                    worker.terminate()
+        # Também os jobs dos lotes (POST /contracts/batch) ainda em andamento neste processo
+        requeued = requeue_owned_jobs(self.owner, timeout)
+        self._workers.clear()
+        logger.info("Workers finalizados")
+        return requeued
+
+    def stats(self) -> dict:
+        busy = self._busy.value
+        return {
+            "kind": self.kind,
+            "workers": self.concurrency,
+            "busy": busy,
+            "utilization": busy / self.concurrency if self.concurrency else 0.0,
+        }
+
+
+def release_jobs(owner: str, reason: str) -> int:
+    """
+    Libera os jobs em "running" de um processo que está saindo ou que morreu: os que já esgotaram
+    WORKER_MAX_ATTEMPTS falham (e o contrato junto), os demais voltam à fila. Retorna quantos voltaram.
+    """
+    with Session(database.engine) as db:
+        failed = crud.fail_exhausted_jobs(db, owner, WORKER_MAX_ATTEMPTS)
+        requeued = crud.requeue_jobs(db, owner)
+    for contract_id in failed:
+        events.publish(contract_id, "failed", status="failed", error="Análise interrompida várias vezes.")
+    if failed:
+        metrics.JOBS_EXHAUSTED.inc(len(failed))
+        logger.error("Jobs que interromperam o worker %s vezes marcados como falha", WORKER_MAX_ATTEMPTS,
+                     extra={"contracts": failed, "owner": owner})
+    if requeued:
+        metrics.JOBS_REQUEUED.labels(reason=reason).inc(requeued)
+    return requeued
+
+
+def requeue_owned_jobs(owner: str | None = None, timeout: float | None = None) -> int:
+    """Devolve à fila os jobs que ainda estão em "running" em nome deste processo. Retorna quantos voltaram."""
+    requeued = release_jobs(owner or owner_id(), "shutdown")
+    if requeued:
+        logger.warning("Análises em andamento devolvidas à fila", extra={"jobs": requeued, "timeout": timeout})
+    return requeued
+
+
+# Pool dos workers rodando dentro da API (None quando WORKER_MODE="external")
+pool: WorkerPool | None = None
+
+
+def start_pool() -> WorkerPool:
+    global pool
+    pool = WorkerPool()
+    pool.start()
+    return pool
+
+
+def stop_pool(timeout: float | None = WORKER_DRAIN_SECONDS) -> None:
+    global pool
+    if pool is not None:
+        pool.stop(timeout)
+        pool = None
+    else:
+        requeue_owned_jobs()  # Sem workers locais, só os lotes que não terminaram
+
+
+def notify() -> None:
+    """Avisa o pool local que há job novo (workers externos descobrem pelo poll_interval)."""
+    if pool is not None:
+        pool.notify()
+
+
+def get_stats(db: Session) -> dict:
+    """
+    Tamanho da fila (lido do banco, vale para qualquer modo) e uso dos workers locais
+    """
+    return queue_stats(crud.count_jobs_by_status(db))
+
+
+def queue_stats(jobs: dict[str, int]) -> dict:
+    """
+    Monta as estatísticas a partir da contagem de jobs por status (compartilhado com o endpoint assíncrono)
+    """
+    return {
+        "mode": WORKER_MODE,
+        "queued": jobs.get("queued", 0),
+        "running": jobs.get("running", 0),
+        "done": jobs.get("done", 0),
+        "failed": jobs.get("failed", 0),
+        "pool": pool.stats() if pool is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    # Execução separada da API: python -m app.worker --concurrency 4 --kind process
+    parser = argparse.ArgumentParser(description="Workers de análise de contratos")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--kind", choices=["thread", "process"], default=WORKER_KIND)
+    parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    logs.setup()
+    if events.EVENTS_RELAY == "auto":
+        events.EVENTS_RELAY = "database"  # Fora da API, os eventos de progresso só chegam aos clientes pela tabela
+    models.SQLModel.metadata.create_all(bind=database.engine)  # Garante as tabelas caso o worker suba antes da API
+    migrations.upgrade(database.engine)
+    search.setup(database.engine)
+    pool = WorkerPool(concurrency=args.concurrency, kind=args.kind, poll_interval=args.poll_interval)
+    pool.start()
+
+    finished = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: finished.set())
+    signal.signal(signal.SIGINT, lambda *_: finished.set())
+    finished.wait()
+    stop_pool()
@@ -0,0 +1,140 @@
+"""
+Perguntas analíticas ("contratos acima de R$ 1 milhão por contratada", "valor por mês") num corpus sintético
+(padrão: 100 mil contratos): agregação em SQL sobre as colunas tipadas comparada ao jeito anterior, que
+carregava todos os contratos e interpretava o texto de `contract_value` em Python. Mede também quanto
+a migração leva para preencher as colunas de um banco que já existia.
+
+Uso: python -m benchmarks.bench_aggregate [--contracts 100000] [--repeat 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud_async, database, migrations, models, normalization
+
+PARTIES = ["Alfa Serviços SA", "Beta Engenharia Ltda", "Gama Tecnologia S/A", "Delta Limpeza Ltda.",
+           "Ômega Construções SA", "Sigma Consultoria Ltda", "Zeta Transportes SA", "Kappa Energia S.A."]
+VALUE_FORMATS = ["R$ {br}", "R$ {br} ({words})", "Valor global de R$ {br}, pago em 12 parcelas", "{mil} mil reais"]
+
+QUESTIONS = {
+    "acima de R$ 1 mi por contratada": {"group_by": "contracted_party", "currency": "BRL", "min_cents": 100_000_000},
+    "valor por mês de início": {"group_by": "month", "currency": "BRL"},
+    "contagem por status": {"group_by": "status"},
+}
+
+
+def brazilian(value: int) -> str:
+    return f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def synthetic_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        value = rng.choice([rng.randrange(5_000, 200_000), rng.randrange(200_000, 5_000_000)])
+        value_text = rng.choice(VALUE_FORMATS).format(br=brazilian(value), words="valor por extenso", mil=value // 1000)
+        start = f"{rng.randrange(1, 29):02d}/{rng.randrange(1, 13):02d}/{rng.randrange(2019, 2025)}"
+        status = "completed" if rng.random() < 0.95 else "failed"
+        yield (i, f"contrato_{i}.pdf", status, "Prefeitura Municipal", rng.choice(PARTIES), value_text,
+               "Prestação de serviços.", f"Vigência de 12 meses a partir de {start}", "Não identificada")
+
+
+def ingest(engine, count: int, batch_size: int = 5000) -> None:
+    """Insere os contratos como estavam antes da normalização (só os campos em texto)."""
+    rows = synthetic_rows(count)
+    with engine.begin() as connection:
+        raw = connection.connection.driver_connection
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            raw.executemany(
+                "INSERT INTO contract (id, filename, status, contracting_party, contracted_party, contract_value, "
+                "main_obligations, additional_data, termination_clause) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+
+async def aggregate_in_python(db: AsyncSession, group_by: str, currency: str | None = None,
+                              min_cents: int | None = None) -> list[dict]:
+    """O jeito anterior: carregar todos os contratos e interpretar os textos a cada pergunta."""
+    contracts = (await db.exec(select(models.Contract))).all()
+    groups: dict[tuple, dict] = {}
+    for contract in contracts:
+        cents, contract_currency = normalization.parse_amount(contract.contract_value)
+        if (currency and contract_currency != currency) or (min_cents and (cents or 0) < min_cents):
+            continue
+        if group_by == "contracted_party":
+            key = normalization.party_key(contract.contracted_party)
+        elif group_by == "month":
+            start, _ = normalization.parse_dates(contract.additional_data)
+            key = start.strftime("%Y-%m") if start else None
+        else:
+            key = contract.status
+        group = groups.setdefault((key, contract_currency), {"count": 0, "total_cents": 0})
+        group["count"] += 1
+        group["total_cents"] += cents or 0
+    return [{"key": key, "currency": cur, **values} for (key, cur), values in groups.items()]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def measure(factory, repeat: int) -> list[dict]:
+    results = []
+    async with factory() as db:
+        for name, params in QUESTIONS.items():
+            for method, runs in (("SQL (colunas tipadas)", repeat), ("Python (texto)", max(2, repeat // 5))):
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    if method.startswith("SQL"):
+                        rows = await crud_async.aggregate_contracts(db, limit=1000, **params)
+                    else:
+                        rows = await aggregate_in_python(db, **params)
+                    timings.append(time.perf_counter() - start)
+                    db.expunge_all()
+                results.append({"question": name, "method": method, "groups": len(rows),
+                                "p50_ms": percentile(timings, 0.5) * 1000})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contracts", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        url = f"sqlite:///{os.path.join(workdir, 'aggregate.db')}"
+        engine = create_engine(url, **database.engine_options(url))
+        database.apply_sqlite_pragmas(engine)
+        SQLModel.metadata.create_all(engine, tables=[models.Contract.__table__])
+        ingest(engine, args.contracts)
+
+        start = time.perf_counter()
+        migrations.upgrade(engine)
+        seconds = time.perf_counter() - start
+        print(f"Migração (preenchimento das colunas tipadas): {args.contracts} contratos em {seconds:.1f}s "
+              f"({args.contracts / seconds:.0f}/s)")
+
+        async_engine = create_async_engine(database.async_url(url), **database.engine_options(url))
+        database.apply_sqlite_pragmas(async_engine)
+        factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+        results = asyncio.run(measure(factory, args.repeat))
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+
+    print(f"{'pergunta':>32} {'método':>22} {'grupos':>7} {'p50 (ms)':>10}")
+    for r in results:
+        print(f"{r['question']:>32} {r['method']:>22} {r['groups']:>7} {r['p50_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Mede o custo de subir a API e o custo fixo de cada análise:
+- importação de app.main (a LangChain só é carregada ao criar o analisador) vs. importação + analisador pronto;
+- montar cliente do Gemini + parser + prompt a cada chamada (como era antes) vs. reaproveitar o ContractAnalyzer.
+
+A IA é substituída pela FakeContractLLM (sem rede), então o tempo medido é só o overhead local.
+
+Uso: python -m benchmarks.bench_analyzer [--calls 50]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from .fake_llm import FakeContractLLM
+
+TEXT = "CLÁUSULA 1 - DO OBJETO. Prestação de serviços de manutenção. CLÁUSULA 2 - DO VALOR. R$ 10.000,00."
+
+
+def _time_subprocess(code: str, repeat: int = 3) -> float:
+    env = {**os.environ, "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "benchmark")}
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def startup() -> dict:
+    return {
+        "import_app_s": _time_subprocess("import app.main"),
+        "import_app_and_build_analyzer_s": _time_subprocess("import app.main; app.main.processing.get_analyzer()"),
+    }
+
+
+def per_call(calls: int) -> dict:
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")  # O cliente é criado sem chamar a rede
+    from app import processing
+
+    processing.ContractAnalyzer()  # Descarta o custo de importação da primeira criação
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        processing.ContractAnalyzer()  # Cliente do Gemini + parsers + prompts, como a cada chamada antes
+    rebuild_build = (time.perf_counter() - start) / calls
+
+    llm = FakeContractLLM()
+    start = time.perf_counter()
+    for _ in range(calls):
+        processing.ContractAnalyzer(llm).analyze_text(TEXT)  # Parser/prompt/cadeia remontados a cada chamada
+    rebuild_invoke = (time.perf_counter() - start) / calls
+
+    analyzer = processing.ContractAnalyzer(llm)
+    start = time.perf_counter()
+    for _ in range(calls):
+        analyzer.analyze_text(TEXT)
+    reuse_invoke = (time.perf_counter() - start) / calls
+
+    return {
+        "build_gemini_client_parser_prompt_ms": round(rebuild_build * 1000, 3),
+        "invoke_with_rebuilt_chain_ms": round(rebuild_invoke * 1000, 3),
+        "invoke_with_reused_chain_ms": round(reuse_invoke * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, value in {**startup(), **per_call(args.calls)}.items():
+        print(f"{name:>38}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Requisições por segundo do detalhe dos contratos (GET /contracts/{contract_name}) com o cache de
+detalhes ligado e desligado, alternando as rodadas para diluir o ruído.
+
+Usa o mesmo banco e a mesma carga do bench_read_endpoints (SQLite temporário em WAL, requisições em
+processo via ASGITransport, autenticação JWT). Cada rodada com o cache começa com ele vazio, então a
+taxa de acertos inclui a primeira leitura de cada contrato.
+
+Uso: python -m benchmarks.bench_detail_cache [--requests 2000] [--concurrency 50] [--contracts 1000] [--rounds 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import auth, cache, database
+from app.main import app
+
+from .bench_read_endpoints import load, seed
+
+
+async def run(args) -> dict:
+    url = f"sqlite:///{os.path.join(args.workdir, 'bench.db')}"
+    engine = create_engine(url, **database.engine_options(url))
+    async_engine = create_async_engine(database.async_url(url), **database.engine_options(url))
+    database.apply_sqlite_pragmas(engine)
+    database.apply_sqlite_pragmas(async_engine)
+    seed(engine, args.contracts)
+
+    factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    app.dependency_overrides[database.get_async_session_factory] = lambda: factory
+
+    token = auth.create_access_token({"sub": "bench"})
+    # Um conjunto de contratos "populares" lido várias vezes, como as telas que reabrem o mesmo contrato
+    step = max(1, args.contracts // 100)
+    paths = [f"/contracts/contrato_{i}.pdf" for i in range(0, args.contracts, step)]
+    original = cache.detail_cache
+    rps, hit_rates = {True: [], False: []}, []
+    try:
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                cache.detail_cache = cache.DetailCache(cache.MemoryCache(cache.DETAIL_CACHE_MAX_ENTRIES, 0) if enabled else None)
+                rps[enabled].append(await load(app, paths, args.requests, args.concurrency, token))
+                if enabled:
+                    hit_rates.append(cache.detail_cache.stats()["hit_rate"])
+    finally:
+        cache.detail_cache = original
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        engine.dispose()
+    off, on = statistics.median(rps[False]), statistics.median(rps[True])
+    return {"off_rps": round(off, 1), "on_rps": round(on, 1), "speedup": round(on / off, 2),
+            "hit_rate": round(statistics.median(hit_rates), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--contracts", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    if not auth.SECRET_KEY:
+        auth.SECRET_KEY = "benchmark-key"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        result = asyncio.run(run(args))
+
+    print(f"{'sem cache':>10} {'com cache':>10} {'ganho':>7} {'acertos':>8}")
+    print(f"{result['off_rps']:>10} {result['on_rps']:>10} {result['speedup']:>6}x {result['hit_rate']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
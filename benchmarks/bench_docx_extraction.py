@@ -0,0 +1,76 @@
+"""
+Pico de memória (RSS) e tempo da extração de DOCX: a leitura em streaming do extraction.iter_docx_text
+(usada pelo utils.extract_pages_from_file, que agrupa os blocos em páginas) contra a versão anterior (DOM inteiro do python-docx, só parágrafos).
+
+Cada medição roda num processo novo, para o pico de RSS de uma não contaminar a outra. Os DOCX são
+gerados pelo benchmarks.synthetic com `--paragraphs` cláusulas (uma rodada por tamanho) e uma tabela
+de preços com um décimo desse número de linhas.
+
+Uso: python -m benchmarks.bench_docx_extraction [--paragraphs 10000,50000,200000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from . import synthetic
+
+
+def legacy_extract(file_path: str) -> str:
+    """Réplica da extração anterior: python-docx, apenas os parágrafos do corpo."""
+    from docx import Document
+
+    return "\n".join([para.text for para in Document(file_path).paragraphs])
+
+
+def measure(kind: str, file_path: str) -> dict:
+    """Roda no processo filho: pico de RSS (acima do processo já com os imports) e tempo de uma extração."""
+    from app import utils
+
+    extract = legacy_extract if kind == "python-docx" else utils.extract_pages_from_file
+    import docx  # noqa: F401 - os dois lados com os mesmos módulos carregados antes da medição
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    text = extract(file_path)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    chars = len(text) if isinstance(text, str) else len("\n".join(text))  # As páginas do DOCX, como no pipeline
+    return {"seconds": seconds, "peak_mb": (peak - base) / 1024, "chars": chars}
+
+
+def run(sizes: list[int], workdir: str) -> list[dict]:
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for paragraphs in sizes:
+        path = os.path.join(workdir, f"contrato_{paragraphs}.docx")
+        with open(path, "wb") as file:
+            file.write(synthetic.build_docx(paragraphs=paragraphs, table_rows=paragraphs // 10,
+                                            header="CONTRATO CONFIDENCIAL", footer="Página de assinaturas"))
+        row = {"paragraphs": paragraphs, "file_mb": os.path.getsize(path) / 1e6}
+        for kind in ("python-docx", "streaming"):
+            with context.Pool(1) as pool:
+                row[kind] = pool.apply(measure, (kind, path))
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paragraphs", default="10000,50000,200000")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run([int(size) for size in args.paragraphs.split(",")], workdir)
+
+    print(f"{'parágrafos':>10} {'arquivo':>8} {'python-docx':>20} {'streaming':>20} {'caracteres':>21}")
+    for r in results:
+        old, new = r["python-docx"], r["streaming"]
+        print(f"{r['paragraphs']:>10} {r['file_mb']:>6.2f}MB "
+              f"{old['seconds']:>8.2f}s {old['peak_mb']:>8.1f}MB {new['seconds']:>8.2f}s {new['peak_mb']:>8.1f}MB "
+              f"{old['chars']:>10} {new['chars']:>10}")
+
+
+if __name__ == "__main__":
+    main()
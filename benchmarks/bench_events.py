@@ -0,0 +1,63 @@
+"""
+Repasse dos eventos de progresso para muitos assinantes no mesmo processo: N clientes acompanhando
+contratos num único event loop, com os eventos publicados de outra thread (como fazem os workers).
+Mede a latência da publicação até cada cliente receber o evento.
+
+Uso: python -m benchmarks.bench_events [--subscribers 100 1000 10000] [--contracts 10] [--events 20]
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from app import events
+
+
+async def run(subscribers: int, contracts: int, count: int) -> dict:
+    broker = events.EventBroker(queue_size=count + 1)
+    subscriptions = [broker.subscribe(n % contracts) for n in range(subscribers)]
+    latencies: list[float] = []
+
+    async def client(subscription):
+        for _ in range(count):
+            event = await subscription.get()
+            latencies.append(time.perf_counter() - event["sent"])
+
+    def worker():  # Publica de outra thread, como os workers da análise
+        for number in range(count):
+            for contract_id in range(contracts):
+                broker.publish({"contract_id": contract_id, "stage": "chunk_done", "chunk": number, "sent": time.perf_counter()})
+            time.sleep(0.01)
+
+    start = time.perf_counter()
+    publisher = threading.Thread(target=worker)
+    publisher.start()
+    await asyncio.gather(*(client(subscription) for subscription in subscriptions))
+    elapsed = time.perf_counter() - start
+    publisher.join()
+
+    latencies.sort()
+    return {
+        "subscribers": subscribers,
+        "delivered": len(latencies),
+        "deliveries_s": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--contracts", type=int, default=10)
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'assinantes':>10} {'entregas':>9} {'entregas/s':>11} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for subscribers in args.subscribers:
+        r = asyncio.run(run(subscribers, args.contracts, args.events))
+        print(f"{r['subscribers']:>10} {r['delivered']:>9} {r['deliveries_s']:>11.0f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
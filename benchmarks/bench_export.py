@@ -0,0 +1,155 @@
+"""
+Linhas por segundo e pico de memória (RSS) da exportação dos contratos: `GET /contracts/export` em cada
+formato contra o caminho anterior (`GET /contracts/list/filenames` e um `GET /contracts/{contract_name}`
+por arquivo, com a autenticação repetida em cada requisição).
+
+O banco é um SQLite temporário com `--contracts` contratos analisados. Cada medição roda num processo
+novo, para o pico de RSS de uma não contaminar a outra, e chama a aplicação ASGI direto, descartando o
+corpo à medida que chega (o ASGITransport do httpx juntaria a resposta inteira na memória). O caminho
+anterior é medido numa amostra de `--legacy-sample` contratos e a taxa é extrapolada.
+
+Uso: python -m benchmarks.bench_export [--contracts 100000] [--legacy-sample 2000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import models
+
+
+def seed(url: str, contracts: int) -> None:
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(models.User(username="bench", hashed_password="x"))
+        db.commit()
+    rows = [
+        {"filename": f"contrato_{i}.pdf", "status": "completed", "contracting_party": f"Empresa {i % 500} SA",
+         "contracted_party": "Fornecedor Ltda", "contract_value": "R$ 150.000,00", "value_cents": 15_000_000,
+         "currency": "BRL", "main_obligations": "Prestação de serviços de manutenção preventiva e corretiva.",
+         "termination_clause": "Multa de 10% sobre o valor restante.", "analyzer_version": "bench"}
+        for i in range(contracts)
+    ]
+    with engine.begin() as connection:
+        for start in range(0, len(rows), 10_000):
+            connection.execute(insert(models.Contract), rows[start:start + 10_000])
+    engine.dispose()
+
+
+async def get(app, path: str, token: str) -> tuple[int, int]:
+    """
+    Uma requisição direto na aplicação ASGI; retorna (status, bytes do corpo) sem guardar o corpo.
+    spec_version 2.4: o StreamingResponse não fica escutando a desconexão do cliente.
+    """
+    target, _, query = path.partition("?")
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": target, "raw_path": target.encode(), "query_string": query.encode(), "root_path": "",
+             "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+             "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+    result = {"status": 0, "bytes": 0}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            result["bytes"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return result["status"], result["bytes"]
+
+
+def current_rss_kb() -> int:
+    """RSS atual (o ru_maxrss guarda o pico dos imports, que pode ser maior que o da exportação)."""
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def measure(kind: str, url: str, contracts: int, legacy_sample: int) -> dict:
+    """Roda no processo filho: tempo, linhas/s e pico de RSS (acima do RSS do processo já aquecido)."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from app import auth, database
+    from app.main import app
+
+    if not auth.SECRET_KEY:
+        auth.SECRET_KEY = "benchmark-key"
+    if kind == "parquet":
+        import pyarrow.parquet  # noqa: F401 - carregado antes da medição, como os demais módulos
+    async_engine = create_async_engine(database.async_url(url))
+    factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    app.dependency_overrides[database.get_async_session_factory] = lambda: factory
+    token = auth.create_access_token({"sub": "bench"})
+
+    async def exported() -> tuple[int, int]:
+        status, size = await get(app, f"/contracts/export?format={kind}", token)
+        assert status == 200, status
+        return contracts, size
+
+    async def legacy() -> tuple[int, int]:
+        status, size = await get(app, "/contracts/list/filenames", token)
+        assert status == 200, status
+        for i in range(legacy_sample):
+            status, body = await get(app, f"/contracts/contrato_{i}.pdf", token)
+            assert status == 200, status
+            size += body
+        return legacy_sample, size
+
+    async def main():
+        await get(app, "/contracts/0/status", token)  # Aquecimento (rotas, conexões, token)
+        base = current_rss_kb()
+        start = time.perf_counter()
+        rows, size = await (legacy() if kind == "legacy" else exported())
+        seconds = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        await async_engine.dispose()
+        return {"rows": rows, "seconds": seconds, "rows_s": rows / seconds,
+                "peak_mb": (peak - base) / 1024, "body_mb": size / 1e6}
+
+    return asyncio.run(main())
+
+
+def run(contracts: int, legacy_sample: int, workdir: str) -> list[dict]:
+    from app import export
+
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    context = multiprocessing.get_context("spawn")
+    # Num processo à parte: o ru_maxrss passa do pai para os filhos, então o pico do seed apareceria nas medições
+    with context.Pool(1) as pool:
+        pool.apply(seed, (url, contracts))
+    kinds = ["legacy", "ndjson", "csv"] + (["parquet"] if export.parquet_available() else [])
+    results = []
+    for kind in kinds:
+        with context.Pool(1) as pool:
+            results.append({"kind": kind, **pool.apply(measure, (kind, url, contracts, legacy_sample))})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contracts", type=int, default=100_000)
+    parser.add_argument("--legacy-sample", type=int, default=2000, help="Contratos lidos um a um no caminho anterior")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.contracts, min(args.legacy_sample, args.contracts), workdir)
+
+    print(f"{'caminho':>8} {'linhas':>8} {'tempo':>9} {'linhas/s':>10} {'pico RSS':>10} {'corpo':>10} {'estimado p/ todos':>18}")
+    for r in results:
+        total = args.contracts / r["rows_s"]
+        print(f"{r['kind']:>8} {r['rows']:>8} {r['seconds']:>8.2f}s {r['rows_s']:>10.0f} "
+              f"{r['peak_mb']:>8.1f}MB {r['body_mb']:>8.1f}MB {total:>17.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Vazão do login (bcrypt) conforme a concorrência, com o hash no threadpool da API (PASSWORD_HASH_WORKERS=0,
+como era antes) e no pool de processos dedicado. Durante cada rodada, um cliente à parte chama `GET /`
+sem parar, para medir quanto o bcrypt atrasa as outras rotas.
+
+Uso: python -m benchmarks.bench_login [--concurrency 1 8 32] [--logins 64] [--workers 2] [--rounds 12]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import auth, database, models
+from app.main import app
+
+PASSWORD = "senha-de-teste"
+
+
+async def probe_latencies(client: httpx.AsyncClient, stop: asyncio.Event) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def burst(client: httpx.AsyncClient, logins: int, concurrency: int) -> tuple[float, int, float]:
+    """Faz `logins` logins com `concurrency` clientes. Retorna (logins/s, quantos 503, p95 do GET / em ms)."""
+    counter = iter(range(logins))
+    rejected = 0
+
+    async def user():
+        nonlocal rejected
+        for _ in counter:
+            response = await client.post("/login", data={"username": "bench", "password": PASSWORD})
+            if response.status_code == 503:
+                rejected += 1
+            else:
+                response.raise_for_status()
+
+    stop = asyncio.Event()
+    probe = asyncio.ensure_future(probe_latencies(client, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    latencies = sorted(await probe)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0
+    return (logins - rejected) / elapsed, rejected, p95
+
+
+async def run(args) -> list[dict]:
+    db_path = os.path.join(args.workdir, "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(models.User(username="bench", hashed_password=auth.get_password_hash(PASSWORD)))
+        db.commit()
+    async_engine = create_async_engine(database.async_url(f"sqlite:///{db_path}"))
+    factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    app.dependency_overrides[database.get_async_session_factory] = lambda: factory
+
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for label, workers in (("threadpool (antes)", 0), (f"{args.workers} processos", args.workers)):
+                auth.password_hasher = auth.PasswordHasher(workers=workers, max_queue=args.queue)
+                auth.password_hasher.start()
+                await client.post("/login", data={"username": "bench", "password": PASSWORD})  # Aquecimento
+                for concurrency in args.concurrency:
+                    rate, rejected, p95 = await burst(client, args.logins, concurrency)
+                    results.append({"mode": label, "concurrency": concurrency, "logins_s": round(rate, 1),
+                                    "rejected": rejected, "root_p95_ms": round(p95, 1)})
+                auth.password_hasher.shutdown()
+    finally:
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=auth.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+    if not auth.SECRET_KEY:
+        auth.SECRET_KEY = "benchmark-key"
+    # Os processos do pool leem o custo do ambiente; o processo atual usa o contexto abaixo
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    auth.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=args.rounds)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        results = asyncio.run(run(args))
+
+    print(f"{'modo':>20} {'concorrência':>13} {'logins/s':>9} {'503':>5} {'GET / p95 (ms)':>15}")
+    for r in results:
+        print(f"{r['mode']:>20} {r['concurrency']:>13} {r['logins_s']:>9} {r['rejected']:>5} {r['root_p95_ms']:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Custo da instrumentação (métricas do Prometheus, X-Request-ID e timers do crud) nos endpoints de leitura:
+a mesma API com METRICS_ENABLED ligado e desligado, alternando as rodadas para diluir o ruído.
+
+Usa o mesmo banco e a mesma carga do bench_read_endpoints (SQLite temporário em WAL, requisições em
+processo via ASGITransport, autenticação JWT).
+
+Uso: python -m benchmarks.bench_metrics [--requests 2000] [--concurrency 50] [--rounds 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import auth, database, metrics
+from app.main import app
+
+from .bench_read_endpoints import load, seed
+
+
+async def run(args) -> list[dict]:
+    url = f"sqlite:///{os.path.join(args.workdir, 'bench.db')}"
+    engine = create_engine(url, **database.engine_options(url))
+    async_engine = create_async_engine(database.async_url(url), **database.engine_options(url))
+    database.apply_sqlite_pragmas(engine)
+    database.apply_sqlite_pragmas(async_engine)
+    seed(engine, args.contracts)
+
+    factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    app.dependency_overrides[database.get_async_session_factory] = lambda: factory
+
+    token = auth.create_access_token({"sub": "bench"})
+    step = max(1, args.contracts // 100)
+    endpoints = {
+        "detail": [f"/contracts/contrato_{i}.pdf" for i in range(0, args.contracts, step)],
+        "status": [f"/contracts/{i}/status" for i in range(1, args.contracts + 1, step)],
+        "list": ["/contracts?limit=50"],
+    }
+    results = []
+    try:
+        for name, paths in endpoints.items():
+            rps = {True: [], False: []}
+            for _ in range(args.rounds):
+                for enabled in (False, True):
+                    metrics.METRICS_ENABLED = enabled
+                    rps[enabled].append(await load(app, paths, args.requests, args.concurrency, token))
+            off, on = statistics.median(rps[False]), statistics.median(rps[True])
+            results.append({"endpoint": name, "off_rps": round(off, 1), "on_rps": round(on, 1),
+                            "overhead_pct": round((off - on) / off * 100, 2)})
+    finally:
+        metrics.METRICS_ENABLED = True
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--contracts", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    if not auth.SECRET_KEY:
+        auth.SECRET_KEY = "benchmark-key"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        results = asyncio.run(run(args))
+
+    print(f"{'endpoint':>10} {'sem métricas':>13} {'com métricas':>13} {'custo':>8}")
+    for r in results:
+        print(f"{r['endpoint']:>10} {r['off_rps']:>13} {r['on_rps']:>13} {r['overhead_pct']:>7}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Requisições por segundo dos endpoints de leitura, antes (handlers "def" com Session síncrona,
+rodando no threadpool) e depois (handlers "async def" com o engine assíncrono e o crud_async).
+
+Os dois lados usam o mesmo banco (por padrão um SQLite temporário em WAL; `--database-url` aceita um
+Postgres vazio) com `--contracts` contratos e passam pela autenticação JWT. As requisições são feitas
+em processo, via ASGITransport, com `--concurrency` clientes simultâneos.
+
+Uso: python -m benchmarks.bench_read_endpoints [--requests 2000] [--concurrency 50] [--database-url URL]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import auth, crud, database, models
+from app.main import app as async_app
+
+
+def build_legacy_app(engine) -> FastAPI:
+    """Réplica dos endpoints de leitura como eram antes da camada assíncrona."""
+    legacy = FastAPI()
+    oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)):
+        try:
+            username = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("sub")
+        except JWTError:
+            raise HTTPException(status_code=401)
+        user = db.exec(select(models.User).where(models.User.username == username)).first()
+        if user is None:
+            raise HTTPException(status_code=401)
+        return user
+
+    @legacy.get("/contracts/{contract_id}/status")
+    def get_contract_status(contract_id: int, db: Session = Depends(get_session), user=Depends(get_current_user)):
+        return db.get(models.Contract, contract_id)
+
+    @legacy.get("/contracts/{contract_name}")
+    def get_contract_details(contract_name: str, db: Session = Depends(get_session), user=Depends(get_current_user)):
+        return crud.get_contract_by_filename(db, filename=contract_name)
+
+    @legacy.get("/contracts/list/filenames")
+    def get_contract_filenames(db: Session = Depends(get_session), user=Depends(get_current_user)):
+        return crud.get_all_contract_filenames(db)
+
+    return legacy
+
+
+def seed(engine, contracts: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(models.User(username="bench", hashed_password="x"))
+        db.add_all(
+            models.Contract(filename=f"contrato_{i}.pdf", status="completed", contracting_party="Empresa SA",
+                            contracted_party="Fornecedor Ltda", contract_value="R$ 150.000,00",
+                            main_obligations="Prestação de serviços de manutenção.", termination_clause="Multa de 10%.")
+            for i in range(contracts)
+        )
+        db.commit()
+
+
+async def load(app: FastAPI, paths: list[str], total: int, concurrency: int, token: str) -> float:
+    """Dispara `total` requisições (ciclando pelos `paths`) e retorna as requisições por segundo."""
+    headers = {"Authorization": f"Bearer {token}"}
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def user():
+            for i in counter:
+                response = await client.get(paths[i % len(paths)], headers=headers)
+                response.raise_for_status()
+
+        await client.get(paths[0], headers=headers)  # Aquecimento (conexões do pool, rotas)
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+async def run(args) -> list[dict]:
+    url = args.database_url or f"sqlite:///{os.path.join(args.workdir, 'bench.db')}"
+    engine = create_engine(url, **database.engine_options(url))
+    async_engine = create_async_engine(database.async_url(url), **database.engine_options(url))
+    if url.startswith("sqlite"):
+        database.apply_sqlite_pragmas(engine)
+        database.apply_sqlite_pragmas(async_engine)
+    seed(engine, args.contracts)
+
+    factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    async_app.dependency_overrides[database.get_async_session_factory] = lambda: factory
+
+    token = auth.create_access_token({"sub": "bench"})
+    endpoints = {
+        "detail": [f"/contracts/contrato_{i}.pdf" for i in range(0, args.contracts, max(1, args.contracts // 100))],
+        "status": [f"/contracts/{i}/status" for i in range(1, args.contracts + 1, max(1, args.contracts // 100))],
+        "filenames": ["/contracts/list/filenames"],
+    }
+    results = []
+    try:
+        for name, paths in endpoints.items():
+            for label, app in (("sync (antes)", build_legacy_app(engine)), ("async (depois)", async_app)):
+                rps = await load(app, paths, args.requests, args.concurrency, token)
+                results.append({"endpoint": name, "version": label, "rps": round(rps, 1)})
+    finally:
+        async_app.dependency_overrides.clear()
+        await async_engine.dispose()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--contracts", type=int, default=1000)
+    parser.add_argument("--database-url", default=None, help="Banco vazio para o teste (padrão: SQLite temporário)")
+    args = parser.parse_args()
+    if not auth.SECRET_KEY:
+        auth.SECRET_KEY = "benchmark-key"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        results = asyncio.run(run(args))
+
+    print(f"{'endpoint':>10} {'versão':>15} {'req/s':>9}")
+    for r in results:
+        print(f"{r['endpoint']:>10} {r['version']:>15} {r['rps']:>9}")
+
+
+if __name__ == "__main__":
+    main()
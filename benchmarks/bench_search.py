@@ -0,0 +1,148 @@
+"""
+Busca textual num corpus sintético (padrão: 100 mil contratos): tempo de ingestão com o índice sendo
+mantido pelos triggers, latência das buscas ranqueadas (FTS5) comparada a varrer a tabela com LIKE,
+e custo de uma atualização incremental.
+
+Uso: python -m benchmarks.bench_search [--contracts 100000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import database, models, search
+
+from .synthetic import CLAUSES
+
+SUBJECTS = ["manutenção predial", "limpeza", "fornecimento de energia", "vigilância", "software",
+            "transporte", "consultoria jurídica", "locação de veículos", "alimentação", "geração fotovoltaica"]
+PARTIES = ["Alfa", "Beta", "Gama", "Delta", "Ômega", "Sigma", "Zeta", "Kappa"]
+
+QUERIES = {
+    "comum": "contrato",
+    "duas palavras": "multa rescisão",
+    "rara": "fotovoltaica",
+    "prefixo": "manut",
+}
+
+
+def synthetic_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        # O último assunto é raro (0,1% dos contratos), para medir buscas seletivas
+        subject = SUBJECTS[-1] if rng.random() < 0.001 else SUBJECTS[rng.randrange(len(SUBJECTS) - 1)]
+        clauses = [CLAUSES[rng.randrange(len(CLAUSES))].format(n=n) for n in range(1, 9)]
+        document = f"CONTRATO DE {subject.upper()}.\n" + "\n".join(clauses)
+        has_penalty = "RESCISÃO" in document
+        contract = (i, f"contrato_{i}.pdf", "completed", f"{rng.choice(PARTIES)} Serviços SA",
+                    f"{rng.choice(PARTIES)} Ltda", f"Prestação de serviços de {subject}.",
+                    "Multa de 10% do valor." if has_penalty else "Não identificada")
+        yield contract, (i, document)
+
+
+def ingest(engine, count: int, batch_size: int = 5000) -> float:
+    """Insere os contratos e os textos em lotes (os triggers indexam cada linha). Retorna os segundos gastos."""
+    start = time.perf_counter()
+    rows = synthetic_rows(count)
+    with engine.begin() as connection:
+        raw = connection.connection.driver_connection
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            raw.executemany(
+                "INSERT INTO contract (id, filename, status, contracting_party, contracted_party, main_obligations, "
+                "termination_clause) VALUES (?, ?, ?, ?, ?, ?, ?)", [contract for contract, _ in batch])
+            raw.executemany("INSERT INTO contracttext (contract_id, text) VALUES (?, ?)", [text for _, text in batch])
+    return time.perf_counter() - start
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def measure_queries(factory, repeat: int) -> list[dict]:
+    results = []
+    async with factory() as db:
+        for name, query in QUERIES.items():
+            timings, hits = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                hits = await search.search_contracts(db, query, limit=20)
+                timings.append(time.perf_counter() - start)
+            results.append({"query": name, "method": "FTS5 ranqueado", "hits": len(hits[:20]),
+                            "p50_ms": percentile(timings, 0.5) * 1000, "p95_ms": percentile(timings, 0.95) * 1000})
+
+        for name, query in QUERIES.items():
+            words = query.split()
+            condition = " AND ".join(f"(t.text LIKE :w{i} OR c.termination_clause LIKE :w{i})" for i in range(len(words)))
+            params = {f"w{i}": f"%{word}%" for i, word in enumerate(words)}
+            # Sem índice não há ranking: é preciso varrer tudo e trazer todas as linhas que casam
+            statement = text(f"SELECT c.id FROM contract c JOIN contracttext t ON t.contract_id = c.id WHERE {condition}")
+            timings = []
+            for _ in range(max(3, repeat // 4)):
+                start = time.perf_counter()
+                rows = (await db.exec(statement, params=params)).all()
+                timings.append(time.perf_counter() - start)
+            results.append({"query": name, "method": "LIKE (varredura)", "hits": len(rows),
+                            "p50_ms": percentile(timings, 0.5) * 1000, "p95_ms": percentile(timings, 0.95) * 1000})
+    return results
+
+
+def measure_update(engine, count: int, repeat: int) -> float:
+    """Reanálise de um contrato: atualiza o texto e os campos (os triggers reindexam só essa linha)."""
+    timings = []
+    with engine.connect() as connection:
+        raw = connection.connection.driver_connection
+        for i in range(repeat):
+            contract_id = (i * 7919) % count + 1
+            start = time.perf_counter()
+            raw.execute("UPDATE contracttext SET text = ? WHERE contract_id = ?",
+                        (f"Texto revisado número {i} com cláusula de confidencialidade.", contract_id))
+            raw.execute("UPDATE contract SET main_obligations = ? WHERE id = ?", (f"Obrigações revisadas {i}.", contract_id))
+            raw.commit()
+            timings.append(time.perf_counter() - start)
+    return percentile(timings, 0.5) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contracts", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        url = f"sqlite:///{os.path.join(workdir, 'search.db')}"
+        engine = create_engine(url, **database.engine_options(url))
+        database.apply_sqlite_pragmas(engine)
+        SQLModel.metadata.create_all(engine, tables=[models.Contract.__table__, models.ContractText.__table__])
+        search.setup(engine)
+
+        seconds = ingest(engine, args.contracts)
+        size_mb = os.path.getsize(os.path.join(workdir, "search.db")) / 1024 / 1024
+        print(f"Ingestão: {args.contracts} contratos em {seconds:.1f}s ({args.contracts / seconds:.0f}/s), "
+              f"banco com {size_mb:.0f} MB")
+
+        async_engine = create_async_engine(database.async_url(url), **database.engine_options(url))
+        database.apply_sqlite_pragmas(async_engine)
+        factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+        results = asyncio.run(measure_queries(factory, args.repeat))
+        asyncio.run(async_engine.dispose())
+
+        print(f"{'consulta':>14} {'método':>18} {'resultados':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+        for r in results:
+            print(f"{r['query']:>14} {r['method']:>18} {r['hits']:>10} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}")
+        print(f"Atualização incremental (texto + campos de 1 contrato): p50 {measure_update(engine, args.contracts, args.repeat):.2f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
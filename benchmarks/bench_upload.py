@@ -0,0 +1,110 @@
+"""
+Compara o caminho antigo do upload (spool do Starlette -> NamedTemporaryFile -> PdfReader(caminho))
+com o upload em streaming (gravação direta + hash -> PdfReader(mmap)).
+
+Uso: python -m benchmarks.bench_upload [--sizes 1 10 100] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from PyPDF2 import PdfReader
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartParser
+
+from app import uploads, utils
+
+from .synthetic import build_multipart, build_pdf
+
+CHUNK_SIZE = 64 * 1024  # Tamanho típico dos blocos entregues pelo servidor ASGI
+
+
+async def _body_stream(body: bytes):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+class _CountingWriter:
+    def __init__(self, raw):
+        self.raw = raw
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.raw.write(data)
+
+
+async def legacy_upload(body: bytes, content_type: str) -> int:
+    """Caminho antigo. Retorna quantos bytes foram copiados em espaço de usuário."""
+    parser = MultiPartParser(Headers({"content-type": content_type}), _body_stream(body))
+    form = await parser.parse()
+    upload = form["file"]
+    copied = upload.size  # 1ª cópia: corpo -> SpooledTemporaryFile do Starlette
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        writer = _CountingWriter(tmp)
+        upload.file.seek(0)
+        shutil.copyfileobj(upload.file, writer)  # 2ª e 3ª cópias: leitura do spool + escrita no temporário
+        copied += 2 * writer.written
+        tmp_path = tmp.name
+    await upload.close()
+    try:
+        PdfReader(tmp_path)  # 4ª cópia: o PdfReader lê o arquivo inteiro para um BytesIO
+        copied += os.path.getsize(tmp_path)
+    finally:
+        os.remove(tmp_path)
+    return copied
+
+
+async def streaming_upload(body: bytes, content_type: str) -> int:
+    """Caminho novo. Retorna quantos bytes foram copiados em espaço de usuário."""
+    stored = await uploads.receive_upload(_body_stream(body), content_type, max_bytes=len(body))
+    try:
+        with utils.mapped_file(stored.path) as view:
+            PdfReader(view)  # Leitura via mmap, sem cópia do arquivo inteiro
+        return stored.size  # Única cópia: corpo -> arquivo final (o hash é calculado no mesmo passo)
+    finally:
+        os.remove(stored.path)
+
+
+async def run(sizes_mb: list[int], repeat: int) -> list[dict]:
+    results = []
+    for size_mb in sizes_mb:
+        pdf = build_pdf(pages=1, padding_bytes=size_mb * 1024 * 1024)
+        body, content_type = build_multipart("contrato.pdf", pdf)
+        for name, func in (("legacy", legacy_upload), ("streaming", streaming_upload)):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                copied = await func(body, content_type)
+                timings.append(time.perf_counter() - start)
+            results.append({
+                "size_mb": size_mb,
+                "path": name,
+                "bytes_copied": copied,
+                "copies": round(copied / len(pdf), 2),
+                "best_s": round(min(timings), 4),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        utils.UPLOAD_DIR = upload_dir
+        results = asyncio.run(run(args.sizes, args.repeat))
+
+    print(f"{'MB':>5} {'caminho':>10} {'bytes copiados':>16} {'cópias':>7} {'tempo (s)':>10}")
+    for r in results:
+        print(f"{r['size_mb']:>5} {r['path']:>10} {r['bytes_copied']:>16} {r['copies']:>7} {r['best_s']:>10}")
+
+
+if __name__ == "__main__":
+    main()
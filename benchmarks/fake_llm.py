@@ -0,0 +1,89 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+VALUE_PATTERN = re.compile(r"R\$\s?[\d.]+,\d{2}")
+
+
+class FakeContractLLM(BaseChatModel):
+    """
+    Substituto determinístico do Gemini para testes e benchmarks: responde um JSON válido para o
+    ContractData depois de `latency` segundos (+ até `jitter`), e registra quantas chamadas
+    foram feitas e quantas estiveram em andamento ao mesmo tempo.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _random: random.Random = PrivateAttr()
+    _in_flight: int = PrivateAttr(default=0)
+    max_in_flight: int = 0
+    calls: int = 0
+
+    def model_post_init(self, __context: Any) -> None:
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-contract-llm"
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _answer(self, messages: list[BaseMessage]) -> ChatResult:
+        text = "\n".join(str(message.content) for message in messages)
+        contract_text = text.split("---", 1)[-1]  # Apenas o trecho do contrato, sem as instruções do prompt
+        value = VALUE_PATTERN.search(contract_text)
+        partial = "Trecho do Contrato" in text  # No modo em partes os campos ausentes vêm como null
+        content = json.dumps({
+            "contracting_party": "Empresa Contratante SA",
+            "contracted_party": "Fornecedor Contratado Ltda",
+            "contract_value": value.group(0) if value else None,
+            "main_obligations": f"Obrigações resumidas de um trecho com {len(contract_text)} caracteres.",
+            "additional_data": None,
+            "termination_clause": (
+                "Multa de 10% em caso de rescisão." if "RESCISÃO" in contract_text
+                else None if partial else "Não identificada"
+            ),
+        }, ensure_ascii=False)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self._enter()
+        try:
+            time.sleep(self._delay())
+            return self._answer(messages)
+        finally:
+            self._leave()
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self._enter()
+        try:
+            await asyncio.sleep(self._delay())
+            return self._answer(messages)
+        finally:
+            self._leave()
@@ -0,0 +1,360 @@
+"""
+Suíte de benchmarks reprodutível, para comparar execuções e barrar regressões no CI.
+
+Cenários (todos em processo, com a API real sobre um SQLite temporário e as mesmas trocas de dependência
+do tests/conftest.py; a IA é o FakeContractLLM, com latência e jitter configuráveis e semente fixa):
+- upload: contratos PDF sintéticos enviados de uma vez e acompanhados até o fim da análise pelos workers
+  (latência do 202 e de ponta a ponta, contratos/s);
+- extraction: páginas/s de um PDF sintético e parágrafos/s de um DOCX sintético;
+- login: logins/s com concorrência (bcrypt no pool configurado) e o p95 de `GET /` durante a rajada;
+- read: requisições/s dos endpoints de leitura com clientes simultâneos.
+
+O resultado vai para um JSON (parâmetros, commit e máquina em "meta"). Com `--baseline`, cada métrica é
+comparada com a execução anterior e o processo termina com código 1 se alguma piorar mais que `--threshold`.
+
+Uso: python -m benchmarks.suite [--profile quick|full] [--only upload extraction login read]
+                                [--output resultado.json] [--baseline anterior.json] [--threshold 0.25]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import admission, auth, blobs, cache, database, extraction, models, processing, search, utils, worker
+from app.cache import ContentCache, DetailCache, MemoryCache
+from app.main import app
+
+from . import synthetic
+from .bench_login import PASSWORD, burst
+from .bench_read_endpoints import load, seed
+from .fake_llm import FakeContractLLM
+
+SCENARIOS = ("upload", "extraction", "login", "read")
+
+PROFILES = {
+    # Rápido o bastante para rodar a cada PR
+    "quick": {
+        "uploads": 20, "upload_pages": 5, "workers": 4, "llm_latency": 0.05, "llm_jitter": 0.02,
+        "pdf_pages": 60, "docx_paragraphs": 3000, "repeat": 3,
+        "logins": 16, "login_concurrency": 4, "bcrypt_rounds": 8, "hash_workers": 2,
+        "contracts": 200, "requests": 600, "concurrency": 20,
+    },
+    # Mais próximo da produção (IA com a latência típica do Gemini e bcrypt no custo padrão)
+    "full": {
+        "uploads": 100, "upload_pages": 20, "workers": 4, "llm_latency": 1.5, "llm_jitter": 1.0,
+        "pdf_pages": 300, "docx_paragraphs": 20000, "repeat": 5,
+        "logins": 64, "login_concurrency": 8, "bcrypt_rounds": auth.BCRYPT_ROUNDS, "hash_workers": 2,
+        "contracts": 2000, "requests": 3000, "concurrency": 50,
+    },
+}
+
+# Sentido de cada métrica comparada com o baseline ("higher": maior é melhor)
+METRICS = {
+    "upload.accept_p95_ms": "lower",
+    "upload.e2e_p50_ms": "lower",
+    "upload.e2e_p95_ms": "lower",
+    "upload.contracts_s": "higher",
+    "extraction.pdf_pages_s": "higher",
+    "extraction.docx_paragraphs_s": "higher",
+    "login.logins_s": "higher",
+    "login.root_p95_ms": "lower",
+    "read.detail_rps": "higher",
+    "read.status_rps": "higher",
+    "read.list_rps": "higher",
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Environment:
+    """
+    API apontada para um banco temporário, como no tests/conftest.py: as dependências de sessão são
+    trocadas pelo dependency_overrides e os globais usados fora das rotas (engine dos workers, pasta de
+    uploads, caches, controle de admissão) são substituídos e restaurados no final.
+    """
+
+    def __init__(self, workdir: str, params: dict):
+        self.workdir = workdir
+        self.params = params
+        self._saved: list[tuple[object, str, object]] = []
+        self._environ: dict[str, str | None] = {}
+
+    def _replace(self, target, name: str, value) -> None:
+        self._saved.append((target, name, getattr(target, name)))
+        setattr(target, name, value)
+
+    def set_bcrypt_rounds(self, rounds: int) -> None:
+        self._replace(auth, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds))
+        self._environ.setdefault("BCRYPT_ROUNDS", os.environ.get("BCRYPT_ROUNDS"))
+        os.environ["BCRYPT_ROUNDS"] = str(rounds)
+
+    async def __aenter__(self):
+        url = f"sqlite:///{os.path.join(self.workdir, 'bench.db')}"
+        self.engine = create_engine(url, **database.engine_options(url))
+        self.async_engine = create_async_engine(database.async_url(url), **database.engine_options(url))
+        database.apply_sqlite_pragmas(self.engine)
+        database.apply_sqlite_pragmas(self.async_engine)
+        SQLModel.metadata.create_all(self.engine)
+        search.setup(self.engine)
+        seed(self.engine, self.params["contracts"])  # Contratos concluídos e o usuário "bench"
+        with Session(self.engine) as db:
+            user = db.exec(select(models.User).where(models.User.username == "bench")).one()
+            user.hashed_password = auth.get_password_hash(PASSWORD)
+            db.add(user)
+            db.commit()
+
+        def get_session_override():
+            with Session(self.engine) as session:
+                yield session
+
+        factory = async_sessionmaker(self.async_engine, class_=AsyncSession, expire_on_commit=False)
+        app.dependency_overrides[database.get_session] = get_session_override
+        app.dependency_overrides[database.get_async_session_factory] = lambda: factory
+
+        self._replace(database, "engine", self.engine)  # Usado pelos workers
+        self._replace(utils, "UPLOAD_DIR", os.path.join(self.workdir, "uploads"))
+        self._replace(blobs, "store", blobs.LocalBlobStore(os.path.join(self.workdir, "blobs")))
+        self._replace(processing, "content_cache", ContentCache(backend=None))  # Toda análise passa pela IA
+        self._replace(auth, "token_cache", auth.TokenCache())
+        self._replace(cache, "detail_cache", DetailCache(MemoryCache(cache.DETAIL_CACHE_MAX_ENTRIES, cache.DETAIL_CACHE_TTL_SECONDS)))
+        self._replace(admission, "controller", admission.AdmissionController(
+            backend=admission.MemoryBackend(), rate_per_minute=0, max_queue=0, max_wait=0))
+        self.token = auth.create_access_token({"sub": "bench"})
+        return self
+
+    async def __aexit__(self, *exc):
+        for target, name, value in reversed(self._saved):
+            setattr(target, name, value)
+        for name, value in self._environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        app.dependency_overrides.clear()
+        await self.async_engine.dispose()
+        self.engine.dispose()
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+
+async def bench_upload(env: Environment) -> dict:
+    p = env.params
+    llm = FakeContractLLM(latency=p["llm_latency"], jitter=p["llm_jitter"], seed=0)
+    processing.set_analyzer(processing.ContractAnalyzer(llm))
+    worker.pool = worker.WorkerPool(concurrency=p["workers"], kind="thread", poll_interval=0.05)
+    worker.pool.start()
+    pdf = synthetic.build_pdf(pages=p["upload_pages"])
+    headers = {"Authorization": f"Bearer {env.token}"}
+
+    async def one(client: httpx.AsyncClient, filename: str) -> tuple[float, float, str]:
+        body, content_type = synthetic.build_multipart(filename, pdf)
+        start = time.perf_counter()
+        response = await client.post("/contracts/upload", content=body, headers={**headers, "Content-Type": content_type})
+        response.raise_for_status()
+        accepted = time.perf_counter() - start
+        contract_id = response.json()["id"]
+        while True:
+            status = (await client.get(f"/contracts/{contract_id}/status", headers=headers)).json()["status"]
+            if status != "processing":
+                return accepted, time.perf_counter() - start, status
+            await asyncio.sleep(0.02)
+
+    try:
+        async with env.client() as client:
+            await one(client, "aquecimento.pdf")  # Sobe o pool da extração e carrega o parser antes de medir
+            start = time.perf_counter()
+            results = await asyncio.gather(*(one(client, f"upload_{number}.pdf") for number in range(p["uploads"])))
+            elapsed = time.perf_counter() - start
+    finally:
+        worker.stop_pool()
+        processing.set_analyzer(None)
+
+    accepted = [r[0] for r in results]
+    e2e = [r[1] for r in results]
+    return {
+        "accept_p95_ms": round(percentile(accepted, 0.95) * 1000, 2),
+        "e2e_p50_ms": round(percentile(e2e, 0.5) * 1000, 1),
+        "e2e_p95_ms": round(percentile(e2e, 0.95) * 1000, 1),
+        "contracts_s": round(len(results) / elapsed, 2),
+        "failed": sum(1 for r in results if r[2] != "completed"),
+        "llm_calls": llm.calls - 1,
+    }
+
+
+def bench_extraction(env: Environment) -> dict:
+    p = env.params
+    pdf_path = os.path.join(env.workdir, "extraction.pdf")
+    docx_path = os.path.join(env.workdir, "extraction.docx")
+    with open(pdf_path, "wb") as f:
+        f.write(synthetic.build_pdf(pages=p["pdf_pages"]))
+    with open(docx_path, "wb") as f:
+        f.write(synthetic.build_docx(paragraphs=p["docx_paragraphs"]))
+
+    def best(path: str) -> float:
+        utils.extract_pages_from_file(path)  # Aquecimento (pool de processos da extração)
+        timings = []
+        for _ in range(p["repeat"]):
+            start = time.perf_counter()
+            utils.extract_pages_from_file(path)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    try:
+        pdf_seconds = best(pdf_path)
+        docx_seconds = best(docx_path)
+    finally:
+        extraction.shutdown()
+    return {
+        "pdf_pages_s": round(p["pdf_pages"] / pdf_seconds, 1),
+        "docx_paragraphs_s": round(p["docx_paragraphs"] / docx_seconds, 1),
+    }
+
+
+async def bench_login(env: Environment) -> dict:
+    p = env.params
+    hasher = auth.PasswordHasher(workers=p["hash_workers"], max_queue=max(64, p["login_concurrency"] * 2))
+    env._replace(auth, "password_hasher", hasher)
+    hasher.start()
+    try:
+        async with env.client() as client:
+            await client.post("/login", data={"username": "bench", "password": PASSWORD})  # Aquecimento
+            rate, rejected, root_p95 = await burst(client, p["logins"], p["login_concurrency"])
+    finally:
+        hasher.shutdown()
+    return {"logins_s": round(rate, 1), "rejected": rejected, "root_p95_ms": round(root_p95, 1)}
+
+
+async def bench_read(env: Environment) -> dict:
+    p = env.params
+    step = max(1, p["contracts"] // 100)
+    endpoints = {
+        "detail": [f"/contracts/contrato_{i}.pdf" for i in range(0, p["contracts"], step)],
+        "status": [f"/contracts/{i}/status" for i in range(1, p["contracts"] + 1, step)],
+        "list": ["/contracts?limit=50"],
+    }
+    return {
+        f"{name}_rps": round(await load(app, paths, p["requests"], p["concurrency"], env.token), 1)
+        for name, paths in endpoints.items()
+    }
+
+
+async def run(params: dict, scenarios: list[str]) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        async with Environment(workdir, params) as env:
+            # O bcrypt do processo atual e o dos processos do pool usam o custo do perfil
+            env.set_bcrypt_rounds(params["bcrypt_rounds"])
+            for name in scenarios:
+                print(f"[suite] {name}...", file=sys.stderr)
+                if name == "upload":
+                    results[name] = await bench_upload(env)
+                elif name == "extraction":
+                    results[name] = await asyncio.to_thread(bench_extraction, env)
+                elif name == "login":
+                    results[name] = await bench_login(env)
+                elif name == "read":
+                    results[name] = await bench_read(env)
+    return results
+
+
+def metadata(profile: str, params: dict) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "profile": profile,
+        "params": params,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[dict]:
+    """
+    Compara as métricas de duas execuções. Uma métrica regrediu se piorou (no sentido dela) mais que
+    `threshold` (fração: 0.15 = 15%). Métricas ausentes em uma das execuções são ignoradas.
+    """
+    rows = []
+    for key, direction in METRICS.items():
+        scenario, metric = key.split(".")
+        old = baseline.get("results", {}).get(scenario, {}).get(metric)
+        new = current.get("results", {}).get(scenario, {}).get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if direction == "higher" else change
+        rows.append({"metric": key, "baseline": old, "current": new, "change_pct": round(change * 100, 1),
+                     "regressed": worse > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--set", nargs="+", default=[], metavar="PARAM=VALOR",
+                        help="Sobrescreve parâmetros do perfil (ex.: --set uploads=50 llm_latency=0.5)")
+    parser.add_argument("--output", default=None, help="Arquivo do resultado (padrão: benchmarks/results/<data>-<perfil>.json)")
+    parser.add_argument("--baseline", default=None, help="Resultado anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Piora máxima aceita por métrica (fração)")
+    args = parser.parse_args()
+    if not auth.SECRET_KEY:
+        auth.SECRET_KEY = "benchmark-key"
+
+    params = dict(PROFILES[args.profile])
+    for assignment in args.set:
+        name, value = assignment.split("=", 1)
+        if name not in params:
+            parser.error(f"Parâmetro desconhecido: {name}")
+        params[name] = type(params[name])(value)
+
+    report = {"meta": metadata(args.profile, params), "results": asyncio.run(run(params, args.only))}
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"{datetime.now():%Y%m%d-%H%M%S}-{args.profile}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    for scenario, metrics in report["results"].items():
+        print(f"{scenario:>11}  " + "  ".join(f"{name}={value}" for name, value in metrics.items()))
+    print(f"Resultado salvo em {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["params"] != params:
+            print("O baseline foi gerado com outros parâmetros; rode com o mesmo perfil para comparar.")
+            sys.exit(2)
+        rows = compare(report, baseline, args.threshold)
+        print(f"\n{'métrica':>30} {'baseline':>10} {'atual':>10} {'variação':>9}")
+        for row in rows:
+            flag = "  REGRESSÃO" if row["regressed"] else ""
+            print(f"{row['metric']:>30} {row['baseline']:>10} {row['current']:>10} {row['change_pct']:>8}%{flag}")
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
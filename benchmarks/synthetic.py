@@ -0,0 +1,148 @@
+import io
+import os
+import zipfile
+
+# Geração de contratos sintéticos para os benchmarks (sem depender de bibliotecas externas)
+
+CLAUSES = [
+    "CLÁUSULA {n} - DO OBJETO. A CONTRATADA prestará serviços de manutenção conforme o anexo técnico.",
+    "CLÁUSULA {n} - DO VALOR. O valor global deste contrato é de R$ 150.000,00, pago em parcelas mensais.",
+    "CLÁUSULA {n} - DAS OBRIGAÇÕES. A CONTRATANTE fornecerá acesso às instalações e aos sistemas.",
+    "CLÁUSULA {n} - DA RESCISÃO. O descumprimento de qualquer cláusula implica multa de 10% do valor.",
+    "CLÁUSULA {n} - DA VIGÊNCIA. O prazo de vigência é de 12 meses a contar da assinatura.",
+]
+
+
+def contract_lines(count: int) -> list[str]:
+    return [CLAUSES[i % len(CLAUSES)].format(n=i + 1) for i in range(count)]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: int = 1, lines_per_page: int = 40, padding_bytes: int = 0, blank_pages: tuple = ()) -> bytes:
+    """
+    Monta um PDF válido com `pages` páginas de texto. `padding_bytes` adiciona um stream binário
+    não referenciado, para simular contratos escaneados/pesados de um tamanho específico, e as páginas
+    em `blank_pages` (índices) ficam sem camada de texto, como as páginas escaneadas.
+    """
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * pages + (1 if padding_bytes else 0)  # O /Pages é o último objeto
+    page_ids = []
+    lines = contract_lines(pages * lines_per_page)
+    for p in range(pages):
+        text = "".join(
+            f"({_pdf_escape(line)}) Tj T* " for line in lines[p * lines_per_page:(p + 1) * lines_per_page]
+        )
+        content = b"" if p in blank_pages else f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode("latin-1", errors="replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    if padding_bytes:
+        add(b"<< /Length %d >>\nstream\n" % padding_bytes + os.urandom(padding_bytes) + b"\nendstream")
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    return bytes(out)
+
+
+def build_multipart(filename: str, content: bytes, boundary: str = "benchmarkboundary") -> tuple[bytes, str]:
+    """Corpo multipart/form-data com o campo "file", igual ao enviado pelo front-end."""
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    return head + content + tail, f"multipart/form-data; boundary={boundary}"
+
+
+def _xml_escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def build_docx(paragraphs: int = 40, table_rows: int = 0, header: str | None = None, footer: str | None = None) -> bytes:
+    """
+    Monta um DOCX mínimo (só o document.xml e as relações obrigatórias) com `paragraphs` cláusulas,
+    seguidas de uma tabela de preços com `table_rows` linhas e, opcionalmente, cabeçalho e rodapé.
+    """
+    body = "".join(f"<w:p><w:r><w:t>{_xml_escape(line)}</w:t></w:r></w:p>" for line in contract_lines(paragraphs))
+    if table_rows:
+        rows = [("Item", "Descrição", "Valor")] + [
+            (str(i + 1), f"Serviço de manutenção {i + 1}", f"R$ {(i + 1) * 1000:,}".replace(",", ".") + ",00")
+            for i in range(table_rows)
+        ]
+        body += "<w:tbl>" + "".join(
+            "<w:tr>" + "".join(f"<w:tc><w:p><w:r><w:t>{_xml_escape(cell)}</w:t></w:r></w:p></w:tc>" for cell in row) + "</w:tr>"
+            for row in rows
+        ) + "</w:tbl>"
+
+    namespace = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    relationships_ns = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    parts, relationships, references, overrides = {}, "", "", ""
+    for kind, text in (("header", header), ("footer", footer)):
+        if text is None:
+            continue
+        tag = "hdr" if kind == "header" else "ftr"
+        parts[f"word/{kind}1.xml"] = (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:{tag} {namespace}>'
+            f"<w:p><w:r><w:t>{_xml_escape(text)}</w:t></w:r></w:p></w:{tag}>"
+        )
+        relationships += (f'<Relationship Id="r{kind}" Target="{kind}1.xml" '
+                          f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/{kind}"/>')
+        references += f'<w:{kind}Reference w:type="default" r:id="r{kind}"/>'
+        overrides += (f'<Override PartName="/word/{kind}1.xml" '
+                      f'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.{kind}+xml"/>')
+    if relationships:
+        parts["word/_rels/document.xml.rels"] = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{relationships}</Relationships>'
+        )
+
+    files = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            f'{overrides}</Types>'
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ),
+        "word/document.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<w:document {namespace} {relationships_ns}>'
+            f'<w:body>{body}<w:sectPr>{references}</w:sectPr></w:body></w:document>'
+        ),
+        **parts,
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
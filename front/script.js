@@ -87,6 +87,55 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Mensagens exibidas para cada etapa da análise (eventos enviados pela api)
+    const STAGE_MESSAGES = {
+        received: () => 'Arquivo recebido, aguardando na fila...',
+        extracted: (event) => `Texto extraído (${event.pages} página(s)), aguardando a IA...`,
+        llm_started: (event) => event.chunks > 1 ? `Analisando com a IA em ${event.chunks} partes...` : 'Analisando com a IA...',
+        chunk_done: (event) => `Parte ${event.done} de ${event.chunks} analisada...`,
+        analyzed: () => 'Análise concluída, salvando...',
+    };
+
+    // Acompanha a análise pelo stream de eventos (Server-Sent Events).
+    // Usamos fetch em vez de EventSource porque o EventSource não envia o cabeçalho Authorization
+    async function followContractProgress(contractId, onEvent) {
+        let lastEventId = null;
+        for (let attempt = 0; attempt < 5; attempt++) {
+            const headers = { 'Authorization': `Bearer ${apiToken}` };
+            if (lastEventId) {
+                headers['Last-Event-ID'] = lastEventId; // Reconexão: a api envia só o que faltou
+            }
+            const response = await fetch(`${API_URL}/contracts/${contractId}/events`, { headers });
+            if (!response.ok) {
+                throw new Error('Não foi possível acompanhar a análise.');
+            }
+
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) >= 0) { // Cada evento termina com uma linha em branco
+                    const block = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = null;
+                    for (const line of block.split('\n')) {
+                        if (line.startsWith('id: ')) lastEventId = line.slice(4);
+                        if (line.startsWith('data: ')) event = JSON.parse(line.slice(6));
+                    }
+                    if (event) {
+                        onEvent(event);
+                        if (event.stage === 'persisted' || event.stage === 'failed') return event;
+                    }
+                }
+            }
+            // O stream caiu antes do fim (rede instável): reconecta de onde parou
+        }
+        throw new Error('A conexão com o andamento da análise caiu. Pesquise o contrato em instantes.');
+    }
+
     // --- Lógica de Upload 
     uploadForm.addEventListener('submit', async (e) => { //async: palavra chave para função que realizará operações demoradas, e: objeto do evento
         e.preventDefault(); //Não recarregar a página
@@ -132,8 +181,22 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(data.detail || 'Ocorreu um erro no upload.');
             }
 
+            // O upload só coloca o contrato na fila: acompanha as etapas até a análise terminar
+            loadingDiv.textContent = 'Arquivo enviado...';
+            const finalEvent = await followContractProgress(data.id, (event) => {
+                const message = STAGE_MESSAGES[event.stage];
+                if (message) loadingDiv.textContent = message(event);
+            });
+
+            if (finalEvent.stage === 'failed') {
+                throw new Error(`A análise falhou: ${finalEvent.error || 'erro desconhecido'}`);
+            }
+
             // Mostra o resultado da análise
-            displayResult("O Upload foi feito, aguarde alguns segundos para a análise e poderá pesquisar");
+            const detailsResponse = await fetch(`${API_URL}/contracts/${encodeURIComponent(data.filename)}`, {
+                headers: { 'Authorization': `Bearer ${apiToken}` }
+            });
+            displayResult(await detailsResponse.json());
 
         } catch (error) {
             displayError(error.message);
@@ -142,6 +205,7 @@ document.addEventListener('DOMContentLoaded', () => {
             uploadButton.disabled = false;
             uploadButton.textContent = 'Analisar';
             loadingDiv.classList.add('hidden');
+            loadingDiv.textContent = 'Processando...'; // Reseta o texto do carregamento
             fileInput.value = '';
         }
     });
@@ -293,7 +357,55 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
 
-    // --- Logica de listar os contratos 
+    // --- Logica de listar os contratos (em páginas, usando o cursor devolvido pela api)
+    const PAGE_SIZE = 100;
+
+    async function loadContractsPage(cursor) {
+        const params = new URLSearchParams({ limit: PAGE_SIZE, order_by: 'filename', fields: 'filename' });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        // de fato a requisição a api
+        const response = await fetch(`${API_URL}/contracts?${params}`, {
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${apiToken}` }
+        });
+
+        const page = await response.json(); // resposta da api já formatada
+
+        if (!response.ok) {
+            //se a api retornar um erro
+            throw new Error(page.detail || 'Erro ao buscar a lista de arquivos.');
+        }
+        return page;
+    }
+
+    function renderContractsPage(page, list) {
+        // Adiciona os nomes da página na lista HTML (<ul>)
+        list.insertAdjacentHTML('beforeend', page.items.map(item => `<li>${item.filename}</li>`).join(''));
+
+        const oldButton = document.getElementById('load-more-button');
+        if (oldButton) {
+            oldButton.remove();
+        }
+        if (page.next_cursor) {
+            // Ainda há contratos: botão para buscar a próxima página
+            const loadMoreButton = document.createElement('button');
+            loadMoreButton.id = 'load-more-button';
+            loadMoreButton.textContent = 'Carregar mais';
+            loadMoreButton.addEventListener('click', async () => {
+                loadMoreButton.disabled = true;
+                try {
+                    renderContractsPage(await loadContractsPage(page.next_cursor), list);
+                } catch (error) {
+                    loadMoreButton.disabled = false;
+                    alert(error.message);
+                }
+            });
+            contractsListOutput.appendChild(loadMoreButton);
+        }
+    }
+
     listFilesButton.addEventListener('click', async () => {
         if (!apiToken) {
             alert('Token expirado. Relogue!');
@@ -307,26 +419,15 @@ document.addEventListener('DOMContentLoaded', () => {
         contractsListOutput.innerHTML = ''; // Limpa a lista antiga
 
         try {
-            // de fato a requisição a api
-            const response = await fetch(`${API_URL}/contracts/list/filenames`, {
-                method: 'GET',
-                headers: { 'Authorization': `Bearer ${apiToken}` }
-            });
-
-            const filenames = await response.json(); // resposta da api já formatada
-
-            if (!response.ok) {
-                //se a api retornar um erro
-                throw new Error(filenames.detail || 'Erro ao buscar a lista de arquivos.');
-            }
+            const page = await loadContractsPage(null);
 
-            if (filenames.length === 0) {
+            if (page.items.length === 0) {
                 // se estiver vazio modificar o html
                 contractsListOutput.innerHTML = `<p>Nenhum contrato encontrado no banco de dados.</p>`;
             } else {
-                // Cria uma lista HTML (<ul>) com os nomes dos arquivos
-                const listHtml = filenames.map(name => `<li>${name}</li>`).join('');
-                contractsListOutput.innerHTML = `<ul>${listHtml}</ul>`;
+                const list = document.createElement('ul');
+                contractsListOutput.appendChild(list);
+                renderContractsPage(page, list);
             }
 
         } catch (error) {
@@ -1,11 +1,14 @@
 import pytest  # Framework de testes
 import os
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.main import app
-from app.database import get_session
-from app import models
+from app.database import apply_sqlite_pragmas, get_async_session_factory, get_session
+from app import admission, auth, blobs, cache, models, search, utils
 
 # Define o nome do arquivo do banco de dados de teste
 TEST_DATABASE_FILE = "./test.db"
@@ -14,16 +17,29 @@ DATABASE_URL = f"sqlite:///{TEST_DATABASE_FILE}"
 # Cria o 'engine' para o banco de teste
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
+# Engine assíncrono para o mesmo arquivo, usado pelos endpoints "async def".
+# NullPool: cada requisição do TestClient roda num event loop próprio, então as conexões não podem ser reaproveitadas
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DATABASE_FILE}", poolclass=NullPool)
+apply_sqlite_pragmas(engine)
+apply_sqlite_pragmas(async_engine)
+async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def remove_database_files():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DATABASE_FILE + suffix):
+            os.remove(TEST_DATABASE_FILE + suffix)
+
 # Fixture que gerencia o ciclo de vida do banco de dados para CADA teste
 # Fixtures são funções que fornecem recursos (como uma sessão de banco de dados ou um cliente de teste) para os testes
 @pytest.fixture(name="session")
 def session_fixture():
     # Garante que não há um banco de dados antigo antes de começar
-    if os.path.exists(TEST_DATABASE_FILE):
-        os.remove(TEST_DATABASE_FILE)
+    remove_database_files()
 
     # Cria todas as tabelas com base no model do app (já que ele foi importado)
     SQLModel.metadata.create_all(engine)
+    search.setup(engine)
     
     # Abre e entrega a sessão para o teste - Usa with para fechar após o uso
     with Session(engine) as session:
@@ -31,19 +47,32 @@ def session_fixture():
     
     # Após o teste terminar, fecha as conexões e apaga o arquivo do banco
     engine.dispose()
-    if os.path.exists(TEST_DATABASE_FILE):
-        os.remove(TEST_DATABASE_FILE)
+    remove_database_files()
 
 # Fixture que cria o cliente de teste usando a sessão de teste
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, tmp_path, monkeypatch):
     def get_session_override():  # Função para retornar a sessão
         return session  
 
+    # Os uploads dos testes ficam numa pasta temporária, apagada pelo pytest
+    monkeypatch.setattr(utils, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    # Cache de tokens novo para cada teste (o mesmo usuário/token pode se repetir entre testes)
+    monkeypatch.setattr(auth, "token_cache", auth.TokenCache())
+    # bcrypt no threadpool (subir o pool de processos a cada teste deixaria a suíte lenta)
+    monkeypatch.setattr(auth, "password_hasher", auth.PasswordHasher(workers=0))
+    # Arquivos originais numa pasta temporária
+    monkeypatch.setattr(blobs, "store", blobs.LocalBlobStore(str(tmp_path / "blobs")))
+    # Cache de detalhes vazio a cada teste (os ids dos contratos se repetem entre os bancos de teste)
+    monkeypatch.setattr(cache, "detail_cache", cache.DetailCache(cache.MemoryCache()))
+    # Limites de envio zerados a cada teste (o mesmo usuário envia contratos em vários testes)
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(backend=admission.MemoryBackend()))
+
     # Aqui vamos sobrescrever o app (api) com a sessão que precisamos
     # Ou seja, quando a api tentar obter uma sessão atráves do get_session, em vez dela abrir o bd normal
     # abrirá o bd criado para os testes
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session_factory] = lambda: async_session_factory
     
     yield TestClient(app)  # Aqui é onde o cliente do pytest acontece
 
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import admission, batch, models, processing
+from benchmarks.fake_llm import FakeContractLLM
+
+
+class ResourceExhausted(Exception):
+    """Mesmo nome da exceção de cota da API do Gemini."""
+
+
+class FlakyLLM(FakeContractLLM):
+    """Falha com erro de cota nas primeiras `failures` chamadas."""
+
+    failures: int = 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self.calls <= self.failures
+        if fail:
+            raise ResourceExhausted("429 RESOURCE_EXHAUSTED: quota exceeded")
+        return self._answer(messages)
+
+
+def auth_headers(client: TestClient, username: str) -> dict:
+    client.post("/users/", json={"username": username, "password": "password123"})
+    token = client.post("/login", data={"username": username, "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def upload(client: TestClient, headers: dict, name: str):
+    return client.post("/contracts/upload", headers=headers, files={"file": (name, b"conteudo", "application/pdf")})
+
+
+def test_uploads_are_limited_per_user(client: TestClient, monkeypatch):
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(
+        backend=admission.MemoryBackend(), rate_per_minute=6, burst=2))
+    alice = auth_headers(client, "alice")
+    bob = auth_headers(client, "bob")
+
+    assert upload(client, alice, "a1.pdf").status_code == 202
+    assert upload(client, alice, "a2.pdf").status_code == 202
+    rejected = upload(client, alice, "a3.pdf")
+    assert rejected.status_code == 429
+    assert 1 <= int(rejected.headers["Retry-After"]) <= 10  # Um envio a cada 10s
+    # O limite é por usuário
+    assert upload(client, bob, "b1.pdf").status_code == 202
+    assert admission.controller.stats()["rate_limited"] == 1
+
+
+def test_batches_pay_for_every_file(client: TestClient, monkeypatch):
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(
+        backend=admission.MemoryBackend(), rate_per_minute=6, burst=3, batch_rate_per_minute=6, batch_burst=15))
+    headers = auth_headers(client, "loteuser")
+
+    def send_batch(*names):
+        files = [("files", (name, name.encode(), "application/pdf")) for name in names]
+        return client.post("/contracts/batch", headers=headers, files=files)
+
+    monkeypatch.setattr("app.batch.worker.analyze_contract_file", lambda *args: None)
+    # Lote bem maior que o UPLOAD_BURST: os arquivos saem do saldo de lotes, o pedido conta como um envio
+    assert send_batch(*(f"l{number}.pdf" for number in range(12))).status_code == 200
+    # Mais arquivos que o saldo inteiro de lotes nunca caberia: recusado sem descontar nada
+    assert send_batch(*(f"m{number}.pdf" for number in range(16))).status_code == 413
+    assert send_batch("n1.pdf", "n2.pdf", "n3.pdf").status_code == 200  # Sobraram 3 dos 15 arquivos
+    assert send_batch("n4.pdf").status_code == 429
+    assert upload(client, headers, "avulso.pdf").status_code == 429  # Os 3 envios avulsos foram os 3 pedidos de lote
+
+
+def test_default_batch_budget_fits_the_largest_batch():
+    controller = admission.AdmissionController(backend=admission.MemoryBackend())
+    assert controller.batch_burst == batch.BATCH_MAX_FILES > controller.burst
+    controller.check_batch("ana", controller.batch_burst)
+
+
+def test_uploads_are_rejected_when_the_queue_would_take_too_long(client: TestClient, session, monkeypatch):
+    headers = auth_headers(client, "filauser")
+    # Jobs recentes levaram 60s cada; com 2 jobs na fila e paralelismo 1, um novo esperaria 180s
+    now = datetime.now(timezone.utc)
+    for _ in range(3):
+        session.add(models.Job(contract_id=0, file_path="x", status="done",
+                               started_at=now - timedelta(seconds=60), finished_at=now))
+    session.add(models.Job(contract_id=0, file_path="x", status="queued"))
+    session.add(models.Job(contract_id=0, file_path="x", status="queued"))
+    session.commit()
+    monkeypatch.setattr(admission, "queue_parallelism", lambda: 1)
+
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(
+        backend=admission.MemoryBackend(), max_queue=0, max_wait=120))
+    rejected = upload(client, headers, "longo.pdf")
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) == 60  # Até a espera estimada voltar ao limite
+
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(
+        backend=admission.MemoryBackend(), max_queue=2, max_wait=0))
+    assert upload(client, headers, "cheio.pdf").status_code == 429
+
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(
+        backend=admission.MemoryBackend(), max_queue=3, max_wait=300))
+    assert upload(client, headers, "cabe.pdf").status_code == 202
+
+
+def test_llm_calls_never_exceed_the_global_cap():
+    controller = admission.AdmissionController(backend=admission.MemoryBackend(), llm_concurrency=2, slot_timeout=5)
+    llm = FakeContractLLM(latency=0.05)
+    threads = [threading.Thread(target=controller.call_llm, args=(llm.invoke, "contrato")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert llm.calls == 8
+    assert llm.max_in_flight == 2
+
+    # Sem vaga dentro do prazo: falha rápida
+    busy = admission.AdmissionController(backend=admission.MemoryBackend(), llm_concurrency=1, slot_timeout=0.05)
+    with busy.llm_slot():
+        with pytest.raises(admission.LLMBusy):
+            busy.call_llm(llm.invoke, "contrato")
+    assert busy.stats()["llm_busy"] == 1
+
+
+def test_transient_llm_errors_are_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(admission, "backoff_delay", lambda attempt: delays.append(attempt) or 0)
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(
+        backend=admission.MemoryBackend(), retry_attempts=3))
+
+    llm = FlakyLLM(failures=2)
+    data = processing.ContractAnalyzer(llm).analyze_text("CONTRATO. Valor: R$ 1.000,00.")
+    assert data.contract_value == "R$ 1.000,00"
+    assert llm.calls == 3 and delays == [0, 1]
+
+    # Depois das tentativas o erro sobe
+    with pytest.raises(ResourceExhausted):
+        processing.ContractAnalyzer(FlakyLLM(failures=5)).analyze_text("CONTRATO.")
+
+    # Erros que não são temporários falham na primeira
+    assert not admission.is_transient(ValueError("JSON inválido"))
+    assert admission.is_transient(TimeoutError())
+    error = HTTPException(status_code=503)
+    assert admission.is_transient(error)
+    assert not admission.is_transient(admission.LLMBusy())  # A espera pela vaga já passou do prazo
+
+
+def test_backoff_is_jittered_and_capped():
+    samples = [admission.backoff_delay(attempt, base=1, cap=4) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 4 for delay in samples)
+    assert len(set(samples)) > 1
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "admission.db")
+    first = admission.SQLiteBackend(path)
+    second = admission.SQLiteBackend(path, lease=0.05)  # Outro processo, com vagas que expiram logo
+
+    # O saldo do usuário é o mesmo nos dois
+    assert first.take("upload:ana", rate=1 / 60, burst=2) == 0
+    assert second.take("upload:ana", rate=1 / 60, burst=2) == 0
+    assert first.take("upload:ana", rate=1 / 60, burst=2) > 50
+
+    # As vagas da IA também
+    slot = first.acquire_slot(limit=1, timeout=0)
+    assert slot is not None
+    started = time.monotonic()
+    assert second.acquire_slot(limit=1, timeout=0.1) is None
+    assert time.monotonic() - started >= 0.1
+    first.release_slot(slot)
+    orphan = second.acquire_slot(limit=1, timeout=0)
+    assert orphan is not None and second.in_flight() == 1
+    # Vaga de um processo que morreu sem liberar: expira com o lease
+    time.sleep(0.1)
+    assert first.acquire_slot(limit=1, timeout=0) is not None
+
+    # Nos endpoints assíncronos a transação do saldo roda numa thread, fora do event loop
+    controller = admission.AdmissionController(backend=first, rate_per_minute=1, burst=2)
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(controller.acheck_rate("ana"))
+    assert rejected.value.status_code == 429
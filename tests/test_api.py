@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient  # Serve para fazer requisições diretas sem precisar da rede
-from app import schemas
+from app import schemas, worker
+from benchmarks.synthetic import build_pdf
 
 # Teste 1: Rotas públicas básicas
 def test_read_root(client: TestClient):
@@ -58,7 +59,7 @@ def test_access_protected_route_with_token(client: TestClient):
     assert response.json() == []
 
 # Teste 4: Testando o Upload com "Mock" da IA
-def test_upload_contract_with_mocking(client: TestClient, monkeypatch):
+def test_upload_contract_with_mocking(client: TestClient, session, monkeypatch):
     """
     Testa o endpoint de upload substituindo a chamada à IA por uma função falsa.
     Isso torna o teste rápido, gratuito e previsível.
@@ -70,7 +71,7 @@ def test_upload_contract_with_mocking(client: TestClient, monkeypatch):
     headers = {"Authorization": f"Bearer {token}"}
 
     # Função falsa que imita a resposta da IA
-    def fake_ai_analysis(file_path: str) -> schemas.ContractData:
+    def fake_ai_analysis(file_path: str, file_hash: str | None = None, pages=None) -> schemas.ContractData:
         return schemas.ContractData(
             contracting_party="Empresa Teste SA",
             contracted_party="Fornecedor Mock",
@@ -84,13 +85,275 @@ def test_upload_contract_with_mocking(client: TestClient, monkeypatch):
     monkeypatch.setattr("app.processing.analyze_contract_with_ai", fake_ai_analysis)
 
     # Executa o upload.
-    file_content = "Este é um conteúdo de um pdf falso.".encode("utf-8")  # Criação de um dado falso
+    file_content = build_pdf(pages=1)  # PDF de verdade (a análise da IA é simulada)
     files = {"file": ("mock_contract.pdf", file_content, "application/pdf")}
     response = client.post("/contracts/upload", headers=headers, files=files)
 
-    # Verifica os resultados
-    assert response.status_code == 200
+    # O upload só coloca o contrato na fila
+    assert response.status_code == 202
     data = response.json()
     assert data["filename"] == "mock_contract.pdf"
-    assert data["status"] == "completed"
-    assert data["contracting_party"] == "Empresa Teste SA" # Verifica se os dados do mock estão presentes
\ No newline at end of file
+    assert data["status"] == "processing"
+
+    # Executa o worker na própria thread do teste, drenando a fila
+    assert worker.process_next_job(session) is True
+    assert worker.process_next_job(session) is False
+
+    # Verifica os resultados
+    status_response = client.get(f"/contracts/{data['id']}/status", headers=headers)
+    assert status_response.json()["status"] == "completed"
+    response = client.get("/contracts/mock_contract.pdf", headers=headers)
+    assert response.json()["contracting_party"] == "Empresa Teste SA" # Verifica se os dados do mock estão presentes
+
+
+def test_upload_contract_marks_failed_when_ai_fails(client: TestClient, session, monkeypatch):
+    """Testa se uma falha na IA deixa o contrato como "failed" e aparece nas estatísticas da fila."""
+    client.post("/users/", json={"username": "failuser", "password": "password123"})
+    login_response = client.post("/login", data={"username": "failuser", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def failing_ai_analysis(file_path: str, file_hash: str | None = None, pages=None) -> schemas.ContractData:
+        raise RuntimeError("Cota da IA excedida")
+
+    monkeypatch.setattr("app.processing.analyze_contract_with_ai", failing_ai_analysis)
+
+    files = {"file": ("broken_contract.pdf", b"conteudo", "application/pdf")}
+    contract_id = client.post("/contracts/upload", headers=headers, files=files).json()["id"]
+    assert client.get("/stats", headers=headers).json()["queue"]["queued"] == 1
+
+    worker.process_next_job(session)
+
+    assert client.get(f"/contracts/{contract_id}/status", headers=headers).json()["status"] == "failed"
+    stats = client.get("/stats", headers=headers).json()["queue"]
+    assert stats["queued"] == 0
+    assert stats["failed"] == 1
+
+# Teste 5: Upload em streaming (limite de tamanho, duplicados e hash)
+def test_upload_rejects_files_over_the_size_limit(client: TestClient, monkeypatch, tmp_path):
+    """Testa se arquivos acima do limite são recusados (413) sem deixar lixo na pasta de uploads."""
+    client.post("/users/", json={"username": "bigfileuser", "password": "password123"})
+    login_response = client.post("/login", data={"username": "bigfileuser", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    monkeypatch.setattr("app.uploads.MAX_UPLOAD_BYTES", 1024)
+
+    files = {"file": ("big_contract.pdf", b"x" * 4096, "application/pdf")}
+    response = client.post("/contracts/upload", headers=headers, files=files)
+
+    assert response.status_code == 413
+    upload_dir = tmp_path / "uploads"
+    assert not upload_dir.exists() or list(upload_dir.iterdir()) == []
+
+
+def test_upload_stores_content_hash_and_rejects_duplicates(client: TestClient, session, tmp_path):
+    """Testa se o hash é calculado durante a gravação e se nomes duplicados são recusados antes de gravar."""
+    import hashlib
+    from sqlmodel import select
+    from app import models
+
+    client.post("/users/", json={"username": "hashuser", "password": "password123"})
+    login_response = client.post("/login", data={"username": "hashuser", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    content = b"%PDF-1.4 conteudo do contrato" * 1000
+    files = {"file": ("hashed_contract.pdf", content, "application/pdf")}
+    assert client.post("/contracts/upload", headers=headers, files=files).status_code == 202
+
+    job = session.exec(select(models.Job)).one()
+    assert job.content_hash == hashlib.sha256(content).hexdigest()
+    with open(job.file_path, "rb") as f:
+        assert f.read() == content
+
+    response = client.post("/contracts/upload", headers=headers, files=files)
+    assert response.status_code == 400
+    assert len(list((tmp_path / "uploads").iterdir())) == 1  # O duplicado não chegou a ser gravado
+
+
+# Teste 6: Upload em lote
+def test_batch_upload_reports_each_file(client: TestClient, monkeypatch):
+    """Testa o lote com arquivos soltos e um .zip: duplicados, formatos inválidos e falhas só afetam o próprio arquivo."""
+    import io
+    import zipfile
+
+    client.post("/users/", json={"username": "batchuser", "password": "password123"})
+    login_response = client.post("/login", data={"username": "batchuser", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def fake_ai_analysis(file_path: str, file_hash: str | None = None, pages=None) -> schemas.ContractData:
+        with open(file_path, "rb") as f:
+            if f.read() == b"quebrado":
+                raise RuntimeError("Resposta inválida da IA")
+        return schemas.ContractData(
+            contracting_party="Empresa Lote SA", contracted_party=None, contract_value=None,
+            main_obligations="Entregar.", additional_data=None, termination_clause="Multa de 5%.",
+        )
+
+    monkeypatch.setattr("app.processing.analyze_contract_with_ai", fake_ai_analysis)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("pasta/zipado.pdf", build_pdf(pages=2))
+        zf.writestr("pasta/leia-me.txt", b"texto")
+
+    files = [
+        ("files", ("lote_a.pdf", build_pdf(pages=1), "application/pdf")),
+        ("files", ("lote_b.docx", b"quebrado", "application/octet-stream")),
+        ("files", ("lote_a.pdf", b"repetido", "application/pdf")),
+        ("files", ("contratos.zip", archive.getvalue(), "application/zip")),
+    ]
+    response = client.post("/contracts/batch", headers=headers, files=files)
+
+    assert response.status_code == 200
+    result = response.json()
+    statuses = {(item["filename"], item["status"]) for item in result["items"]}
+    assert statuses == {
+        ("lote_a.pdf", "completed"),
+        ("lote_b.docx", "failed"),
+        ("lote_a.pdf", "duplicate"),
+        ("zipado.pdf", "completed"),
+        ("leia-me.txt", "rejected"),
+    }
+    assert (result["total"], result["completed"], result["failed"], result["skipped"]) == (5, 2, 1, 2)
+
+    failed_id = next(item["contract_id"] for item in result["items"] if item["status"] == "failed")
+    assert client.get(f"/contracts/{failed_id}/status", headers=headers).json()["status"] == "failed"
+    assert client.get("/contracts/zipado.pdf", headers=headers).json()["contracting_party"] == "Empresa Lote SA"
+
+def test_async_read_endpoints_and_delete(client: TestClient, session):
+    """Os endpoints assíncronos leem o que foi gravado pela sessão síncrona e a deleção remove os jobs."""
+    from sqlmodel import select
+    from app import crud, models
+
+    client.post("/users/", json={"username": "asyncuser", "password": "password123"})
+    token = client.post("/login", data={"username": "asyncuser", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    db_contract = crud.enqueue_contract(session, filename="leitura.pdf", file_path="inexistente.pdf")
+
+    assert client.get("/contracts/leitura.pdf", headers=headers).json()["id"] == db_contract.id
+    assert client.get(f"/contracts/{db_contract.id}/status", headers=headers).json()["status"] == "processing"
+    assert client.get("/contracts/list/filenames", headers=headers).json() == ["leitura.pdf"]
+    assert client.get("/stats", headers=headers).json()["queue"]["queued"] == 1
+
+    assert client.delete(f"/contracts/{db_contract.id}", headers=headers).status_code == 200
+    assert client.get("/contracts/leitura.pdf", headers=headers).status_code == 404
+    session.expire_all()
+    assert session.exec(select(models.Job)).all() == []
+
+def test_paginated_contract_listing(client: TestClient, session):
+    """Listagem paginada por cursor, com filtro de status, projeção de campos e ETag."""
+    from app import crud
+
+    client.post("/users/", json={"username": "pageuser", "password": "password123"})
+    token = client.post("/login", data={"username": "pageuser", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ["c.pdf", "a.pdf", "e.pdf", "b.pdf", "d.pdf"]:
+        db_contract = crud.create_contract(session, filename=name)
+        if name in ("a.pdf", "b.pdf"):
+            crud.update_contract_status(session, db_contract.id, "failed")
+
+    # Percorre todas as páginas ordenando pelo nome
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "order_by": "filename", "fields": "status"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/contracts", params=params, headers=headers).json()
+        assert all(set(item) == {"id", "filename", "status"} for item in page["items"])
+        seen += [item["filename"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["a.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf"]
+
+    failed = client.get("/contracts", params={"status": "failed"}, headers=headers).json()
+    assert [item["filename"] for item in failed["items"]] == ["a.pdf", "b.pdf"]
+    assert failed["next_cursor"] is None
+
+    # Página sem mudanças: 304; depois de uma mudança, o ETag muda
+    first = client.get("/contracts", params={"limit": 2}, headers=headers)
+    etag = first.headers["etag"]
+    assert client.get("/contracts", params={"limit": 2}, headers={**headers, "If-None-Match": etag}).status_code == 304
+    crud.update_contract_status(session, first.json()["items"][0]["id"], "completed")
+    assert client.get("/contracts", params={"limit": 2}, headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    # Cursor de outra ordenação ou campos desconhecidos são recusados
+    id_cursor = first.json()["next_cursor"]
+    assert client.get("/contracts", params={"cursor": id_cursor, "order_by": "filename"}, headers=headers).status_code == 400
+    assert client.get("/contracts", params={"fields": "senha"}, headers=headers).status_code == 400
+
+    # O endpoint antigo continua devolvendo a lista completa
+    assert sorted(client.get("/contracts/list/filenames", headers=headers).json()) == seen
+
+def test_contract_detail_is_cached_with_etag(client: TestClient, session):
+    """O detalhe de um contrato concluído sai do cache, com ETag forte, até o crud alterá-lo."""
+    from app import cache, crud
+
+    client.post("/users/", json={"username": "detailuser", "password": "password123"})
+    token = client.post("/login", data={"username": "detailuser", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    db_contract = crud.create_contract(session, filename="detalhe.pdf")
+    data = schemas.ContractData(contracting_party="Empresa A", contracted_party=None, contract_value=None,
+                                main_obligations="Entregar", additional_data=None, termination_clause="Aviso")
+    crud.update_contract_with_data(session, db_contract.id, data)
+
+    first = client.get("/contracts/detalhe.pdf", headers=headers)
+    etag = first.headers["etag"]
+    assert first.json()["contracting_party"] == "Empresa A"
+    assert not etag.startswith("W/") and first.headers["cache-control"] == "private, no-cache"
+    revalidated = client.get("/contracts/detalhe.pdf", headers={**headers, "If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == etag
+    assert cache.detail_cache.stats()["hits"] == 1
+
+    # Uma alteração pelo crud invalida a resposta guardada
+    crud.update_contract_status(session, db_contract.id, "failed")
+    changed = client.get("/contracts/detalhe.pdf", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["status"] == "failed"
+    assert client.delete(f"/contracts/{db_contract.id}", headers=headers).status_code == 200
+    assert client.get("/contracts/detalhe.pdf", headers=headers).status_code == 404
+
+def test_verified_tokens_skip_the_user_lookup(client: TestClient, session, monkeypatch):
+    """Depois da primeira verificação, o token é atendido pelo cache até a senha mudar ou o usuário ser removido."""
+    from app import auth, crud_async
+
+    client.post("/users/", json={"username": "cacheuser", "password": "password123"})
+    token = client.post("/login", data={"username": "cacheuser", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    lookups = []
+    original_lookup = crud_async.get_user_by_username
+
+    async def counting_lookup(db, username):
+        lookups.append(username)
+        return await original_lookup(db, username)
+
+    monkeypatch.setattr(crud_async, "get_user_by_username", counting_lookup)
+
+    first = client.get("/users/me", headers=headers)
+    second = client.get("/users/me", headers=headers)
+    assert first.json()["username"] == second.json()["username"] == "cacheuser"
+    assert lookups == ["cacheuser"]  # Só a primeira requisição foi ao banco
+    assert 'auth;desc="miss"' in first.headers["server-timing"]
+    assert 'auth;desc="hit"' in second.headers["server-timing"]
+
+    stats = client.get("/stats", headers=headers).json()
+    assert stats["auth"]["hits"] == 2 and stats["auth"]["misses"] == 1
+    assert stats["requests"]["GET /users/me"]["count"] >= 2
+
+    # Trocar a senha descarta o usuário guardado no cache (com o hash antigo)
+    wrong = {"current_password": "errada", "new_password": "novasenha456"}
+    assert client.put("/users/me/password", headers=headers, json=wrong).status_code == 400
+    change = {"current_password": "password123", "new_password": "novasenha456"}
+    assert client.put("/users/me/password", headers=headers, json=change).status_code == 200
+    assert auth.token_cache.stats()["size"] == 0
+    assert client.post("/login", data={"username": "cacheuser", "password": "password123"}).status_code == 401
+    login = client.post("/login", data={"username": "cacheuser", "password": "novasenha456"})
+    assert login.status_code == 200
+
+    # O token de antes da troca foi revogado (mesmo sem o cache, o usuário ainda existe no banco)
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+    # Remover o usuário invalida o cache: o mesmo token volta a ser recusado
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+    assert client.delete("/users/me", headers=headers).json()["username"] == "cacheuser"
+    assert auth.token_cache.stats()["size"] == 0
+    assert client.get("/users/me", headers=headers).status_code == 401
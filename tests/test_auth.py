@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+from app import auth
+
+
+def test_password_hasher_runs_bcrypt_in_a_process_pool():
+    hasher = auth.PasswordHasher(workers=1, max_queue=1)
+    hashed = auth.get_password_hash("segredo")
+    try:
+        assert asyncio.run(hasher.run(auth.verify_and_update_password, "segredo", hashed)) == (True, None)
+        assert asyncio.run(hasher.run(auth.verify_and_update_password, "errada", hashed)) == (False, None)
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_rejects_when_the_queue_is_full():
+    hasher = auth.PasswordHasher(workers=0, max_queue=0)  # Capacidade: 1 hash por vez, sem fila
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(hasher.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(auth.PasswordHasherBusy):
+            await hasher.run(release.wait, 5)
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["pending"] == 0
+
+
+def test_login_returns_503_with_retry_after_when_hasher_is_full(client: TestClient, monkeypatch):
+    client.post("/users/", json={"username": "busyuser", "password": "password123"})
+    full = auth.PasswordHasher(workers=0, max_queue=0)
+    full._pending = full.capacity
+    monkeypatch.setattr(auth, "password_hasher", full)
+
+    response = client.post("/login", data={"username": "busyuser", "password": "password123"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(auth.PASSWORD_HASH_RETRY_AFTER)
+
+
+def test_login_rehashes_passwords_with_an_outdated_cost(client: TestClient, session):
+    from app import crud
+
+    client.post("/users/", json={"username": "oldhash", "password": "password123"})
+    user = crud.get_user_by_username(session, "oldhash")
+
+    # O hash guardado tem um custo menor que o BCRYPT_ROUNDS atual (gravado antes de o custo aumentar):
+    # o próximo login refaz o hash com o custo atual
+    old_rounds = auth.BCRYPT_ROUNDS - 1
+    user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=old_rounds).hash("password123")
+    session.add(user)
+    session.commit()
+    assert client.post("/login", data={"username": "oldhash", "password": "password123"}).status_code == 200
+
+    session.expire_all()
+    assert f"$2b${auth.BCRYPT_ROUNDS:02d}$" in crud.get_user_by_username(session, "oldhash").hashed_password
+    assert client.post("/login", data={"username": "oldhash", "password": "password123"}).status_code == 200
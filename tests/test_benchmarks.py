@@ -0,0 +1,35 @@
+import asyncio
+
+from app import database, utils, worker
+from benchmarks import suite, synthetic
+
+
+def test_compare_flags_regressions_in_the_direction_of_each_metric():
+    baseline = {"results": {"read": {"detail_rps": 1000.0}, "upload": {"e2e_p95_ms": 100.0, "contracts_s": 10.0}}}
+    current = {"results": {"read": {"detail_rps": 700.0}, "upload": {"e2e_p95_ms": 110.0, "contracts_s": 20.0}}}
+
+    rows = {row["metric"]: row for row in suite.compare(current, baseline, threshold=0.15)}
+    assert rows["read.detail_rps"]["regressed"]  # 30% menos requisições/s
+    assert not rows["upload.e2e_p95_ms"]["regressed"]  # 10% mais lento, dentro da margem
+    assert not rows["upload.contracts_s"]["regressed"]  # Melhorou
+    assert rows["read.detail_rps"]["change_pct"] == -30.0
+    assert "login.logins_s" not in rows  # Cenário que não rodou nas duas execuções
+
+
+def test_suite_runs_against_a_temporary_database(tmp_path):
+    params = dict(suite.PROFILES["quick"], uploads=3, llm_latency=0, llm_jitter=0, contracts=20, requests=20, concurrency=4)
+    engine, upload_dir = database.engine, utils.UPLOAD_DIR
+
+    results = asyncio.run(suite.run(params, ["upload", "read"]))
+
+    assert results["upload"]["failed"] == 0 and results["upload"]["llm_calls"] == 3
+    assert results["read"]["detail_rps"] > 0
+    # O ambiente do benchmark é desfeito no final
+    assert database.engine is engine and utils.UPLOAD_DIR == upload_dir and worker.pool is None
+
+
+def test_synthetic_docx_is_readable(tmp_path):
+    path = tmp_path / "sintetico.docx"
+    path.write_bytes(synthetic.build_docx(paragraphs=3))
+    text = utils.extract_pages_from_file(str(path))[0]
+    assert text.splitlines()[2].startswith("CLÁUSULA 3 - DAS OBRIGAÇÕES")
@@ -0,0 +1,130 @@
+import io
+import os
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import blobs, crud, crud_async
+
+from .conftest import engine
+
+CONTENT = b"%PDF-1.4 contrato original " + bytes(range(256)) * 4
+
+
+class NotFound(Exception):
+    response = {"Error": {"Code": "404"}}
+
+
+class FakeS3Client:
+    """Substituto local do cliente do boto3: só as chamadas usadas pelo S3BlobStore, com os objetos em memória."""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise NotFound()
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, "rb") as file:
+            self.objects[(Bucket, Key)] = file.read()
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(value) for value in Range.removeprefix("bytes=").split("-"))
+        body = io.BytesIO(self.objects[(Bucket, Key)][start:end + 1])
+        body.iter_chunks = lambda chunk_size: iter(lambda: body.read(chunk_size), b"")
+        return {"Body": body}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def auth_headers(client: TestClient) -> dict:
+    client.post("/users/", json={"username": "blobuser", "password": "password123"})
+    token = client.post("/login", data={"username": "blobuser", "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def upload(client: TestClient, headers: dict, filename: str) -> int:
+    response = client.post("/contracts/upload", headers=headers, files={"file": (filename, CONTENT, "application/pdf")})
+    assert response.status_code == 202
+    return response.json()["id"]
+
+
+def test_uploads_are_stored_once_and_served_with_ranges(client: TestClient, tmp_path):
+    headers = auth_headers(client)
+    first, second = upload(client, headers, "original.pdf"), upload(client, headers, "copia.pdf")
+
+    stored = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(stored) == 1  # Mesmo conteúdo, um único arquivo guardado
+
+    response = client.get(f"/contracts/{first}/file", headers=headers)
+    assert response.status_code == 200 and response.content == CONTENT
+    assert response.headers["content-type"] == "application/pdf"
+    assert "original.pdf" in response.headers["content-disposition"]
+
+    partial = client.get(f"/contracts/{first}/file", headers={**headers, "Range": "bytes=4-11"})
+    assert partial.status_code == 206 and partial.content == CONTENT[4:12]
+    etag = response.headers["etag"]
+    assert client.get(f"/contracts/{first}/file", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # O arquivo só é apagado depois do último contrato que aponta para ele, passado o prazo da limpeza
+    sha256 = etag.strip('"')
+    assert client.delete(f"/contracts/{first}", headers=headers).status_code == 200
+    assert client.get(f"/contracts/{second}/file", headers=headers).content == CONTENT
+    assert client.delete(f"/contracts/{second}", headers=headers).status_code == 200
+    assert blobs.store.exists(sha256)
+    assert client.get(f"/contracts/{second}/file", headers=headers).status_code == 404
+
+    # Um upload do mesmo conteúdo antes da limpeza reaproveita o arquivo, que deixa de ser apagado
+    third = upload(client, headers, "reenviado.pdf")
+    with Session(engine) as db:
+        assert crud.sweep_blobs(db, grace_seconds=0) == 0
+    assert client.get(f"/contracts/{third}/file", headers=headers).content == CONTENT
+
+    assert client.delete(f"/contracts/{third}", headers=headers).status_code == 200
+    with Session(engine) as db:
+        assert crud.sweep_blobs(db) == 0  # Ainda dentro do prazo
+        assert crud.sweep_blobs(db, grace_seconds=0) == 1
+    assert not blobs.store.exists(sha256)
+
+
+def test_s3_store_serves_ranges_through_the_api(client: TestClient, monkeypatch):
+    s3 = FakeS3Client()
+    monkeypatch.setattr(blobs, "store", blobs.S3BlobStore(bucket="contratos", prefix="originais/", client=s3))
+    headers = auth_headers(client)
+    contract_id = upload(client, headers, "nuvem.pdf")
+    assert len(s3.objects) == 1 and next(iter(s3.objects))[1].startswith("originais/")
+
+    full = client.get(f"/contracts/{contract_id}/file", headers=headers)
+    assert full.status_code == 200 and full.content == CONTENT
+    assert full.headers["accept-ranges"] == "bytes"
+
+    partial = client.get(f"/contracts/{contract_id}/file", headers={**headers, "Range": "bytes=-16"})
+    assert partial.status_code == 206 and partial.content == CONTENT[-16:]
+    assert partial.headers["content-range"] == f"bytes {len(CONTENT) - 16}-{len(CONTENT) - 1}/{len(CONTENT)}"
+    assert client.get(f"/contracts/{contract_id}/file", headers={**headers, "Range": "bytes=99999-"}).status_code == 416
+
+    monkeypatch.setattr(blobs, "BLOB_GC_GRACE_SECONDS", 0)  # Sem prazo: a própria deleção faz a limpeza
+    assert client.delete(f"/contracts/{contract_id}", headers=headers).status_code == 200
+    assert s3.objects == {}
+
+
+def test_failed_enqueue_removes_the_upload_and_the_new_blob(client: TestClient, tmp_path, monkeypatch):
+    headers = auth_headers(client)
+    response = client.post("/contracts/upload", headers=headers, files={"file": ("disputado.pdf", b"%PDF-1.4 outro", "application/pdf")})
+    assert response.status_code == 202
+
+    # Corrida: o outro envio com o mesmo nome grava o contrato depois da verificação do nome
+    async def no_contract(db, filename):
+        return None
+
+    monkeypatch.setattr(crud_async, "get_contract_by_filename", no_contract)
+    monkeypatch.setattr(blobs, "BLOB_GC_GRACE_SECONDS", 0)
+    response = client.post("/contracts/upload", headers=headers, files={"file": ("disputado.pdf", CONTENT, "application/pdf")})
+    assert response.status_code == 400
+
+    stored = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(stored) == 1  # Só o original do primeiro envio
+    assert len([name for _, _, names in os.walk(tmp_path / "uploads") for name in names]) == 1  # Só o primeiro envio
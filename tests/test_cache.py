@@ -0,0 +1,88 @@
+from app import processing, schemas
+from app.cache import ContentCache, DetailCache, MemoryCache, SQLiteCache
+
+
+def test_memory_cache_evicts_least_recently_used():
+    """Testa se o cache LRU remove o item usado há mais tempo ao passar do limite."""
+    cache = MemoryCache(max_entries=2, ttl=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "a" passa a ser o mais recente
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_memory_cache_expires_items(monkeypatch):
+    """Testa se os itens vencidos (TTL) deixam de ser retornados."""
+    now = [1000.0]
+    monkeypatch.setattr("app.cache.time.time", lambda: now[0])
+    cache = MemoryCache(max_entries=10, ttl=60)
+    cache.set("a", 1)
+    now[0] += 61
+    assert cache.get("a") is None
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    """Testa se duas instâncias (como dois workers do gunicorn) enxergam o mesmo cache em disco."""
+    path = str(tmp_path / "cache.db")
+    SQLiteCache(path, ttl=0).set("analysis:abc", {"contract_value": "R$ 10"})
+    other = SQLiteCache(path, ttl=0)
+    assert other.get("analysis:abc") == {"contract_value": "R$ 10"}
+    assert other.delete_prefix("analysis:") == 1
+    assert other.get("analysis:abc") is None
+
+
+def test_detail_cache_skips_reads_started_before_an_invalidation(tmp_path):
+    """Uma leitura do banco anterior à alteração não pode gravar a versão antiga no cache."""
+    entry = {"id": 1, "filename": "a.pdf", "status": "completed", "body": "{}", "etag": '"x"'}
+    cache = DetailCache(SQLiteCache(str(tmp_path / "cache.db"), ttl=0))
+
+    generation = cache.generation()
+    cache.invalidate(1, "a.pdf")  # O worker gravou no meio da leitura
+    cache.set(entry, generation)
+    assert cache.get("a.pdf") is None
+
+    cache.set(entry, cache.generation())
+    assert cache.get("a.pdf") == entry
+    cache.set({**entry, "id": 2, "filename": "b.pdf", "status": "processing"}, cache.generation())
+    assert cache.get("b.pdf") is None  # Contratos em análise não entram
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_analysis_is_reused_for_same_file_content(tmp_path, monkeypatch):
+    """Testa se o mesmo conteúdo, enviado com outro nome, não paga de novo a extração nem a IA."""
+    calls = {"extract": 0, "llm": 0}
+
+    def fake_extract(file_path: str, file_hash: str | None = None) -> list[str]:
+        calls["extract"] += 1
+        return ["Contrato de prestação de serviços."]
+
+    def fake_chain(document_text: str, llm=None) -> schemas.ContractData:
+        calls["llm"] += 1
+        return schemas.ContractData(
+            contracting_party="Empresa Teste SA", contracted_party="Fornecedor", contract_value=None,
+            main_obligations="Prestar serviços.", additional_data=None, termination_clause="Multa de 10%.",
+        )
+
+    cache = ContentCache(MemoryCache(max_entries=10, ttl=0))
+    monkeypatch.setattr("app.utils.extract_pages_from_file", fake_extract)
+    monkeypatch.setattr(processing, "run_analysis_chain", fake_chain)
+    monkeypatch.setattr(processing, "content_cache", cache)
+
+    for name in ("contrato_v1.pdf", "contrato_copia.pdf"):
+        path = tmp_path / name
+        path.write_bytes(b"%PDF mesmo conteudo")
+        result = processing.analyze_contract_with_ai(str(path))
+        assert result.contracting_party == "Empresa Teste SA"
+
+    assert calls == {"extract": 1, "llm": 1}
+    stats = cache.stats()["namespaces"]
+    assert stats["pages"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert stats["analysis"]["hits"] == 1
+
+    # Invalidar a análise força uma nova chamada à IA, mas o texto continua em cache
+    cache.invalidate("analysis")
+    processing.analyze_contract_with_ai(str(tmp_path / "contrato_v1.pdf"))
+    assert calls == {"extract": 1, "llm": 2}
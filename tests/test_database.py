@@ -0,0 +1,26 @@
+from sqlalchemy import text
+
+from app import database
+
+from .conftest import engine
+
+
+def test_async_url_uses_async_drivers():
+    assert database.async_url("sqlite:///database.db") == "sqlite+aiosqlite:///database.db"
+    assert database.async_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert database.async_url("postgres://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert database.async_url("postgresql+psycopg2://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+
+
+def test_sqlite_pragmas_are_applied_on_connect(session):
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+
+def test_pool_options_are_only_used_outside_sqlite():
+    assert "pool_size" not in database.engine_options("sqlite:///database.db")
+    options = database.engine_options("postgresql://u:p@host/db")
+    assert options["pool_size"] == database.DB_POOL_SIZE
+    assert options["pool_recycle"] == database.DB_POOL_RECYCLE
+    assert options["pool_pre_ping"] == database.DB_POOL_PRE_PING
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app import database, events, models, processing, utils, worker
+from app.cache import ContentCache
+from benchmarks.fake_llm import FakeContractLLM
+
+from .test_processing import long_contract_pages
+
+
+@pytest.fixture(autouse=True)
+def fresh_broker(monkeypatch):
+    # Histórico e assinantes novos a cada teste (os ids dos contratos se repetem entre testes)
+    monkeypatch.setattr(events, "broker", events.EventBroker())
+    monkeypatch.setattr(events, "EVENTS_RELAY", "memory")
+
+
+def auth_headers(client: TestClient) -> dict:
+    client.post("/users/", json={"username": "eventsuser", "password": "password123"})
+    token = client.post("/login", data={"username": "eventsuser", "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def parse_stream(body: str) -> list[dict]:
+    """Eventos de um corpo text/event-stream (ignora o retry e os comentários de keep-alive)."""
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":") and ": " in line)
+        if "event" in fields:
+            parsed.append({**json.loads(fields["data"]), "sse_id": fields.get("id")})
+    return parsed
+
+
+def test_stream_reports_every_stage_of_the_analysis(client: TestClient, session, monkeypatch):
+    headers = auth_headers(client)
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    monkeypatch.setattr(utils, "extract_pages_from_file", lambda file_path, file_hash=None: ["CLÁUSULA 1 - DO OBJETO.", "CLÁUSULA 2 - DO PREÇO."])
+    processing.set_analyzer(processing.ContractAnalyzer(FakeContractLLM()))
+    try:
+        files = {"file": ("progresso.pdf", b"conteudo", "application/pdf")}
+        contract_id = client.post("/contracts/upload", headers=headers, files=files).json()["id"]
+        assert worker.process_next_job(session) is True
+    finally:
+        processing.set_analyzer(None)
+
+    # Quem conecta depois da análise recebe todas as etapas e o stream termina no "persisted"
+    response = client.get(f"/contracts/{contract_id}/events", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    received = parse_stream(response.text)
+    assert [event["stage"] for event in received] == ["received", "extracted", "llm_started", "analyzed", "persisted"]
+    assert received[1]["pages"] == 2
+    assert received[2]["chunks"] == 1
+
+    # Reconexão com Last-Event-ID: só o que veio depois
+    resumed = client.get(f"/contracts/{contract_id}/events", headers={**headers, "Last-Event-ID": received[2]["sse_id"]})
+    assert [event["stage"] for event in parse_stream(resumed.text)] == ["analyzed", "persisted"]
+
+    assert client.get("/contracts/999/events", headers=headers).status_code == 404
+    assert client.get(f"/contracts/{contract_id}/events").status_code == 401
+
+
+def test_stream_delivers_live_events_from_worker_threads(client: TestClient, session):
+    headers = auth_headers(client)
+    contract_id = client.post("/contracts/upload", headers=headers,
+                              files={"file": ("ao_vivo.pdf", b"conteudo", "application/pdf")}).json()["id"]
+
+    def analysis():  # Imita um worker em outra thread, publicando depois que o cliente se inscreveu
+        deadline = time.monotonic() + 5
+        while events.broker.subscriber_count(contract_id) == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for number in (1, 2):
+            events.publish(contract_id, "chunk_done", chunk=number, done=number, chunks=2)
+        events.publish(contract_id, "failed", status="failed", error="Cota da IA excedida")
+
+    publisher = threading.Thread(target=analysis)
+    publisher.start()
+    response = client.get(f"/contracts/{contract_id}/events", headers=headers)
+    publisher.join()
+
+    stages = [(event["stage"], event.get("chunk")) for event in parse_stream(response.text)]
+    assert stages == [("received", None), ("chunk_done", 1), ("chunk_done", 2), ("failed", None)]
+    assert events.broker.subscriber_count() == 0  # O assinante sai quando o stream termina
+
+
+def test_chunked_analysis_emits_progress_per_chunk(monkeypatch):
+    monkeypatch.setattr(processing, "LLM_CHUNK_MAX_TOKENS", 1500)
+    pages = long_contract_pages()
+    chunk_count = len(processing.split_into_chunks(pages))
+
+    token = events.current_contract.set(42)
+    try:
+        processing.run_chunked_analysis(pages, llm=FakeContractLLM(), concurrency=3)
+    finally:
+        events.current_contract.reset(token)
+    processing.run_chunked_analysis(pages[:1], llm=FakeContractLLM())  # Fora de uma análise: nada é publicado
+
+    async def collect():
+        return events.broker.subscribe(42).replay
+
+    replay = asyncio.run(collect())
+    assert replay[0]["stage"] == "llm_started" and replay[0]["chunks"] == chunk_count
+    assert sorted(event["chunk"] for event in replay[1:]) == list(range(1, chunk_count + 1))
+    assert [event["done"] for event in replay[1:]] == list(range(1, chunk_count + 1))
+
+
+def test_slow_subscribers_are_disconnected_without_blocking_others():
+    broker = events.EventBroker(queue_size=4)
+
+    async def scenario():
+        slow = broker.subscribe(7)
+        fast = broker.subscribe(7)
+        received = []
+        for n in range(10):
+            broker.publish({"contract_id": 7, "stage": "chunk_done", "chunk": n})
+            received.append((await fast.get())["chunk"])
+        return slow, received
+
+    slow, received = asyncio.run(scenario())
+    assert received == list(range(10))
+    assert slow.lagged
+    assert broker.stats()["lagged_disconnects"] == 1
+
+
+def test_database_relay_forwards_events_from_other_processes(session, monkeypatch):
+    from .conftest import async_session_factory
+
+    monkeypatch.setattr(events, "EVENTS_RELAY", "database")
+
+    async def scenario():
+        relay = asyncio.create_task(events.relay_from_database(async_session_factory, poll_interval=0.01))
+        await asyncio.sleep(0.05)  # O relay começa a ler a partir do último evento já gravado
+        subscription = events.broker.subscribe(5)
+        # Linhas gravadas por um worker em outro processo e por este mesmo processo
+        session.add(models.ContractEvent(contract_id=5, stage="extracted", data=json.dumps({"pages": 3}), origin="outro-processo"))
+        session.add(models.ContractEvent(contract_id=5, stage="analyzed", data="{}", origin=events.INSTANCE_ID))
+        session.add(models.ContractEvent(contract_id=5, stage="persisted", data="{}", origin="outro-processo"))
+        session.commit()
+        received = [await asyncio.wait_for(subscription.get(), timeout=5) for _ in range(2)]
+        relay.cancel()
+        return received
+
+    received = asyncio.run(scenario())
+    # Os eventos do próprio processo já foram entregues na hora, então o relay não os repete
+    assert [(event["stage"], event.get("pages")) for event in received] == [("extracted", 3), ("persisted", None)]
+    # O id do SSE é o da linha, igual em qualquer processo (o Last-Event-ID funciona depois de trocar de processo)
+    rows = session.exec(select(models.ContractEvent).where(models.ContractEvent.origin == "outro-processo")).all()
+    assert [event["id"] for event in received] == [row.id for row in sorted(rows, key=lambda row: row.id)]
+
+
+def test_database_relay_delivers_rows_committed_out_of_order(session, monkeypatch):
+    """No Postgres um id menor pode ser gravado depois de um maior: o relay volta a procurar os ids pulados."""
+    from .conftest import async_session_factory
+
+    monkeypatch.setattr(events, "EVENTS_RELAY", "database")
+
+    async def scenario():
+        relay = asyncio.create_task(events.relay_from_database(async_session_factory, poll_interval=0.01))
+        await asyncio.sleep(0.05)
+        subscription = events.broker.subscribe(8)
+        # A transação do id 2 termina depois da do id 3
+        session.add(models.ContractEvent(id=1, contract_id=8, stage="received", data="{}", origin="outro-processo"))
+        session.add(models.ContractEvent(id=3, contract_id=8, stage="analyzed", data="{}", origin="outro-processo"))
+        session.commit()
+        received = [await asyncio.wait_for(subscription.get(), timeout=5) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        session.add(models.ContractEvent(id=2, contract_id=8, stage="persisted", data="{}", origin="outro-processo"))
+        session.commit()
+        received.append(await asyncio.wait_for(subscription.get(), timeout=5))
+        relay.cancel()
+        return received
+
+    received = asyncio.run(scenario())
+    assert [(event["id"], event["stage"]) for event in received] == [(1, "received"), (3, "analyzed"), (2, "persisted")]
+
+
+def test_database_relay_uses_row_ids_for_local_events(session, monkeypatch):
+    from .conftest import engine
+
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(events, "EVENTS_RELAY", "database")
+    events.publish(7, "received", filename="a.pdf")
+    events.publish(7, "extracted", pages=1)
+
+    rows = session.exec(select(models.ContractEvent).where(models.ContractEvent.contract_id == 7).order_by(models.ContractEvent.id)).all()
+    assert [event["id"] for event in events.broker._history[7]] == [row.id for row in rows]
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app import crud, export, migrations, models, schemas
+
+from .conftest import engine
+
+DATA = schemas.ContractData(contracting_party="ACME LTDA", contracted_party="Fornecedora S.A.",
+                            contract_value="R$ 1.500,00", main_obligations="Prestar serviços, com \"aspas\"\ne quebra de linha",
+                            additional_data=None, termination_clause="Aviso prévio de 30 dias")
+
+
+def auth_headers(client: TestClient) -> dict:
+    client.post("/users/", json={"username": "exportuser", "password": "password123"})
+    token = client.post("/login", data={"username": "exportuser", "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def contracts(session, count: int) -> list[int]:
+    """Contratos concluídos, menos o último, que fica em "processing"."""
+    ids = []
+    for index in range(count):
+        contract = crud.create_contract(session, f"export_{index}.pdf")
+        if index < count - 1:
+            crud.update_contract_with_data(session, contract.id, DATA)
+        ids.append(contract.id)
+    return ids
+
+
+def test_export_streams_ndjson_and_csv_with_filters(client: TestClient, session, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)  # Vários lotes do cursor numa só resposta
+    ids = contracts(session, 5)
+    headers = auth_headers(client)
+
+    response = client.get("/contracts/export", params={"status": "completed"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "contracts.ndjson" in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == ids[:4]
+    assert rows[0]["contract_value"] == "R$ 1.500,00" and rows[0]["value_cents"] == 150000
+    assert rows[0]["updated_at"] is not None
+
+    table = client.get("/contracts/export", params={"format": "csv", "fields": "filename,main_obligations"},
+                       headers=headers)
+    assert table.headers["content-type"] == "text/csv; charset=utf-8"
+    parsed = list(csv.reader(io.StringIO(table.text)))
+    assert parsed[0] == ["id", "filename", "main_obligations"]
+    assert len(parsed) == 6 and parsed[1][2] == DATA.main_obligations  # Aspas e quebras de linha escapadas
+
+    # Incremental: só o que mudou desde o último envio
+    old = datetime.now(timezone.utc) - timedelta(days=2)
+    with engine.begin() as connection:
+        connection.execute(update(models.Contract).where(models.Contract.id.in_(ids[:3])).values(updated_at=old))
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+    recent = client.get("/contracts/export", params={"updated_since": since}, headers=headers)
+    assert [json.loads(line)["id"] for line in recent.text.splitlines()] == ids[3:]
+
+    assert client.get("/contracts/export", params={"fields": "senha"}, headers=headers).status_code == 400
+    assert client.get("/contracts/export", params={"format": "xlsx"}, headers=headers).status_code == 422
+
+
+def test_migration_stamps_contracts_without_updated_at(session):
+    ids = contracts(session, 2)
+    with engine.begin() as connection:
+        connection.execute(update(models.Contract).where(models.Contract.id == ids[0]).values(updated_at=None))
+
+    assert migrations.backfill_updated_at(engine) == 1
+    assert migrations.backfill_updated_at(engine) == 0
+
+
+def test_export_parquet_in_row_groups(client: TestClient, session, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(export, "EXPORT_PARQUET_ROW_GROUP", 3)
+    ids = contracts(session, 7)
+
+    response = client.get("/contracts/export", params={"format": "parquet"}, headers=auth_headers(client))
+    assert response.status_code == 200
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet.metadata.num_rows == 7 and parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("id").to_pylist() == ids
+    assert table.schema.field("start_date").type == "date32[day]"
+    assert table.column("status").to_pylist()[-1] == "processing"
+    assert table.column("value_cents").to_pylist()[-1] is None
@@ -0,0 +1,236 @@
+import time
+from contextlib import nullcontext
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app import cache, crud, extraction, processing, utils, worker
+from app.cache import ContentCache, MemoryCache
+from benchmarks.fake_llm import FakeContractLLM
+from benchmarks.synthetic import build_docx, build_pdf
+
+
+@pytest.fixture(name="pdf_path")
+def pdf_path_fixture(tmp_path):
+    path = tmp_path / "contrato.pdf"
+    path.write_bytes(build_pdf(pages=20, lines_per_page=2))
+    return str(path)
+
+
+def test_parallel_extraction_matches_serial(pdf_path):
+    """Testa se a extração em paralelo (faixas de páginas) devolve as mesmas páginas, na mesma ordem."""
+    serial = extraction.extract_pdf_pages(pdf_path, workers=0)
+    try:
+        parallel = extraction.extract_pdf_pages(pdf_path, workers=2)
+    finally:
+        extraction.shutdown()
+
+    assert len(serial) == 20
+    assert parallel == serial
+    assert serial[0].startswith("CLÁUSULA 1 ")
+    assert serial[19].startswith("CLÁUSULA 39 ")
+    assert utils.extract_text_from_pdf(pdf_path) == "".join(f"{page}\n" for page in serial)
+
+
+def test_slow_page_times_out_without_stalling_the_others(pdf_path, monkeypatch):
+    """Testa se uma página que passa do limite vira texto vazio e as demais continuam sendo extraídas."""
+    class SlowPageBackend(extraction.PyPDF2Backend):
+        def extract_pages(self, view, start, end):
+            for index, extract in enumerate(super().extract_pages(view, start, end), start=start):
+                yield (lambda: time.sleep(5)) if index == 1 else extract
+
+    monkeypatch.setitem(extraction.BACKENDS, "slow", SlowPageBackend())
+
+    start = time.perf_counter()
+    pages = extraction._extract_range("slow", pdf_path, 0, 3, page_timeout=0.2)
+
+    assert time.perf_counter() - start < 2
+    assert pages[1] == ""
+    assert pages[0].startswith("CLÁUSULA 1 ") and pages[2].startswith("CLÁUSULA 5 ")
+
+
+def test_unknown_backend_is_rejected(pdf_path):
+    with pytest.raises(ValueError):
+        extraction.extract_pdf_pages(pdf_path, backend="ocr-magico")
+
+
+class FakeOCRBackend:
+    """OCR simulado: devolve um texto por página e registra quais páginas foram lidas."""
+
+    name = "fake-ocr"
+
+    def __init__(self):
+        self.pages = []
+
+    def open(self, file_path):
+        return nullcontext(file_path)
+
+    def extract_pages(self, file_path, start, end):
+        for index in range(start, end):
+            def extract(index=index):
+                self.pages.append(index)
+                return f"CLÁUSULA ESCANEADA {index + 1} - texto lido pelo OCR."
+            yield extract
+
+
+def test_only_pages_without_text_go_through_ocr(tmp_path, monkeypatch):
+    """Páginas com camada de texto seguem no caminho rápido; só as escaneadas passam pelo OCR, com cache por página."""
+    path = tmp_path / "escaneado.pdf"
+    path.write_bytes(build_pdf(pages=4, lines_per_page=2, blank_pages=(1, 3)))
+    ocr = FakeOCRBackend()
+    monkeypatch.setitem(extraction.BACKENDS, ocr.name, ocr)
+    monkeypatch.setattr(cache, "content_cache", ContentCache(MemoryCache()))
+    before = REGISTRY.get_sample_value("extraction_pages_total", {"mode": "ocr"}) or 0.0
+
+    pages = extraction.extract_pdf_pages(str(path), workers=0, ocr=ocr.name)
+
+    assert ocr.pages == [1, 3]
+    assert pages[0].startswith("CLÁUSULA 1 ") and pages[2].startswith("CLÁUSULA 5 ")
+    assert pages[1] == "CLÁUSULA ESCANEADA 2 - texto lido pelo OCR."
+    assert REGISTRY.get_sample_value("extraction_pages_total", {"mode": "ocr"}) == before + 2
+
+    # Reenvio do mesmo arquivo: as páginas escaneadas vêm do cache, sem refazer o OCR
+    assert extraction.extract_pdf_pages(str(path), workers=0, ocr=ocr.name) == pages
+    assert ocr.pages == [1, 3]
+
+
+def test_ocr_cache_uses_the_hash_the_caller_already_has(tmp_path, monkeypatch):
+    path = tmp_path / "escaneado.pdf"
+    path.write_bytes(build_pdf(pages=2, lines_per_page=2, blank_pages=(1,)))
+    monkeypatch.setitem(extraction.BACKENDS, "fake-ocr", FakeOCRBackend())
+    monkeypatch.setattr(cache, "content_cache", ContentCache(MemoryCache()))
+
+    def no_rehash(file_path):
+        raise AssertionError("O arquivo não deveria ser lido de novo só para o hash")
+
+    monkeypatch.setattr(utils, "file_sha256", no_rehash)
+    pages = extraction.extract_pdf_pages(str(path), workers=0, ocr="fake-ocr", file_hash="abc123")
+    assert pages[1] == "CLÁUSULA ESCANEADA 2 - texto lido pelo OCR."
+    assert cache.content_cache.get("ocr", f"abc123:1:fake-ocr:{'+'.join(extraction.OCR_LANGUAGES)}") == pages[1]
+
+
+def test_timeout_only_kills_the_stuck_process(pdf_path):
+    """Só o processo preso é encerrado: as tarefas dos outros uploads no mesmo pool terminam normalmente."""
+    pool = extraction.WorkerPool(2)
+    try:
+        assert pool.submit(time.sleep, 0).result(timeout=60) is None  # Processos do pool já iniciados
+        stuck = pool.submit(time.sleep, 60)
+        other = pool.submit(time.sleep, 1)
+        time.sleep(0.5)
+        assert pool.kill([stuck]) == 1
+        assert other.result(timeout=30) is None
+        # O Pool repõe o processo encerrado e continua atendendo
+        page = pool.submit(extraction._extract_range_timed, "pypdf2", pdf_path, 0, 1, 0).result(timeout=60)
+        assert page[0][0].startswith("CLÁUSULA 1 ")
+        assert not stuck.done()
+    finally:
+        pool.close()
+
+
+def test_ranges_that_miss_the_deadline_fail_the_extraction(pdf_path, monkeypatch):
+    class StuckPool:
+        killed = []
+
+        def submit(self, function, *args):
+            return extraction.Future()  # Nunca termina
+
+        def kill(self, futures):
+            self.killed.extend(futures)
+            return len(futures)
+
+    monkeypatch.setattr(extraction, "_get_pool", lambda kind="text": StuckPool())
+    monkeypatch.setattr(extraction, "PDF_PARALLEL_MIN_PAGES", 1)
+    with pytest.raises(extraction.ExtractionError, match="não terminaram"):
+        extraction._extract_parallel("pypdf2", pdf_path, total=4, workers=2, page_timeout=0.01)
+    assert len(StuckPool.killed) == 4
+
+
+def test_document_without_text_fails_before_the_llm(session, tmp_path, monkeypatch):
+    """Um PDF sem texto (e sem OCR disponível) falha na extração, sem chamar a IA."""
+    path = tmp_path / "em_branco.pdf"
+    path.write_bytes(build_pdf(pages=2, blank_pages=(0, 1)))
+    monkeypatch.setattr(extraction, "PDF_WORKERS", 0)
+    monkeypatch.setattr(extraction, "OCR_BACKEND", "none")
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    llm = FakeContractLLM()
+    processing.set_analyzer(processing.ContractAnalyzer(llm))
+    contract = crud.create_contract(session, "em_branco.pdf")
+    try:
+        error = worker.analyze_contract_file(session, contract.id, str(path))
+    finally:
+        processing.set_analyzer(None)
+
+    assert error == "Nenhum texto encontrado no documento (nem pelo OCR)."
+    assert llm.calls == 0
+    session.refresh(contract)
+    assert contract.status == "failed"
+
+
+def test_docx_extraction_includes_tables_headers_and_footers(tmp_path):
+    """O DOCX é lido em streaming, na ordem do documento, sem perder tabelas, cabeçalhos e rodapés."""
+    path = tmp_path / "com_tabela.docx"
+    path.write_bytes(build_docx(paragraphs=2, table_rows=2, header="CONFIDENCIAL", footer="Rescisão: ver cláusula 4"))
+
+    blocks = extraction.iter_docx_text(str(path))
+    assert next(blocks) == "CONFIDENCIAL"  # Gerador: os blocos saem aos poucos
+    assert list(blocks)[2:] == [
+        "Item | Descrição | Valor",
+        "1 | Serviço de manutenção 1 | R$ 1.000,00",
+        "2 | Serviço de manutenção 2 | R$ 2.000,00",
+        "Rescisão: ver cláusula 4",
+    ]
+    text = utils.extract_text_from_docx(str(path))
+    assert text.splitlines()[1].startswith("CLÁUSULA 1 - DO OBJETO")
+
+
+def test_docx_is_split_into_pages_and_corrupt_files_fail_with_the_cause(session, tmp_path, monkeypatch):
+    """O DOCX chega ao restante do pipeline em páginas limitadas; um arquivo inválido falha com o motivo real."""
+    path = tmp_path / "longo.docx"
+    path.write_bytes(build_docx(paragraphs=40, table_rows=5))
+    pages = extraction.docx_pages(str(path), max_chars=500)
+    assert len(pages) > 1 and all(len(page) <= 500 for page in pages)
+    assert "".join(f"{page}\n" for page in pages) == "\n".join(extraction.iter_docx_text(str(path))) + "\n"
+
+    corrupt = tmp_path / "corrompido.docx"
+    corrupt.write_bytes(b"PK\x03\x04 isto nao e um zip")
+    with pytest.raises(extraction.ExtractionError):
+        utils.extract_pages_from_file(str(corrupt))
+
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    contract = crud.create_contract(session, "corrompido.docx")
+    error = worker.analyze_contract_file(session, contract.id, str(corrupt))
+    assert error.startswith("Não foi possível ler o DOCX")
+    session.refresh(contract)
+    assert contract.status == "failed"
+
+
+def test_unreadable_pdfs_fail_with_the_cause_without_ocr(session, tmp_path, monkeypatch):
+    """PDFs corrompidos ou protegidos por senha não viram "documento vazio" nem passam pelo OCR."""
+    import io
+
+    from PyPDF2 import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for page in PdfReader(io.BytesIO(build_pdf(pages=2))).pages:
+        writer.add_page(page)
+    writer.encrypt("senha")
+    protected = tmp_path / "protegido.pdf"
+    with open(protected, "wb") as file:
+        writer.write(file)
+    corrupt = tmp_path / "corrompido.pdf"
+    corrupt.write_bytes(b"%PDF-1.4 sem o resto do arquivo")
+
+    def no_ocr(*args, **kwargs):
+        raise AssertionError("O OCR não deveria rodar")
+
+    monkeypatch.setattr(extraction, "_ocr_pages", no_ocr)
+    monkeypatch.setattr(extraction, "PDF_WORKERS", 0)
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    with pytest.raises(extraction.ExtractionError, match="protegido por senha"):
+        utils.extract_pages_from_file(str(protected))
+
+    contract = crud.create_contract(session, "corrompido.pdf")
+    error = worker.analyze_contract_file(session, contract.id, str(corrupt))
+    assert error.startswith("Não foi possível ler o PDF")
+    session.refresh(contract)
+    assert contract.status == "failed"
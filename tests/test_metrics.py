@@ -0,0 +1,88 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app import logs, processing, utils, worker
+from app.cache import ContentCache
+from benchmarks.fake_llm import FakeContractLLM
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def auth_headers(client: TestClient) -> dict:
+    client.post("/users/", json={"username": "metricsuser", "password": "password123"})
+    token = client.post("/login", data={"username": "metricsuser", "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_metrics_endpoint_reports_requests_and_db_calls(client: TestClient):
+    headers = auth_headers(client)
+    before = sample("http_requests_total", method="GET", route="/contracts/{contract_id}/status", status="404")
+    calls_before = sample("db_operation_seconds_count", operation="crud_async.get_contract")
+
+    response = client.get("/contracts/42/status", headers={**headers, "X-Request-ID": "req-123"})
+    assert response.status_code == 404
+    assert response.headers["x-request-id"] == "req-123"  # O id do proxy é mantido
+    assert len(client.get("/", headers={"X-Request-ID": "id com espaco; e mais"}).headers["x-request-id"]) == 32
+
+    metrics_response = client.get("/metrics")
+    assert metrics_response.status_code == 200
+    assert metrics_response.headers["content-type"].startswith("text/plain")
+    body = metrics_response.text
+    assert 'route="/contracts/{contract_id}/status"' in body  # Rota pelo modelo, não pelo caminho
+    assert "db_pool_connections" in body
+    assert sample("http_requests_total", method="GET", route="/contracts/{contract_id}/status", status="404") == before + 1
+    assert sample("db_operation_seconds_count", operation="crud_async.get_contract") == calls_before + 1
+
+
+def test_analysis_stages_are_measured(client: TestClient, session, monkeypatch):
+    headers = auth_headers(client)
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    monkeypatch.setattr(utils.extraction, "extract_pdf_pages", lambda file_path, file_hash=None: ["CLÁUSULA 1 - DO OBJETO. Valor: R$ 1.000,00."])
+    processing.set_analyzer(processing.ContractAnalyzer(FakeContractLLM()))
+    before = {
+        "upload": sample("upload_receive_seconds_count", endpoint="upload"),
+        "extract": sample("extraction_seconds_count", format="pdf"),
+        "llm": sample("llm_call_seconds_count", outcome="ok"),
+        "tokens": sample("llm_tokens_count", direction="prompt"),
+        "analysis": sample("analysis_seconds_count", status="completed"),
+        "persist": sample("db_operation_seconds_count", operation="crud.update_contract_with_data"),
+    }
+    try:
+        files = {"file": ("medido.pdf", b"conteudo", "application/pdf")}
+        assert client.post("/contracts/upload", headers=headers, files=files).status_code == 202
+        assert worker.process_next_job(session) is True
+    finally:
+        processing.set_analyzer(None)
+
+    assert sample("upload_receive_seconds_count", endpoint="upload") == before["upload"] + 1
+    assert sample("extraction_seconds_count", format="pdf") == before["extract"] + 1
+    assert sample("llm_call_seconds_count", outcome="ok") == before["llm"] + 1
+    assert sample("llm_tokens_count", direction="prompt") == before["tokens"] + 1
+    assert sample("analysis_seconds_count", status="completed") == before["analysis"] + 1
+    assert sample("db_operation_seconds_count", operation="crud.update_contract_with_data") == before["persist"] + 1
+    assert sample("llm_calls_in_flight") == 0 and sample("analyses_in_flight") == 0
+
+
+def test_json_logs_carry_the_correlation_ids():
+    formatter = logs.JSONFormatter()
+    record = logging.LogRecord("app.worker", logging.INFO, __file__, 1, "Iniciando análise", None, None)
+    record.pages = 3  # Campo passado em "extra"
+
+    request_token = logs.request_id.set("abc123")
+    contract_token = logs.current_contract.set(7)
+    try:
+        entry = json.loads(formatter.format(record))
+    finally:
+        logs.current_contract.reset(contract_token)
+        logs.request_id.reset(request_token)
+
+    assert entry["message"] == "Iniciando análise"
+    assert entry["level"] == "INFO" and entry["logger"] == "app.worker"
+    assert entry["request_id"] == "abc123" and entry["contract_id"] == 7
+    assert entry["pages"] == 3
+    assert "request_id" not in json.loads(formatter.format(record))
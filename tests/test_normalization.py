@@ -0,0 +1,124 @@
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlmodel import create_engine, inspect, text
+
+from app import crud, migrations, normalization, schemas
+
+
+def test_parse_amount_handles_brazilian_formats():
+    assert normalization.parse_amount("R$ 1.500.000,00 (um milhão e quinhentos mil reais)") == (150_000_000, "BRL")
+    assert normalization.parse_amount("R$ 2,5 milhões") == (250_000_000, "BRL")
+    assert normalization.parse_amount("US$ 10,000.50") == (1_000_050, "USD")
+    assert normalization.parse_amount("350 mil reais") == (35_000_000, "BRL")
+    # Parcelas e total: fica o maior valor
+    assert normalization.parse_amount("R$ 10.000,00 mensais, totalizando R$ 120.000,00") == (12_000_000, "BRL")
+    # Números que não são dinheiro são ignorados
+    assert normalization.parse_amount("Conforme cláusula 5, prazo de 12 meses") == (None, None)
+    assert normalization.parse_amount("Não identificado") == (None, None)
+
+
+def test_parse_dates_and_duration():
+    assert normalization.parse_dates("Vigência de 01/02/2024 a 31/01/2025") == (date(2024, 2, 1), date(2025, 1, 31))
+    assert normalization.parse_dates("Assinado em 15 de março de 2023, vigência de 2 anos") == (date(2023, 3, 15), date(2025, 3, 15))
+    assert normalization.parse_dates("Início em 31/01/2024, prazo de 1 mês") == (date(2024, 1, 31), date(2024, 2, 29))
+    assert normalization.parse_dates("Data inválida 31/02/2024") == (None, None)
+
+
+def test_party_key_prefers_valid_cnpj():
+    assert normalization.party_key("Empresa Alfa S.A., CNPJ 11.222.333/0001-81") == "11222333000181"
+    assert normalization.party_key("EMPRESA ALFA S/A") == normalization.party_key("Empresa Alfa SA") == "EMPRESA ALFA SA"
+    assert normalization.party_key("Construções Ômega Ltda.") == "CONSTRUCOES OMEGA LTDA"
+    # CNPJ com dígito verificador errado não é usado como identificador
+    assert normalization.party_key("Beta Ltda CNPJ 11.222.333/0001-82") == "BETA LTDA"
+    assert normalization.party_key("Não identificado") is None
+
+
+def make_contract(session, filename: str, contracted: str, value: str | None, additional: str | None = None):
+    db_contract = crud.create_contract(session, filename=filename)
+    data = schemas.ContractData(
+        contracting_party="Prefeitura Municipal", contracted_party=contracted, contract_value=value,
+        main_obligations="Prestação de serviços.", additional_data=additional, termination_clause="Não identificada",
+    )
+    return crud.update_contract_with_data(session, db_contract.id, data)
+
+
+def test_update_fills_typed_columns(session):
+    db_contract = make_contract(session, "a.pdf", "Alfa SA, CNPJ 11.222.333/0001-81", "R$ 1.200.000,00",
+                                "Vigência de 12 meses a partir de 01/03/2024")
+    assert db_contract.value_cents == 120_000_000
+    assert db_contract.currency == "BRL"
+    assert (db_contract.start_date, db_contract.end_date) == (date(2024, 3, 1), date(2025, 3, 1))
+    assert db_contract.contracted_party_key == "11222333000181"
+    assert db_contract.contracting_party_key == "PREFEITURA MUNICIPAL"
+    assert db_contract.normalization_version == normalization.NORMALIZATION_VERSION
+
+
+def test_aggregate_endpoint(client: TestClient, session):
+    client.post("/users/", json={"username": "agguser", "password": "password123"})
+    token = client.post("/login", data={"username": "agguser", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    make_contract(session, "a.pdf", "Alfa SA, CNPJ 11.222.333/0001-81", "R$ 2.000.000,00", "Início em 10/01/2024")
+    make_contract(session, "b.pdf", "ALFA S/A - CNPJ 11222333000181", "R$ 500.000,00", "Início em 20/01/2024")
+    make_contract(session, "c.pdf", "Beta Ltda", "R$ 1.500.000,00", "Início em 05/02/2024")
+    make_contract(session, "d.pdf", "Beta Ltda", None)
+    crud.create_contract(session, filename="e.pdf")  # Ainda em processamento
+
+    def aggregate(**params):
+        response = client.get("/contracts/aggregate", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        return response.json()["groups"]
+
+    by_party = {group["key"]: group for group in aggregate(group_by="contracted_party", status="completed")}
+    assert by_party["11222333000181"]["count"] == 2
+    assert by_party["11222333000181"]["total_value"] == 2_500_000
+    assert by_party["11222333000181"]["average_value"] == 1_250_000
+    # O contrato sem valor entra na contagem, mas não na soma (e fica num grupo sem moeda)
+    beta = [group for group in aggregate(group_by="contracted_party") if group["key"] == "BETA LTDA"]
+    assert sorted((group["currency"] or "", group["count"], group["valued"]) for group in beta) == [("", 1, 0), ("BRL", 1, 1)]
+
+    above_million = aggregate(group_by="contracted_party", currency="brl", min_value="1000000")
+    assert {group["key"]: group["count"] for group in above_million} == {"11222333000181": 1, "BETA LTDA": 1}
+
+    months = [(group["key"], group["count"]) for group in aggregate(group_by="month", currency="BRL")]
+    assert months == [("2024-01", 2), ("2024-02", 1)]
+
+    by_status = {}
+    for group in aggregate(group_by="status"):  # Cada status é separado também por moeda
+        by_status[group["key"]] = by_status.get(group["key"], 0) + group["count"]
+    assert by_status == {"completed": 4, "processing": 1}
+
+    assert client.get("/contracts/aggregate", params={"group_by": "filename"}, headers=headers).status_code == 422
+
+
+def test_migration_adds_columns_and_backfills_old_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:  # Esquema de antes da normalização
+        connection.exec_driver_sql(
+            "CREATE TABLE contract (id INTEGER PRIMARY KEY, filename VARCHAR NOT NULL, status VARCHAR NOT NULL, "
+            "contracting_party VARCHAR, contracted_party VARCHAR, contract_value VARCHAR, main_obligations VARCHAR, "
+            "additional_data VARCHAR, termination_clause VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO contract (id, filename, status, contracted_party, contract_value, additional_data) VALUES "
+            "(1, 'a.pdf', 'completed', 'Alfa SA', 'R$ 10.000,00', 'Vigência de 01/01/2024 a 31/12/2024'), "
+            "(2, 'b.pdf', 'processing', NULL, NULL, NULL), "
+            "(3, 'c.pdf', 'completed', 'Beta Ltda', 'US$ 5,000.00', NULL)"
+        )
+
+    migrations.upgrade(engine)
+    migrations.upgrade(engine)  # Idempotente
+
+    columns = {column["name"] for column in inspect(engine).get_columns("contract")}
+    assert set(normalization.TYPED_FIELDS) <= columns
+    assert "ix_contract_value_cents" in {index["name"] for index in inspect(engine).get_indexes("contract")}
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT id, value_cents, currency, start_date, end_date, contracted_party_key, normalization_version "
+            "FROM contract ORDER BY id"
+        )).all()
+    assert rows[0] == (1, 1_000_000, "BRL", "2024-01-01", "2024-12-31", "ALFA SA", normalization.NORMALIZATION_VERSION)
+    assert rows[1] == (2, None, None, None, None, None, None)  # Não analisado: nada a normalizar
+    assert rows[2][1:3] == (500_000, "USD")
+    engine.dispose()
@@ -0,0 +1,213 @@
+import threading
+import time
+
+from prometheus_client import REGISTRY
+
+from app import admission, cache, processing, schemas
+from benchmarks.fake_llm import FakeContractLLM
+from benchmarks.synthetic import contract_lines
+
+
+def long_contract_pages(pages: int = 8, lines_per_page: int = 40) -> list[str]:
+    lines = contract_lines(pages * lines_per_page)
+    return ["\n".join(lines[p * lines_per_page:(p + 1) * lines_per_page]) for p in range(pages)]
+
+
+def test_chunks_respect_size_and_clause_boundaries():
+    """Testa se as partes ficam no limite de tamanho e começam sempre no início de uma cláusula."""
+    pages = long_contract_pages()
+    chunks = processing.split_into_chunks(pages, max_tokens=300)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 * processing.CHARS_PER_TOKEN for chunk in chunks)
+    assert all(chunk.startswith("CLÁUSULA") for chunk in chunks)
+    assert "".join(chunks) == "".join(f"{page}\n" for page in pages)  # Nenhum texto se perde
+
+
+def test_chunked_analysis_runs_chunks_concurrently_with_a_limit(monkeypatch):
+    """Testa o map-reduce com a IA falsa: respeita o limite de concorrência e reduz o tempo total."""
+    monkeypatch.setattr(processing, "LLM_CHUNK_MAX_TOKENS", 1500)
+    llm = FakeContractLLM(latency=0.2)
+    pages = long_contract_pages()
+    chunk_count = len(processing.split_into_chunks(pages))
+    assert chunk_count >= 6
+
+    start = time.perf_counter()
+    result = processing.run_chunked_analysis(pages, llm=llm, concurrency=3)
+    elapsed = time.perf_counter() - start
+
+    assert llm.calls == chunk_count
+    assert llm.max_in_flight == 3
+    assert elapsed < chunk_count * 0.2 * 0.75  # Bem abaixo do tempo das chamadas em sequência
+    assert isinstance(result, schemas.ContractData)
+    assert result.contracting_party == "Empresa Contratante SA"
+    assert result.contract_value == "R$ 150.000,00"
+    assert result.termination_clause == "Multa de 10% em caso de rescisão."
+
+
+def test_mode_is_selected_by_document_size(monkeypatch):
+    """Testa se contratos curtos usam uma única chamada e os longos passam para o modo em partes."""
+    monkeypatch.setattr(processing, "LLM_CHUNK_MAX_TOKENS", 1500)
+    short_llm = FakeContractLLM()
+    processing.analyze_pages(["CLÁUSULA 1 - DO OBJETO. Serviços de limpeza."], llm=short_llm)
+    assert short_llm.calls == 1
+
+    monkeypatch.setattr(processing, "LLM_CHUNK_THRESHOLD_TOKENS", 1000)
+    long_llm = FakeContractLLM()
+    processing.analyze_pages(long_contract_pages(), llm=long_llm)
+    assert long_llm.calls > 1
+
+
+def test_merge_prefers_most_common_values():
+    partials = [
+        schemas.PartialContractData(contracting_party="Empresa A", main_obligations="Entregar."),
+        schemas.PartialContractData(contracting_party="Empresa B", main_obligations="Entregar."),
+        schemas.PartialContractData(contracting_party="Empresa B", main_obligations="Pagar."),
+    ]
+    result = processing.merge_partial_results(partials)
+    assert result.contracting_party == "Empresa B"
+    assert result.main_obligations == "Entregar.\nPagar."
+    assert result.termination_clause == "Não identificado"
+
+
+def test_api_import_does_not_load_langchain():
+    """Testa se importar a API não carrega a LangChain (ela só é importada ao criar o analisador)."""
+    import subprocess
+    import sys
+
+    code = "import sys, app.main; print(any(m.startswith('langchain') for m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_shared_analyzer_is_built_once_and_reused(monkeypatch):
+    """Testa se o analisador compartilhado é criado uma única vez e reaproveitado entre as análises."""
+    built = []
+
+    class CountingAnalyzer(processing.ContractAnalyzer):
+        def __init__(self, llm=None):
+            built.append(self)
+            super().__init__(FakeContractLLM())
+
+    monkeypatch.setattr(processing, "ContractAnalyzer", CountingAnalyzer)
+    monkeypatch.setattr(processing, "_analyzer", None)
+
+    for _ in range(3):
+        processing.run_analysis_chain("CLÁUSULA 1 - DO OBJETO. Serviços de limpeza.")
+
+    assert len(built) == 1
+    assert processing.get_analyzer().llm.calls == 3
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+def run_concurrently(target, args_list: list) -> list:
+    results = [None] * len(args_list)
+
+    def run(index, args):
+        results[index] = target(*args)
+
+    threads = [threading.Thread(target=run, args=(index, args)) for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_identical_analyses_in_flight_share_one_llm_call(monkeypatch):
+    """Testa se o mesmo contrato enviado várias vezes ao mesmo tempo gera uma única chamada à IA."""
+    monkeypatch.setattr(processing, "content_cache", cache.ContentCache(cache.MemoryCache()))
+    llm = FakeContractLLM(latency=0.3)
+    monkeypatch.setattr(processing, "_analyzer", processing.ContractAnalyzer(llm))
+    pages = ["CLÁUSULA 1 - DO OBJETO. Serviços de limpeza pelo valor de R$ 9.000,00."]
+    before = sample("llm_coalesced_total")
+
+    results = run_concurrently(processing.analyze_cached, [(pages,)] * 4)
+
+    assert llm.calls == 1
+    assert sample("llm_coalesced_total") == before + 3
+    assert all(result == results[0] for result in results) and results[0].contract_value == "R$ 9.000,00"
+    assert processing._in_flight == {}
+
+    # Depois de terminada, a análise vem do cache; um texto diferente chama a IA de novo
+    processing.analyze_cached(pages)
+    processing.analyze_cached(["CLÁUSULA 1 - DO OBJETO. Outro contrato."])
+    assert llm.calls == 2
+
+
+def test_cache_write_failure_does_not_fail_the_coalesced_analyses(monkeypatch):
+    class BrokenCache(cache.ContentCache):
+        def set(self, namespace, key, value):
+            raise OSError("disco cheio")
+
+    monkeypatch.setattr(processing, "content_cache", BrokenCache(cache.MemoryCache()))
+    llm = FakeContractLLM(latency=0.3)
+    monkeypatch.setattr(processing, "_analyzer", processing.ContractAnalyzer(llm))
+    pages = ["CLÁUSULA 1 - DO OBJETO. Manutenção pelo valor de R$ 4.000,00."]
+
+    results = run_concurrently(processing.analyze_cached, [(pages,)] * 3)
+
+    assert llm.calls == 1
+    assert [result.contract_value for result in results] == ["R$ 4.000,00"] * 3
+    assert processing._in_flight == {}
+
+
+def test_interrupted_batch_releases_every_waiting_contract(monkeypatch):
+    class Interrupted(BaseException):
+        pass
+
+    class InterruptedChain:
+        def batch(self, inputs, config=None, return_exceptions=False):
+            raise Interrupted()
+
+    batcher = processing.MicroBatcher(InterruptedChain(), max_size=3, max_wait=0.5)
+    outcomes = [None] * 3
+
+    def submit(index):
+        try:
+            batcher.submit({"contract_text": str(index)})
+        except BaseException as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)  # Ninguém fica preso no future.result()
+    assert sum(isinstance(outcome, Interrupted) for outcome in outcomes) == 1  # Quem abriu o lote
+    assert sum(isinstance(outcome, RuntimeError) for outcome in outcomes) == 2
+
+
+def test_short_contracts_are_sent_in_batches(monkeypatch):
+    """Testa se contratos curtos que chegam juntos vão à IA em lotes de até LLM_BATCH_MAX_SIZE."""
+    monkeypatch.setattr(processing, "LLM_BATCH_ENABLED", True)
+    monkeypatch.setattr(processing, "LLM_BATCH_MAX_SIZE", 3)
+    monkeypatch.setattr(processing, "LLM_BATCH_MAX_WAIT_MS", 500)
+    llm = FakeContractLLM(latency=0.1)
+    analyzer = processing.ContractAnalyzer(llm)
+    slots = []  # Chamadas que passaram pelo controle de admissão (cada uma ocupa uma vaga da IA)
+    call_llm = admission.controller.call_llm
+
+    def counting_call_llm(call, *args, **kwargs):
+        slots.append(call)
+        return call_llm(call, *args, **kwargs)
+
+    monkeypatch.setattr(admission.controller, "call_llm", counting_call_llm)
+    texts = [f"CLÁUSULA 1 - DO OBJETO. Serviços pelo valor de R$ {index}.000,00." for index in range(1, 6)]
+    before = (sample("llm_batch_size_count"), sample("llm_batch_size_sum"))
+
+    results = run_concurrently(analyzer.analyze_text, [(text,) for text in texts])
+
+    assert [result.contract_value for result in results] == [f"R$ {index}.000,00" for index in range(1, 6)]
+    assert len(slots) == 2  # Um lote cheio (3) e um fechado pela espera máxima (2), em vez de 5 chamadas
+    assert (sample("llm_batch_size_count"), sample("llm_batch_size_sum")) == (before[0] + 2, before[1] + 5)
+
+    # Contratos longos continuam indo sozinhos
+    monkeypatch.setattr(processing, "LLM_BATCH_MAX_TOKENS", 10)
+    analyzer.analyze_text(texts[0])
+    assert len(slots) == 3 and sample("llm_batch_size_count") == before[0] + 2
@@ -0,0 +1,98 @@
+from sqlmodel import select
+
+from app import crud, models, processing, reanalysis, schemas, worker
+from app.cache import ContentCache
+from benchmarks.fake_llm import FakeContractLLM
+
+from .conftest import engine
+
+TEXT = "CLÁUSULA 1 - DO OBJETO. Contratante: ACME LTDA. Valor: R$ 1.000,00."
+OLD_DATA = schemas.ContractData(contracting_party="Antiga", contracted_party=None, contract_value=None,
+                                main_obligations="Prestar serviços", additional_data=None, termination_clause="Aviso prévio")
+
+
+def analyzed_contracts(session, count: int, version: str | None = "versao-antiga") -> list[int]:
+    """Contratos concluídos com o texto guardado, como se tivessem sido analisados pela versão `version`."""
+    ids = []
+    for index in range(count):
+        contract = crud.create_contract(session, f"contrato_{index}.pdf")
+        crud.update_contract_with_data(session, contract.id, OLD_DATA,
+                                       text=f"{TEXT} ({index})", analyzer_version=version)
+        ids.append(contract.id)
+    return ids
+
+
+def test_worker_records_the_analyzer_version(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    contract = crud.create_contract(session, "versionado.pdf")
+    path = tmp_path / "versionado.pdf"
+    path.write_bytes(b"conteudo")
+    monkeypatch.setattr(processing.utils, "extract_pages_from_file", lambda file_path, file_hash=None: [TEXT])
+    processing.set_analyzer(processing.ContractAnalyzer(FakeContractLLM()))
+    try:
+        assert worker.analyze_contract_file(session, contract.id, str(path)) is None
+    finally:
+        processing.set_analyzer(None)
+
+    session.refresh(contract)
+    assert contract.status == "completed"
+    assert contract.analyzer_version == processing.ANALYZER_VERSION
+
+
+def test_dry_run_estimates_without_calling_the_llm(session):
+    analyzed_contracts(session, 3)
+    current = crud.create_contract(session, "atual.pdf")
+    crud.update_contract_with_data(session, current.id, OLD_DATA, text=TEXT,
+                                   analyzer_version=processing.ANALYZER_VERSION)
+    legacy = crud.create_contract(session, "sem_texto.pdf")
+    crud.update_contract_with_data(session, legacy.id, OLD_DATA)  # Anterior ao texto guardado
+    llm = FakeContractLLM()
+    processing.set_analyzer(processing.ContractAnalyzer(llm))
+    try:
+        summary = reanalysis.plan(engine)
+    finally:
+        processing.set_analyzer(None)
+
+    assert summary["stale"] == 3 and summary["without_text"] == 1
+    assert summary["llm_calls"] == 3
+    assert summary["estimated_prompt_tokens"] > 3 * reanalysis.PROMPT_OVERHEAD_TOKENS
+    assert llm.calls == 0
+
+
+def test_run_reanalyzes_stale_contracts_and_resumes(session, monkeypatch):
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    ids = analyzed_contracts(session, 5)
+    llm = FakeContractLLM(latency=0.01)
+    processing.set_analyzer(processing.ContractAnalyzer(llm))
+    try:
+        # Uma execução interrompida depois de dois contratos...
+        assert reanalysis.run(engine, batch_size=2, concurrency=2, limit=2)["updated"] == 2
+        # ...e a seguinte faz só o que faltou
+        result = reanalysis.run(engine, batch_size=2, concurrency=2)
+        assert result == {"analyzer_version": processing.ANALYZER_VERSION, "updated": 3, "failed": 0}
+        assert reanalysis.run(engine)["updated"] == 0
+    finally:
+        processing.set_analyzer(None)
+
+    assert llm.calls == 5 and llm.max_in_flight <= 2
+    session.expire_all()
+    contracts = session.exec(select(models.Contract).where(models.Contract.id.in_(ids))).all()
+    assert {contract.analyzer_version for contract in contracts} == {processing.ANALYZER_VERSION}
+    assert all(contract.contracting_party != "Antiga" for contract in contracts)
+    assert session.get(models.ContractText, ids[0]).text.startswith(TEXT)  # O texto não é reescrito
+
+
+def test_failed_reanalysis_keeps_the_previous_data(session, monkeypatch):
+    monkeypatch.setattr(processing, "content_cache", ContentCache(backend=None))
+    [contract_id] = analyzed_contracts(session, 1)
+
+    def broken(pages):
+        raise RuntimeError("IA indisponível")
+
+    monkeypatch.setattr(processing, "analyze_cached", broken)
+    assert reanalysis.run(engine)["failed"] == 1
+
+    contract = session.get(models.Contract, contract_id)
+    session.refresh(contract)
+    assert contract.status == "completed" and contract.contracting_party == "Antiga"
+    assert contract.analyzer_version == "versao-antiga"  # Continua desatualizado para a próxima execução
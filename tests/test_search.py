@@ -0,0 +1,86 @@
+from fastapi.testclient import TestClient
+
+from app import crud, schemas, search
+
+
+def make_contract(session, filename: str, text: str, termination: str = "Não identificada", status: str = "completed"):
+    db_contract = crud.create_contract(session, filename=filename)
+    data = schemas.ContractData(
+        contracting_party="Empresa Contratante SA", contracted_party="Fornecedor Ltda", contract_value=None,
+        main_obligations="Prestação de serviços.", additional_data=None, termination_clause=termination,
+    )
+    crud.update_contract_with_data(session, db_contract.id, data, text=text)
+    if status != "completed":
+        crud.update_contract_status(session, db_contract.id, status)
+    return db_contract
+
+
+def auth_headers(client: TestClient) -> dict:
+    client.post("/users/", json={"username": "searchuser", "password": "password123"})
+    token = client.post("/login", data={"username": "searchuser", "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_search_ranks_matches_and_returns_snippets(client: TestClient, session):
+    headers = auth_headers(client)
+    make_contract(session, "manutencao.pdf", "CLÁUSULA 5 - DA RESCISÃO. Multa de 10% em caso de rescisão antecipada.",
+                  termination="Multa de 10% do valor")
+    make_contract(session, "limpeza.pdf", "CLÁUSULA 2 - DO OBJETO. Serviços de limpeza. Há multa por atraso.")
+    make_contract(session, "aluguel.pdf", "CLÁUSULA 1 - DO OBJETO. Locação de imóvel comercial.")
+
+    response = client.get("/contracts/search", params={"q": "multa"}, headers=headers)
+    assert response.status_code == 200
+    items = response.json()["items"]
+    # "multa" também aparece na cláusula de rescisão extraída pela IA, que pesa mais que o texto
+    assert [item["filename"] for item in items] == ["manutencao.pdf", "limpeza.pdf"]
+    assert items[0]["rank"] >= items[1]["rank"]
+    assert "[Multa]" in items[0]["snippet"] or "[multa]" in items[0]["snippet"]
+
+    # Acentos são ignorados e a última palavra casa como prefixo
+    found = client.get("/contracts/search", params={"q": "rescisao antecip"}, headers=headers).json()["items"]
+    assert [item["filename"] for item in found] == ["manutencao.pdf"]
+
+    # Paginação
+    first = client.get("/contracts/search", params={"q": "clausula", "limit": 2}, headers=headers).json()
+    assert len(first["items"]) == 2 and first["next_offset"] == 2
+    rest = client.get("/contracts/search", params={"q": "clausula", "limit": 2, "offset": 2}, headers=headers).json()
+    assert len(rest["items"]) == 1 and rest["next_offset"] is None
+
+    # Consulta sem palavras (só pontuação) não quebra o FTS
+    assert client.get("/contracts/search", params={"q": "\"*("}, headers=headers).json()["items"] == []
+
+
+def test_search_index_follows_updates_and_deletes(client: TestClient, session):
+    headers = auth_headers(client)
+    kept = make_contract(session, "a.pdf", "Contrato de fornecimento de energia.")
+    removed = make_contract(session, "b.pdf", "Contrato de fornecimento de água.", status="failed")
+
+    def search(q, **params):
+        response = client.get("/contracts/search", params={"q": q, **params}, headers=headers)
+        return [item["filename"] for item in response.json()["items"]]
+
+    assert sorted(search("fornecimento")) == ["a.pdf", "b.pdf"]
+    assert search("fornecimento", status="failed") == ["b.pdf"]
+
+    # Reanálise: o texto e os campos novos substituem os antigos no índice
+    data = schemas.ContractData(
+        contracting_party="Distribuidora Solar SA", contracted_party="Fornecedor Ltda", contract_value=None,
+        main_obligations="Geração distribuída.", additional_data=None, termination_clause="Não identificada",
+    )
+    crud.update_contract_with_data(session, kept.id, data, text="Contrato de geração fotovoltaica.")
+    assert search("energia") == []
+    assert search("solar") == ["a.pdf"]
+    assert search("fotovoltaica") == ["a.pdf"]
+
+    assert client.delete(f"/contracts/{removed.id}", headers=headers).status_code == 200
+    assert search("fornecimento") == []
+
+    # O índice (conteúdo externo) continua coerente com as tabelas depois de todas as mudanças
+    session.connection().exec_driver_sql("INSERT INTO contract_fts(contract_fts, rank) VALUES('integrity-check', 1)")
+
+
+def test_search_answers_501_on_databases_without_text_search(client: TestClient, session, monkeypatch):
+    headers = auth_headers(client)
+    monkeypatch.setattr(search, "SUPPORTED_DIALECTS", ("postgresql",))
+    response = client.get("/contracts/search", params={"q": "multa"}, headers=headers)
+    assert response.status_code == 501
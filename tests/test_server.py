@@ -0,0 +1,157 @@
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import select
+
+from app import blobs, crud, database, extraction, models, worker
+
+from .conftest import engine
+
+
+def queued_contract(session, tmp_path, name: str = "lento.pdf", content: bytes = b"%PDF-1.4 lento"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    sha256 = hashlib.sha256(content).hexdigest()
+    blobs.store.put(str(path), sha256)
+    contract = crud.enqueue_contract(session, name, str(path), content_hash=sha256, blob_hash=sha256)
+    return contract, path
+
+
+def test_shutdown_requeues_analyses_that_do_not_finish(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "engine", engine)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_analysis(db, contract_id, file_path, file_hash=None):
+        started.set()
+        release.wait(10)
+        return None
+
+    monkeypatch.setattr(worker, "analyze_contract_file", slow_analysis)
+    contract, path = queued_contract(session, tmp_path)
+    pool = worker.WorkerPool(concurrency=1, kind="thread", poll_interval=0.05)
+    pool.start()
+    thread = pool._workers[0]
+    try:
+        assert started.wait(5)
+        job = session.exec(select(models.Job)).one()
+        session.refresh(job)
+        assert job.status == "running" and job.owner == worker.owner_id()
+
+        assert pool.stop(timeout=0.1) == 1  # A análise não terminou a tempo: volta para a fila
+        session.refresh(job)
+        assert job.status == "queued" and job.owner is None and job.started_at is None
+        assert session.get(models.Contract, contract.id).status == "processing"
+        assert path.exists()  # O arquivo continua lá para quem retomar
+    finally:
+        release.set()
+        thread.join(5)
+
+
+def test_resumed_job_restores_the_upload_from_the_blob_store(session, tmp_path):
+    contract, path = queued_contract(session, tmp_path, "retomado.pdf", b"%PDF-1.4 " + bytes(range(256)) * 10)
+    content = path.read_bytes()
+    path.unlink()  # Outro contêiner, ou a pasta de uploads limpa num reinício
+    job = crud.claim_next_job(session, owner="outro-host:1")
+
+    assert worker.restore_upload(session, job)
+    assert path.read_bytes() == content
+
+    # Sem o original guardado não há o que recuperar
+    orphan = crud.enqueue_contract(session, "sem_original.pdf", str(tmp_path / "sem_original.pdf"))
+    assert not worker.restore_upload(session, crud.claim_next_job(session, owner="outro-host:1"))
+    assert orphan.blob_hash is None
+
+
+def test_master_requeues_jobs_of_a_worker_that_died(session, tmp_path, monkeypatch):
+    pytest.importorskip("gunicorn")
+    pytest.importorskip("uvicorn")
+    # Os valores padrão que o módulo definiria ficam restritos a este teste
+    monkeypatch.setenv("PDF_WORKERS", str(extraction.PDF_WORKERS))
+    monkeypatch.setenv("OCR_WORKERS", str(extraction.OCR_WORKERS))
+    monkeypatch.setenv("EVENTS_RELAY", "auto")
+    monkeypatch.setenv("DETAIL_CACHE_BACKEND", "auto")
+    from app import server
+
+    monkeypatch.setattr(database, "engine", engine)
+    queued_contract(session, tmp_path, "morto.pdf")
+    queued_contract(session, tmp_path, "vivo.pdf", b"%PDF-1.4 vivo")
+    crud.claim_next_job(session, owner=worker.owner_id(4242))  # Worker que morreu com OOM
+    crud.claim_next_job(session, owner=worker.owner_id(4343))  # Outro worker, ainda vivo
+
+    server.child_exit(None, SimpleNamespace(pid=4242))
+
+    jobs = {job.contract_id: job for job in session.exec(select(models.Job)).all()}
+    for job in jobs.values():
+        session.refresh(job)
+    assert sorted(job.status for job in jobs.values()) == ["queued", "running"]
+    assert server.graceful_timeout > worker.WORKER_DRAIN_SECONDS + server.HTTP_DRAIN_SECONDS
+    assert server.preload_app and server.workers >= 1
+
+
+def test_job_that_keeps_killing_its_worker_fails_instead_of_requeuing(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(worker, "WORKER_MAX_ATTEMPTS", 2)
+    contract, _ = queued_contract(session, tmp_path, "venenoso.pdf")
+    owner = worker.owner_id(4242)
+
+    crud.claim_next_job(session, owner=owner)
+    assert worker.release_jobs(owner, "worker_exit") == 1  # Primeira queda: volta para a fila
+    crud.claim_next_job(session, owner=owner)
+    assert worker.release_jobs(owner, "worker_exit") == 0  # Segunda: esgotou as tentativas
+
+    job = session.exec(select(models.Job)).one()
+    session.refresh(job)
+    assert job.status == "failed" and job.attempts == 2 and "2 vezes" in job.error
+    assert session.get(models.Contract, contract.id).status == "failed"
+    assert crud.claim_next_job(session, owner=owner) is None
+
+
+def test_multiple_server_workers_share_the_detail_cache():
+    """Com vários workers do gunicorn, a invalidação do detalhe precisa alcançar todos (cache sqlite)."""
+    pytest.importorskip("gunicorn")
+    pytest.importorskip("uvicorn")
+    code = "import app.server, app.cache, app.events; print(app.cache.DETAIL_CACHE_BACKEND, app.events.EVENTS_RELAY)"
+    env = {key: value for key, value in os.environ.items() if key not in ("DETAIL_CACHE_BACKEND", "EVENTS_RELAY")}
+    output = subprocess.run([sys.executable, "-c", code], env={**env, "WEB_CONCURRENCY": "2"},
+                            capture_output=True, text=True, check=True).stdout.split()
+    assert output == ["sqlite", "database"]
+
+
+def test_batch_contracts_are_jobs_of_the_process_that_runs_them(session, tmp_path, monkeypatch):
+    from app import batch, uploads
+
+    monkeypatch.setattr(database, "engine", engine)
+    seen = []
+
+    def analysis(db, contract_id, file_path, file_hash=None):
+        job = db.exec(select(models.Job).where(models.Job.contract_id == contract_id)).one()
+        seen.append((job.status, job.owner))
+        return None
+
+    monkeypatch.setattr(worker, "analyze_contract_file", analysis)
+    path = tmp_path / "lote.pdf"
+    path.write_bytes(b"%PDF-1.4 lote")
+    upload = uploads.StoredUpload(filename="lote.pdf", path=str(path), size=13,
+                                  sha256=hashlib.sha256(b"%PDF-1.4 lote").hexdigest())
+
+    result = batch.run_batch(session, [upload], parallelism=1)
+
+    # Durante a análise o job está em nome deste processo: os workers da fila não o pegam, e uma queda
+    # do processo (child_exit) ou o encerramento (stop_pool) o devolvem à fila
+    assert seen == [("running", worker.owner_id())]
+    job = session.exec(select(models.Job)).one()
+    assert job.status == "done" and job.attempts == 1 and job.content_hash == upload.sha256
+    assert result.completed == 1 and result.items[0].contract_id == job.contract_id
+
+    # Lote interrompido: o que ficou em "running" volta para a fila no encerramento
+    job.status, job.finished_at = "running", None
+    session.add(job)
+    session.commit()
+    worker.stop_pool()
+    session.refresh(job)
+    assert job.status == "queued" and job.owner is None